@@ -2,10 +2,16 @@ from typing import List, Optional, Union
 from pydantic import Field, HttpUrl, validator
 from pydantic_schemaorg.Event import Event
 import pandas as pd
-import json
 import numpy as np
 import re
 from datetime import date
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from validacaoColunas import regra_data, regra_inteiro, regra_obrigatoria, validar_ou_falhar
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 
 class EventModel(Event):
     id_evento: int = Field(None, alias="identifier")
@@ -49,57 +55,42 @@ def parse_lista_ou_none(val):
     return [x.strip() for x in parts if x.strip()]
 
 # Ler CSV e preparar o DataFrame
-df = pd.read_csv("Schemas - versao 2/Braga é Natal/csv/Evento.csv", dtype=str).replace({np.nan: None})
+with etapa("leitura_csv", "Evento.csv") as e:
+    df = pd.read_csv(Path(__file__).resolve().parent / "csv" / "Evento.csv", dtype=str)
+    e.linhas = len(df)
+with etapa("nan_para_none", "Evento.csv", len(df)):
+    df = df.replace({np.nan: None})
 
 campos_lista = ["imagem"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-eventos = [EventModel(**row.to_dict()) for _, row in df.iterrows()]
+# Validação por colunas: todas as linhas com erro são reportadas de uma vez,
+# antes de se criarem os modelos
+REGRAS = [
+    regra_inteiro("id_evento"),
+    regra_obrigatoria("nome", "id_festival"),
+    regra_data("data_inicio", "data_fim"),
+]
+validar_ou_falhar(df, REGRAS)
+
+with etapa("modelos", "Event", len(df)):
+    eventos = [EventModel(**row.to_dict()) for _, row in df.iterrows()]
 
 # Converter para NGSI-LD
-def to_ngsi_ld_strict(entity: EventModel) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Event:{data['identifier']}",
-        "type": "Event"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        if key == "superEvent":
-            ngsi[key] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:Festival:{value}",
-                "objectType": "Festival"
-            }
-        elif key == "attendee":
-            ngsi[key] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:Attendee:{value}",
-                "objectType": "Organization"
-            }
-        elif key == "location":
-            ngsi[key] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:Place:{value}",
-                "objectType": "Place"
-            }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld_strict = mapeador(
+    Mapeamento("Event", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"),
+               relacoes={"superEvent": Relacao("Festival", "Festival"),
+                         "attendee": Relacao("Attendee", "Organization"),
+                         "location": Relacao("Place", "Place")},
+               ignorar=("identifier",)),
+    EventModel, "to_ngsi_ld_strict")
 
 # Exportar
 evento_ngsi = [to_ngsi_ld_strict(evento) for evento in eventos]
-with open("evento_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(evento_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(evento_ngsi, "evento_ngsi.jsonld")
 
 
 
@@ -2,9 +2,15 @@ from pydantic import Field, HttpUrl, validator
 from typing import List, Optional, Union
 from pydantic_schemaorg.Festival import Festival
 import pandas as pd
-import json
 import numpy as np
 import re
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from validacaoColunas import regra_data, regra_inteiro, regra_obrigatoria, regra_url, validar_ou_falhar
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, mapeador
 
 class FestivalModel(Festival):
     id_festival: int = Field(None, alias="identifier")
@@ -38,39 +44,38 @@ def parse_lista_ou_none(val):
     return [x.strip() for x in parts if x.strip()]
 
 # Ler CSV e preparar o DataFrame
-df = pd.read_csv("Schemas - versao 2/Braga é Natal/csv/Festival.csv", dtype=str).replace({np.nan: None})
+with etapa("leitura_csv", "Festival.csv") as e:
+    df = pd.read_csv(Path(__file__).resolve().parent / "csv" / "Festival.csv", dtype=str)
+    e.linhas = len(df)
+with etapa("nan_para_none", "Festival.csv", len(df)):
+    df = df.replace({np.nan: None})
 
 campos_lista = ["parceiro", "imagem"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-festivais = [FestivalModel(**row.to_dict()) for _, row in df.iterrows()]
+# Validação por colunas: todas as linhas com erro são reportadas de uma vez,
+# antes de se criarem os modelos
+REGRAS = [
+    regra_inteiro("id_festival"),
+    regra_obrigatoria("nome"),
+    regra_data("data_inicio", "data_fim", obrigatoria=True),
+    regra_url("site_web"),
+]
+validar_ou_falhar(df, REGRAS)
 
-# Converter para NGSI-LD
-def to_ngsi_ld_strict(entity: FestivalModel) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Festival:{data['identifier']}",
-        "type": "Festival"
-    }
-
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
+with etapa("modelos", "Festival", len(df)):
+    festivais = [FestivalModel(**row.to_dict()) for _, row in df.iterrows()]
 
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"
-    ]
-    return ngsi
+# Converter para NGSI-LD
+to_ngsi_ld_strict = mapeador(
+    Mapeamento("Festival", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"),
+               ignorar=("identifier",)),
+    FestivalModel, "to_ngsi_ld_strict")
 
 # Exportar 
 festival_ngsi = [to_ngsi_ld_strict(festival) for festival in festivais]
 
-with open("festival_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(festival_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(festival_ngsi, "festival_ngsi.jsonld")
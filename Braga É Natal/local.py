@@ -3,7 +3,12 @@ from pydantic_schemaorg.Place import Place
 from pydantic_schemaorg.GeoCoordinates import GeoCoordinates
 from pydantic import Field
 import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 import numpy as np
 import re
 
@@ -22,49 +27,28 @@ def parse_lista_ou_none(val):
     return [x.strip() for x in parts if x.strip()]
 
 # Ler CSV e preparar o DataFrame
-df = pd.read_csv("Schemas - versao 2/Braga é Natal/csv/Local.csv", dtype=str).replace({np.nan: None})
+with etapa("leitura_csv", "Local.csv") as e:
+    df = pd.read_csv(Path(__file__).resolve().parent / "csv" / "Local.csv", dtype=str)
+    e.linhas = len(df)
+with etapa("nan_para_none", "Local.csv", len(df)):
+    df = df.replace({np.nan: None})
 
 campos_lista = ["id_evento"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-locais = [Local(**row.to_dict()) for _, row in df.iterrows()]
+with etapa("modelos", "Place", len(df)):
+    locais = [Local(**row.to_dict()) for _, row in df.iterrows()]
 
 # Converter para NGSI-LD
-def to_ngsi_ld_strict(entity: Local) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Place:{data['identifier']}",
-        "type": "Place"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        if key == "event":
-            if isinstance(value, list):
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": [f"urn:ngsi-ld:Event:{v}" for v in value if v],
-                    "objectType": "Event"
-                }
-            else:
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": f"urn:ngsi-ld:Event:{value}",
-                    "objectType": "Event"
-                }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld",
-    ]
-    return ngsi
+to_ngsi_ld_strict = mapeador(
+    Mapeamento("Place", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"),
+               relacoes={"event": Relacao("Event", "Event", lista=True)},
+               ignorar=("identifier",)),
+    Local, "to_ngsi_ld_strict")
 
 # Exportar
 local_ngsi = [to_ngsi_ld_strict(local) for local in locais]
-with open("local_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(local_ngsi, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+escrever_ngsi_ld(local_ngsi, "local_ngsi.jsonld")
\ No newline at end of file
@@ -2,7 +2,12 @@ from typing import Optional, List, Union
 from pydantic_schemaorg.Organization import Organization
 from pydantic import Field, HttpUrl
 import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 import numpy as np
 import re
 
@@ -21,54 +26,30 @@ def parse_lista_ou_none(val):
     return [x.strip() for x in parts if x.strip()]
 
 # Ler CSV e preparar o DataFrame
-df = pd.read_csv("Schemas - versao 2/Braga é Natal/csv/Participante.csv", dtype=str).replace({np.nan: None})
+with etapa("leitura_csv", "Participante.csv") as e:
+    df = pd.read_csv(Path(__file__).resolve().parent / "csv" / "Participante.csv", dtype=str)
+    e.linhas = len(df)
+with etapa("nan_para_none", "Participante.csv", len(df)):
+    df = df.replace({np.nan: None})
 
 campos_lista = ["id_evento"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-participantes = [Participante(**row.to_dict()) for _, row in df.iterrows()]
+with etapa("modelos", "Attendee", len(df)):
+    participantes = [Participante(**row.to_dict()) for _, row in df.iterrows()]
 
 # Converter para NGSI-LD
-def to_ngsi_ld_strict(entity: Participante) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Attendee:{data['identifier']}",
-        "type": "Attendee"
-    }
-
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-
-        if key == "performerIn":
-            if isinstance(value, list):
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": [f"urn:ngsi-ld:Event:{v}" for v in value if v],
-                    "objectType": "Event"
-                }
-            else:
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": f"urn:ngsi-ld:Event:{value}",
-                    "objectType": "Event"
-                }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld_strict = mapeador(
+    Mapeamento("Attendee", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextBragaNatal.jsonld"),
+               relacoes={"performerIn": Relacao("Event", "Event", lista=True)},
+               ignorar=("identifier",)),
+    Participante, "to_ngsi_ld_strict")
 
 # Exportar
 participante_ngsi = [to_ngsi_ld_strict(participante) for participante in participantes]
 
-with open("participante_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(participante_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(participante_ngsi, "participante_ngsi.jsonld")
 
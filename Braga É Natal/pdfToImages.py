@@ -1,22 +1,133 @@
 import fitz
-import PIL.Image
-import io 
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
 
-pdf = fitz.open("Programa_BragaENatal24.pdf")
-counter = 1
+# Extração das imagens do programa em PDF para ficheiros.
+#   - As páginas são repartidas em intervalos contíguos por um conjunto de
+#     processos; cada processo abre o PDF uma vez.
+#   - Os bytes de extract_image são escritos tal como estão no PDF (sem
+#     descodificar nem voltar a codificar a imagem).
+#   - Cada imagem é escrita uma única vez: o mesmo xref só é extraído uma vez
+#     por processo e o nome do ficheiro é o digest do conteúdo, pelo que
+#     xrefs diferentes com os mesmos bytes (ou o mesmo xref visto por dois
+#     processos) dão o mesmo ficheiro.
+#   - O manifesto (manifesto.json) indica os ficheiros de cada página e, por
+#     ficheiro, os xrefs e as páginas onde aparece.
 
-for i in range(len(pdf)):
-    page = pdf[i]
-    images = page.get_images()
-    for image in images:
-        base_img = pdf.extract_image(image[0])
-        image_data = base_img["image"]
-        img = PIL.Image.open(io.BytesIO(image_data))
-        extension = base_img["ext"]
-        img.save(open(f"image{counter}.{extension}", "wb"))
-        counter += 1
-    
+PDF = "Programa_BragaENatal24.pdf"
+MANIFESTO = "manifesto.json"
 
+class Imagem(NamedTuple):
+    xref: int
+    ficheiro: str        # <digest>.<ext>, relativo à pasta de saída
+    largura: int
+    altura: int
+    tamanho: int         # bytes
 
+# Estado de cada processo: PDF aberto e xrefs já extraídos
+_pdf = None
+_extraidas = {}
 
-    
\ No newline at end of file
+def _abrir(caminho: str) -> None:
+    global _pdf
+    _pdf = fitz.open(caminho)
+    _extraidas.clear()
+
+def _escrever(caminho: Path, dados: bytes) -> None:
+    if caminho.exists():
+        return
+    # Escrita atómica: outro processo pode estar a escrever o mesmo ficheiro
+    tmp = caminho.with_name(f".{caminho.name}.{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(dados)
+    os.replace(tmp, caminho)
+
+def _extrair(xref: int, pasta: Path) -> Optional[Imagem]:
+    if xref in _extraidas:
+        return _extraidas[xref]
+    base = _pdf.extract_image(xref)
+    if not base:
+        # xref que não é uma imagem extraível
+        _extraidas[xref] = None
+        return None
+    dados = base["image"]
+    ficheiro = f"{hashlib.sha256(dados).hexdigest()[:32]}.{base['ext']}"
+    _escrever(pasta / ficheiro, dados)
+    imagem = Imagem(xref, ficheiro, base.get("width", 0), base.get("height", 0), len(dados))
+    _extraidas[xref] = imagem
+    return imagem
+
+# Tarefa: páginas [inicio, fim) -> [(página, [Imagem])], páginas a contar de 1
+def _extrair_paginas(inicio: int, fim: int, pasta: str) -> list:
+    pasta = Path(pasta)
+    resultado = []
+    for i in range(inicio, fim):
+        imagens = []
+        for item in _pdf[i].get_images(full=True):
+            imagem = _extrair(item[0], pasta)
+            if imagem is not None:
+                imagens.append(imagem)
+        resultado.append((i + 1, imagens))
+    return resultado
+
+def _intervalos(n: int, partes: int) -> list:
+    partes = max(1, min(partes, n))
+    limites = [n * i // partes for i in range(partes + 1)]
+    return [(a, b) for a, b in zip(limites, limites[1:]) if a < b]
+
+def extrair_imagens(caminho: str = PDF, pasta: str = "imagens", processos: Optional[int] = None) -> dict:
+    if not Path(caminho).is_file():
+        raise ValueError(f"PDF inexistente: '{caminho}'.")
+    processos = processos or os.cpu_count() or 1
+    Path(pasta).mkdir(parents=True, exist_ok=True)
+    with fitz.open(caminho) as pdf:
+        n_paginas = len(pdf)
+    # Vários intervalos por processo, para equilibrar páginas com muitas imagens
+    intervalos = _intervalos(n_paginas, processos * 4)
+
+    if processos == 1:
+        _abrir(caminho)
+        blocos = [_extrair_paginas(a, b, pasta) for a, b in intervalos]
+    else:
+        with ProcessPoolExecutor(processos, initializer=_abrir, initargs=(caminho,)) as executor:
+            futuros = [executor.submit(_extrair_paginas, a, b, pasta) for a, b in intervalos]
+            blocos = [f.result() for f in futuros]
+
+    paginas = {}
+    ficheiros = {}
+    for bloco in blocos:
+        for pagina, imagens in bloco:
+            lista = []
+            for imagem in imagens:
+                info = ficheiros.setdefault(imagem.ficheiro, {
+                    "largura": imagem.largura, "altura": imagem.altura, "bytes": imagem.tamanho,
+                    "xrefs": set(), "paginas": []})
+                info["xrefs"].add(imagem.xref)
+                if not info["paginas"] or info["paginas"][-1] != pagina:
+                    info["paginas"].append(pagina)
+                if imagem.ficheiro not in lista:
+                    lista.append(imagem.ficheiro)
+            paginas[str(pagina)] = lista
+    for info in ficheiros.values():
+        info["xrefs"] = sorted(info["xrefs"])
+
+    manifesto = {"pdf": Path(caminho).name, "paginas": paginas, "imagens": ficheiros}
+    with open(Path(pasta) / MANIFESTO, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    return manifesto
+
+
+if __name__ == "__main__":
+    # python pdfToImages.py [ficheiro.pdf] [pasta_saida] [processos]
+    args = sys.argv[1:]
+    manifesto = extrair_imagens(args[0] if len(args) > 0 else PDF,
+                                args[1] if len(args) > 1 else "imagens",
+                                int(args[2]) if len(args) > 2 else None)
+    referencias = sum(len(l) for l in manifesto["paginas"].values())
+    print(f"{len(manifesto['paginas'])} páginas, {referencias} imagens, "
+          f"{len(manifesto['imagens'])} ficheiros distintos")
@@ -2,7 +2,12 @@ from pydantic import Field
 from typing import List, Optional
 from pydantic_schemaorg.Place import Place
 import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 import re
 
 class Edificio(Place):
@@ -43,45 +48,19 @@ campos_lista = ["id_sala"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-edificios = [Edificio(**row.to_dict()) for _, row in df.iterrows()]
+with etapa("modelos", "Building", len(df)):
+    edificios = [Edificio(**row.to_dict()) for _, row in df.iterrows()]
 
 # Conversão para NGSI-LD
-def to_ngsi_ld(entity: Edificio) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Building:{data['identifier']}",
-        "type": "Building"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-       
-        if key == "containsPlace":
-            if isinstance(value, list):
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": [f"urn:ngsi-ld:Room:{v}" for v in value if v],
-                    "objectType": "Room"
-                }
-            else:
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": f"urn:ngsi-ld:Room:{value}",
-                    "objectType": "Room"
-                }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld = mapeador(
+    Mapeamento("Building", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"),
+               relacoes={"containsPlace": Relacao("Room", "Room", lista=True)},
+               ignorar=("identifier",)),
+    Edificio, "to_ngsi_ld")
 
 edificios_ngsi = [to_ngsi_ld(edificio) for edificio in edificios]
 
 # Exportar
-with open("edificios_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(edificios_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(edificios_ngsi, "edificios_ngsi.jsonld")
@@ -2,7 +2,12 @@ from pydantic import Field
 from typing import Optional
 from pydantic_schemaorg.Person import Person
 import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, mapeador
 
 
 class Pessoa(Person):
@@ -18,33 +23,20 @@ data = [
     }
 ]
 df = pd.DataFrame(data)
-pessoas = [Pessoa(**row.to_dict()) for _, row in df.iterrows()]
+with etapa("modelos", "Person", len(df)):
+    pessoas = [Pessoa(**row.to_dict()) for _, row in df.iterrows()]
 
 # Conversão para NGSI-LD
-def to_ngsi_ld(entity: Pessoa) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Person:{data['identifier']}",
-        "type": "Person"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld = mapeador(
+    Mapeamento("Person", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"),
+               ignorar=("identifier",)),
+    Pessoa, "to_ngsi_ld")
 
 pessoas_ngsi = [to_ngsi_ld(pessoa) for pessoa in pessoas]
 
 # Exportar
-with open("pessoas_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(pessoas_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(pessoas_ngsi, "pessoas_ngsi.jsonld")
 
 
@@ -4,7 +4,13 @@ from typing import Optional
 from datetime import date
 import re
 import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from validacaoColunas import regra_data, regra_hora, regra_obrigatoria, validar_ou_falhar
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 
 class ReservaSala(Reservation):
 
@@ -63,43 +69,29 @@ data = [
 ]
 df = pd.DataFrame(data)
 
-reservaSalas = [ReservaSala(**row.to_dict()) for _, row in df.iterrows()]
+# Validação por colunas: todas as linhas com erro são reportadas de uma vez,
+# antes de se criarem os modelos
+REGRAS = [
+    regra_obrigatoria("id_reserva", "id_sala"),
+    regra_data("data_inicio", "data_fim", obrigatoria=True),
+    regra_hora("hora_inicio", "hora_fim"),
+]
+validar_ou_falhar(df, REGRAS)
+
+with etapa("modelos", "Reservation", len(df)):
+    reservaSalas = [ReservaSala(**row.to_dict()) for _, row in df.iterrows()]
 
 # Conversão para NGSI-LD
-def to_ngsi_ld(entity: ReservaSala) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Reservation:{data['identifier']}",
-        "type": "Reservation"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        if key == "reservationFor":
-            ngsi[key] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:Room:{value}",
-                "objectType": "Room"
-            }
-        elif key == "underName":
-            ngsi[key] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:Person:{value}",
-                "objectType": "Person"
-            }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld = mapeador(
+    Mapeamento("Reservation", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"),
+               relacoes={"reservationFor": Relacao("Room", "Room"),
+                         "underName": Relacao("Person", "Person")},
+               ignorar=("identifier",)),
+    ReservaSala, "to_ngsi_ld")
 
 reservaSalas_ngsi = [to_ngsi_ld(reservaSala) for reservaSala in reservaSalas]
 
 # Exportar
-with open("reservaSalas_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(reservaSalas_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(reservaSalas_ngsi, "reservaSalas_ngsi.jsonld")
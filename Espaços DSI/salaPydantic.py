@@ -2,7 +2,12 @@ from pydantic import Field
 from typing import Optional
 from pydantic_schemaorg.Room import Room
 import pandas as pd
-import json
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 
 class Sala(Room):
 
@@ -46,37 +51,19 @@ data = [
 ]
 df = pd.DataFrame(data)
 
-salas = [Sala(**row.to_dict()) for _, row in df.iterrows()]
+with etapa("modelos", "Room", len(df)):
+    salas = [Sala(**row.to_dict()) for _, row in df.iterrows()]
 
 # Conversão para NGSI-LD
-def to_ngsi_ld(entity: Sala) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Room:{data['identifier']}",
-        "type": "Room"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        if key == "containedInPlace":
-            ngsi[key] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:Building:{value}",
-                "objectType": "Building"
-            }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld = mapeador(
+    Mapeamento("Room", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextDSI.jsonld"),
+               relacoes={"containedInPlace": Relacao("Building", "Building")},
+               ignorar=("identifier",)),
+    Sala, "to_ngsi_ld")
 
 salas_ngsi = [to_ngsi_ld(sala) for sala in salas]
 
 # Exportar
-with open("salas_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(salas_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(salas_ngsi, "salas_ngsi.jsonld")
@@ -2,9 +2,15 @@ from typing import List, Optional, Union
 from pydantic import Field, HttpUrl, validator
 from pydantic_schemaorg.Person import Person
 import pandas as pd
-import json
 import numpy as np
 import re
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from validacaoColunas import regra_data, regra_inteiro, regra_obrigatoria, regra_url, validar_ou_falhar
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Mapeamento, Relacao, mapeador
 
 class Autor(Person):
     id_autor:  int = Field(None, alias="identifier")
@@ -45,52 +51,41 @@ def parse_lista_ou_none(val):
 
 
 # Ler o CSV
-df = pd.read_csv("Schemas - versao 2/Estatuária de Braga/csv/Autores.csv", dtype=str).replace({np.nan: None})
+with etapa("leitura_csv", "Autores.csv") as e:
+    df = pd.read_csv(Path(__file__).resolve().parent / "csv" / "Autores.csv", dtype=str)
+    e.linhas = len(df)
+with etapa("nan_para_none", "Autores.csv", len(df)):
+    df = df.replace({np.nan: None})
 
 campos_lista = ["reconhecimento", "obras_notaveis", "estatuaria_id", "afiliacao", "url"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-autores = [Autor(**row.to_dict()) for _, row in df.iterrows()]
+# Validação por colunas: todas as linhas com erro são reportadas de uma vez,
+# antes de se criarem os modelos
+REGRAS = [
+    regra_inteiro("id_autor"),
+    regra_obrigatoria("nome"),
+    regra_data("data_nascimento", "data_falecimento", anos=True),
+    regra_url("url", lista=True),
+]
+validar_ou_falhar(df, REGRAS)
+
+with etapa("modelos", "Person", len(df)):
+    autores = [Autor(**row.to_dict()) for _, row in df.iterrows()]
 
 
 # Converter para NGSI-LD
-def to_ngsi_ld_strict(entity: Autor) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Person:{data['identifier']}",
-        "type": "Person"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        if key == "publishingPrinciples":
-            if isinstance(value, list):
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": [f"urn:ngsi-ld:Sculpture:{v}" for v in value if v],
-                    "objectType": "Sculpture"
-                }
-            else:
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": f"urn:ngsi-ld:Sculpture:{value}",
-                    "objectType": "Sculpture"
-                }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextEstatuarias.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld_strict = mapeador(
+    Mapeamento("Person", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextEstatuarias.jsonld"),
+               relacoes={"publishingPrinciples": Relacao("Sculpture", "Sculpture", lista=True)},
+               ignorar=("identifier",)),
+    Autor, "to_ngsi_ld_strict")
 
 
 # Exportar
 autores_ngsi = [to_ngsi_ld_strict(autor) for autor in autores]
 
-with open("autores_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(autores_ngsi, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+escrever_ngsi_ld(autores_ngsi, "autores_ngsi.jsonld")
\ No newline at end of file
@@ -2,10 +2,16 @@ from typing import Optional, Union, List
 from pydantic import Field, HttpUrl, validator
 from pydantic_schemaorg.Sculpture import Sculpture
 import pandas as pd
-import json
 import numpy as np
 import re
 from datetime import date
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from validacaoColunas import regra_data, regra_decimal, regra_inteiro, regra_url, validar_ou_falhar
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa
+from mapeamentoNgsiLd import Geo, Mapeamento, Relacao, mapeador
 
 class Estatuaria(Sculpture):
     num_inventario:  int = Field(None, alias="identifier")
@@ -62,64 +68,42 @@ def parse_lista_ou_none(val):
     return [x.strip() for x in parts if x.strip()]
 
 # Ler o CSV
-df = pd.read_csv("Schemas - versao 2/Estatuária de Braga/csv/Estatuaria.csv", dtype=str).replace({np.nan: None})
+with etapa("leitura_csv", "Estatuaria.csv") as e:
+    df = pd.read_csv(Path(__file__).resolve().parent / "csv" / "Estatuaria.csv", dtype=str)
+    e.linhas = len(df)
+with etapa("nan_para_none", "Estatuaria.csv", len(df)):
+    df = df.replace({np.nan: None})
 
 campos_lista = ["seletor_imagem", "referencia_documental", "id_autor", "data_construcao"]
 for campo in campos_lista:
     df[campo] = df[campo].apply(parse_lista_ou_none)
 
-estatuarias = [Estatuaria(**row.to_dict()) for _, row in df.iterrows()]
+# Validação por colunas: todas as linhas com erro são reportadas de uma vez,
+# antes de se criarem os modelos
+REGRAS = [
+    regra_inteiro("num_inventario"),
+    regra_data("data_inventario", anos=True),
+    regra_data("data_construcao", anos=True, lista=True),
+    regra_url("referencia_documental", lista=True),
+    regra_decimal("x", "y"),
+]
+validar_ou_falhar(df, REGRAS)
+
+with etapa("modelos", "Sculpture", len(df)):
+    estatuarias = [Estatuaria(**row.to_dict()) for _, row in df.iterrows()]
 
 # Conversão para NGSI-LD
-def to_ngsi_ld(entity: Estatuaria) -> dict:
-    data = entity.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {
-        "id": f"urn:ngsi-ld:Sculpture:{data['identifier']}",
-        "type": "Sculpture"
-    }
-    for key, value in data.items():
-        if key in ("identifier", "@type"):
-            continue
-        if key == "author":
-            if isinstance(value, list):
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": [f"urn:ngsi-ld:Person:{v}" for v in value if v],
-                    "objectType": "Person"
-                }
-            else:
-                ngsi[key] = {
-                    "type": "Relationship",
-                    "object": f"urn:ngsi-ld:Person:{value}",
-                    "objectType": "Person"
-                }
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    if "latitude" in data and "longitude" in data:
-        try:
-            lat = float(data["latitude"])
-            lon = float(data["longitude"])
-            ngsi["location"] = {
-                "type": "GeoProperty",
-                "value": {
-                    "type": "Point",
-                    "coordinates": [lon, lat]
-                }
-            }
-        except ValueError:
-            pass
-    ngsi["@context"] = [
-        "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
-        "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextEstatuarias.jsonld"
-    ]
-    return ngsi
+to_ngsi_ld = mapeador(
+    Mapeamento("Sculpture", ("identifier",),
+               ("https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld",
+                "https://raw.githubusercontent.com/anapereira147/ContextDataModels/main/ContextEstatuarias.jsonld"),
+               relacoes={"author": Relacao("Person", "Person", lista=True)},
+               geo={"location": Geo("longitude", "latitude")},
+               ignorar=("identifier",)),
+    Estatuaria, "to_ngsi_ld")
 
 estatuarias_ngsi = [to_ngsi_ld(estatua) for estatua in estatuarias]
 
 # Exportar
-with open("estatuarias_ngsi.jsonld", "w", encoding="utf-8") as f:
-    json.dump(estatuarias_ngsi, f, indent=2, ensure_ascii=False)
+escrever_ngsi_ld(estatuarias_ngsi, "estatuarias_ngsi.jsonld")
 
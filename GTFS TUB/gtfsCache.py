@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+import pandas as pd, numpy as np
+
+# Cache binária do feed GTFS: colunas tipadas em ficheiros .npy abertos com mmap
+# (as páginas são partilhadas entre processos) e uma tabela única de strings
+# internadas para ids e nomes, identificada pelo hash do conteúdo dos .txt
+
+FORMATO_VERSAO = 2
+INT_NULO = np.iinfo(np.int64).min
+
+# Feed TUB incluído no repositório (independente da pasta atual)
+PASTA_GTFS = str(Path(__file__).resolve().parent / "txt")
+# Uma só cache, ao lado deste módulo, qualquer que seja a pasta atual
+PASTA_CACHE = str(Path(__file__).resolve().parent / ".gtfs_cache")
+
+# Tipos das colunas: "s" string internada, "i" inteiro, "f" decimal,
+# "t" hora GTFS (string internada + coluna {col}_segundos)
+ESQUEMA = {
+    "agency": {},
+    "stops": {"stop_lat": "f", "stop_lon": "f"},
+    "routes": {"route_type": "i"},
+    "trips": {"direction_id": "i"},
+    "stop_times": {"arrival_time": "t", "departure_time": "t", "stop_sequence": "i"},
+    "calendar": {d: "i" for d in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")},
+    "calendar_dates": {"exception_type": "i"},
+    "fare_attributes": {"price": "f", "payment_method": "i", "transfers": "i", "transfer_duration": "i"},
+    "fare_rules": {},
+    "shapes": {"shape_pt_lat": "f", "shape_pt_lon": "f", "shape_pt_sequence": "i"},
+}
+
+def hash_feed(pasta: str) -> str:
+    h = hashlib.sha256(f"gtfs-cache-v{FORMATO_VERSAO}".encode())
+    for nome in sorted(ESQUEMA):
+        caminho = Path(pasta) / f"{nome}.txt"
+        if not caminho.exists():
+            continue
+        h.update(nome.encode())
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloco)
+    return h.hexdigest()
+
+def hora_para_segundos_coluna(col: pd.Series) -> np.ndarray:
+    partes = col.str.strip().str.split(":", expand=True)
+    if partes.shape[1] != 3:
+        raise ValueError(f"Hora inválida na coluna '{col.name}'. Usar 'HH:MM:SS'.")
+    seg = (pd.to_numeric(partes[0], errors="coerce") * 3600
+           + pd.to_numeric(partes[1], errors="coerce") * 60
+           + pd.to_numeric(partes[2], errors="coerce"))
+    if (seg.isna() & col.notna()).any():
+        raise ValueError(f"Hora inválida na coluna '{col.name}'. Usar 'HH:MM:SS'.")
+    return seg.fillna(-1).astype(np.int32).to_numpy()
+
+# Tabela de strings: blob UTF-8 + offsets, e a ordem alfabética dos códigos
+# para procurar o código de uma string por pesquisa binária (sem construir um
+# dicionário em cada processo); código -1 = valor em falta
+class TabelaStrings:
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, ordem: np.ndarray):
+        self._arrays = (blob, offsets, ordem)
+        self._blob = memoryview(np.asarray(blob))
+        self._offsets = memoryview(np.asarray(offsets))
+        self._ordem = memoryview(np.asarray(ordem))
+        # Só as strings efetivamente usadas ficam descodificadas em memória
+        self._texto = {}
+        self._codigo = {}
+
+    @classmethod
+    def de_lista(cls, strings: list) -> "TabelaStrings":
+        dados = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(dados) + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in dados], out=offsets[1:])
+        blob = np.frombuffer(b"".join(dados), dtype=np.uint8)
+        ordem = np.array(sorted(range(len(strings)), key=strings.__getitem__), dtype=np.int64)
+        return cls(blob, offsets, ordem)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, codigo: int) -> Optional[str]:
+        if codigo < 0:
+            return None
+        texto = self._texto.get(codigo)
+        if texto is None:
+            texto = self._texto[codigo] = str(self._blob[self._offsets[codigo]:self._offsets[codigo + 1]], "utf-8")
+        return texto
+
+    def codigo(self, s: str) -> int:
+        codigo = self._codigo.get(s)
+        if codigo is None:
+            lo, hi = 0, len(self._ordem)
+            while lo < hi:
+                meio = (lo + hi) // 2
+                if self[self._ordem[meio]] < s:
+                    lo = meio + 1
+                else:
+                    hi = meio
+            codigo = self._ordem[lo] if lo < len(self._ordem) and self[self._ordem[lo]] == s else -1
+            self._codigo[s] = codigo
+        return codigo
+
+    def descodificar(self, codigos) -> list:
+        return [self[c] for c in np.asarray(codigos).tolist()]
+
+def compilar_feed(pasta: str, destino: str) -> None:
+    tabelas, colunas = {}, {}
+    internadas = {}
+
+    def internar(col: pd.Series) -> np.ndarray:
+        codigos, unicos = pd.factorize(col, use_na_sentinel=True)
+        mapa = np.array([internadas.setdefault(u, len(internadas)) for u in unicos] + [-1], dtype=np.int32)
+        return mapa[codigos]
+
+    for nome, tipos in ESQUEMA.items():
+        caminho = Path(pasta) / f"{nome}.txt"
+        if not caminho.exists():
+            continue
+        df = pd.read_csv(caminho, dtype=str, encoding="utf-8-sig")
+        df.columns = df.columns.str.strip()
+        tabelas[nome] = {"linhas": len(df), "colunas": {}}
+        for col in df.columns:
+            tipo = tipos.get(col, "s")
+            if tipo == "i":
+                valores = pd.to_numeric(df[col].str.strip()).astype("Int64").fillna(INT_NULO).to_numpy(np.int64)
+            elif tipo == "f":
+                valores = df[col].astype(float).to_numpy()
+            else:
+                valores = internar(df[col])
+            colunas[f"{nome}.{col}"] = valores
+            tabelas[nome]["colunas"][col] = tipo
+            if tipo == "t":
+                colunas[f"{nome}.{col}_segundos"] = hora_para_segundos_coluna(df[col])
+
+    strings = TabelaStrings.de_lista(list(internadas))
+    tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=Path(destino).parent))
+    try:
+        for nome, valores in colunas.items():
+            np.save(tmp / f"{nome}.npy", valores)
+        for nome, valores in zip(("blob", "offsets", "ordem"), strings._arrays):
+            np.save(tmp / f"strings.{nome}.npy", valores)
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"versao": FORMATO_VERSAO, "origem": str(pasta), "tabelas": tabelas}, f, indent=2)
+        # Troca atómica: outro processo pode ter compilado o mesmo feed entretanto
+        try:
+            os.rename(tmp, destino)
+        except OSError:
+            if not Path(destino).exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+class FeedCompilado:
+    def __init__(self, diretorio: str):
+        self.diretorio = Path(diretorio)
+        with open(self.diretorio / "meta.json", encoding="utf-8") as f:
+            self._meta = json.load(f)
+        self.hash = self.diretorio.name
+        self.strings = TabelaStrings(*(np.load(self.diretorio / f"strings.{nome}.npy", mmap_mode="r")
+                                       for nome in ("blob", "offsets", "ordem")))
+        self._colunas = {}
+
+    @property
+    def tabelas(self) -> list:
+        return list(self._meta["tabelas"])
+
+    def __contains__(self, tabela: str) -> bool:
+        return tabela in self._meta["tabelas"]
+
+    def linhas(self, tabela: str) -> int:
+        return self._meta["tabelas"][tabela]["linhas"]
+
+    def colunas(self, tabela: str) -> dict:
+        return dict(self._meta["tabelas"][tabela]["colunas"])
+
+    def coluna(self, tabela: str, col: str) -> np.ndarray:
+        chave = f"{tabela}.{col}"
+        if chave not in self._colunas:
+            self._colunas[chave] = np.load(self.diretorio / f"{chave}.npy", mmap_mode="r")
+        return self._colunas[chave]
+
+    # Código da string -> linha da tabela com esse valor em col (-1 se não
+    # existe; em ids repetidos fica a última linha)
+    def linhas_por_codigo(self, tabela: str, col: str) -> np.ndarray:
+        chaves = np.asarray(self.coluna(tabela, col)).astype(np.int64)
+        pos = np.full(len(self.strings) + 1, -1, dtype=np.int64)
+        unicos, ultimo = np.unique(chaves[::-1], return_index=True)
+        pos[unicos] = len(chaves) - 1 - ultimo
+        return pos
+
+    # Tabela descodificada (strings/None, int/None, float), como no CSV original
+    def tabela(self, nome: str) -> pd.DataFrame:
+        dados = {}
+        for col, tipo in self.colunas(nome).items():
+            valores = self.coluna(nome, col)
+            if tipo == "i":
+                lista = np.asarray(valores).tolist()
+                dados[col] = pd.Series([None if v == INT_NULO else v for v in lista], dtype=object)
+            elif tipo == "f":
+                dados[col] = pd.Series(np.asarray(valores))
+            else:
+                dados[col] = pd.Series(self.strings.descodificar(valores), dtype=object)
+        return pd.DataFrame(dados, columns=list(self.colunas(nome)))
+
+# Abre a cache do feed, compilando-a se os .txt mudaram
+def abrir_feed(pasta: str, pasta_cache: str = PASTA_CACHE) -> FeedCompilado:
+    destino = Path(pasta_cache) / hash_feed(pasta)
+    if not (destino / "meta.json").exists():
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        compilar_feed(pasta, str(destino))
+    return FeedCompilado(str(destino))
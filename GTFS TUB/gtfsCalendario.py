@@ -0,0 +1,76 @@
+from datetime import date, datetime
+from typing import Union
+import pandas as pd, numpy as np
+from gtfsCache import PASTA_GTFS
+
+DIAS_SEMANA = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+def data_gtfs(valor: Union[str, date]) -> date:
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(str(valor).strip(), "%Y%m%d").date()
+
+# Calendário de serviços: calendar.txt (dias da semana entre start_date e end_date)
+# e calendar_dates.txt (exceções: 1 = serviço acrescentado, 2 = serviço removido)
+# expandidos num bitset de dias por serviço, sobre a janela de validade do feed
+class CalendarioServicos:
+    def __init__(self, calendar: pd.DataFrame, calendar_dates: pd.DataFrame):
+        calendar = calendar if calendar is not None else pd.DataFrame(columns=["service_id", "start_date", "end_date"])
+        calendar_dates = calendar_dates if calendar_dates is not None else pd.DataFrame(columns=["service_id", "date", "exception_type"])
+
+        inicios = [data_gtfs(v) for v in calendar["start_date"]]
+        fins = [data_gtfs(v) for v in calendar["end_date"]]
+        datas_exc = [data_gtfs(v) for v in calendar_dates["date"]]
+        todas = inicios + fins + datas_exc
+        self.inicio = min(todas) if todas else date.today()
+        self.fim = max(todas) if todas else self.inicio
+        n_dias = (self.fim - self.inicio).days + 1
+
+        ids = list(dict.fromkeys([str(s) for s in calendar["service_id"]] +
+                                 [str(s) for s in calendar_dates["service_id"]]))
+        self._indice = {s: i for i, s in enumerate(ids)}
+        ativos = np.zeros((len(ids), n_dias), dtype=bool)
+
+        # Dia da semana de cada dia da janela (0 = segunda)
+        dia_semana = (np.arange(n_dias) + self.inicio.weekday()) % 7
+        for (_, row), ini, fim in zip(calendar.iterrows(), inicios, fins):
+            flags = np.array([int(row[d]) == 1 for d in DIAS_SEMANA])
+            a, b = (ini - self.inicio).days, (fim - self.inicio).days + 1
+            ativos[self._indice[str(row["service_id"])], a:b] = flags[dia_semana[a:b]]
+        for service_id, dia, tipo in zip(calendar_dates["service_id"], datas_exc, calendar_dates["exception_type"]):
+            ativos[self._indice[str(service_id)], (dia - self.inicio).days] = int(tipo) == 1
+
+        self._bits = np.packbits(ativos, axis=1)
+        self._cache = {}
+
+    @classmethod
+    def de_txt(cls, pasta: str = PASTA_GTFS) -> "CalendarioServicos":
+        def ler(nome):
+            try:
+                return pd.read_csv(f"{pasta}/{nome}", dtype=str)
+            except FileNotFoundError:
+                return None
+        return cls(ler("calendar.txt"), ler("calendar_dates.txt"))
+
+    def _dia(self, data: Union[str, date]) -> int:
+        dia = (data_gtfs(data) - self.inicio).days
+        return dia if 0 <= dia <= (self.fim - self.inicio).days else -1
+
+    def ativo(self, service_id: str, data: Union[str, date]) -> bool:
+        i, dia = self._indice.get(str(service_id)), self._dia(data)
+        if i is None or dia < 0:
+            return False
+        return bool((self._bits[i, dia >> 3] >> (7 - (dia & 7))) & 1)
+
+    # Conjunto dos service_id ativos na data (guardado em cache por data)
+    def servicos_ativos(self, data: Union[str, date]) -> frozenset:
+        dia = self._dia(data)
+        if dia not in self._cache:
+            if dia < 0:
+                self._cache[dia] = frozenset()
+            else:
+                coluna = (self._bits[:, dia >> 3] >> (7 - (dia & 7))) & 1
+                self._cache[dia] = frozenset(s for s, i in self._indice.items() if coluna[i])
+        return self._cache[dia]
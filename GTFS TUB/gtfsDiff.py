@@ -0,0 +1,191 @@
+import json
+import sys
+from pathlib import Path
+from typing import NamedTuple
+import pandas as pd, numpy as np
+from gtfsTUB import (GtfsFeed, GtfsAgency, GtfsStop, GtfsRoute, GtfsTrip, GtfsStopTime, GtfsCalendarRule,
+                     GtfsCalendarDateRule, GtfsFareAttribute, GtfsFareRule, GtfsShape,
+                     escrever_ngsi_ld, iter_gtfs_RouteTripStop_ngsi, shapes_tabela,
+                     shapes_to_ngsi_ld_columnar, stop_times_tabela, stop_times_to_ngsi_ld_columnar)
+
+# Diferenças entre duas versões do feed: cada linha é identificada pelo URN da
+# entidade que gera (o mesmo dos *_to_ngsi_ld) e comparada por um hash das
+# colunas que o modelo usa; só as linhas novas ou alteradas são convertidas
+
+# tabela: (modelo, tipo NGSI-LD, colunas do URN)
+CHAVES = {
+    "agency": (GtfsAgency, "GtfsAgency", ["agency_id"]),
+    "stops": (GtfsStop, "GtfsStop", ["stop_id"]),
+    "routes": (GtfsRoute, "GtfsRoute", ["route_id"]),
+    "trips": (GtfsTrip, "GtfsTrip", ["trip_id"]),
+    "stop_times": (GtfsStopTime, "GtfsStopTime", ["trip_id", "stop_sequence"]),
+    "calendar": (GtfsCalendarRule, "GtfsCalendarRule", ["service_id"]),
+    "calendar_dates": (GtfsCalendarDateRule, "GtfsCalendarDateRule", ["service_id", "date"]),
+    "fare_attributes": (GtfsFareAttribute, "GtfsFareAttribute", ["fare_id"]),
+    "fare_rules": (GtfsFareRule, "GtfsFareRule", ["fare_id", "contains_id"]),
+    "shapes": (GtfsShape, "GtfsShape", ["shape_id", "shape_pt_sequence"]),
+}
+INTEIROS = ("stop_sequence", "shape_pt_sequence")
+
+# Colunas de trips, routes e stops que entram em GtfsRouteTripStop
+COLUNAS_RTS = {
+    "trips": ["trip_id", "route_id", "service_id", "trip_headsign", "direction_id", "shape_id"],
+    "routes": ["route_id", "agency_id", "route_short_name", "route_long_name", "route_type"],
+    "stops": ["stop_id", "stop_name", "stop_lat", "stop_lon", "zone_id"],
+}
+
+class DiffTabela(NamedTuple):
+    criadas: list       # entidades NGSI-LD
+    atualizadas: list   # entidades NGSI-LD
+    removidas: list     # URNs
+
+def ler_tabela_bruta(pasta: str, tabela: str) -> pd.DataFrame:
+    caminho = Path(pasta) / f"{tabela}.txt"
+    if not caminho.exists():
+        return pd.DataFrame()
+    df = pd.read_csv(caminho, dtype=str, encoding="utf-8-sig").replace({np.nan: None})
+    df.columns = df.columns.str.strip()
+    return df
+
+def _texto_chave(df: pd.DataFrame, col: str) -> pd.Series:
+    # Como nos modelos: inteiros normalizados ("01" -> "1") e None -> "None"
+    valores = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+    if col in INTEIROS:
+        numeros = pd.to_numeric(valores.str.strip(), errors="coerce")
+        valores = numeros.astype("Int64").astype(str).where(numeros.notna(), valores)
+    return valores.astype(object).where(valores.notna(), "None").astype(str)
+
+def urns_tabela(df: pd.DataFrame, tabela: str) -> pd.Series:
+    _, tipo, colunas = CHAVES[tabela]
+    chave = _texto_chave(df, colunas[0])
+    for col in colunas[1:]:
+        chave = chave + "_" + _texto_chave(df, col)
+    return f"urn:ngsi-ld:{tipo}:" + chave
+
+def hash_linhas(df: pd.DataFrame, colunas: list) -> np.ndarray:
+    # Colunas em falta contam como vazias, para um feed com uma coluna opcional
+    # a mais ou a menos não marcar todas as linhas como alteradas
+    if not len(df):
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df.reindex(columns=sorted(colunas)).fillna(""), index=False).to_numpy()
+
+def _colunas_modelo(tabela: str) -> list:
+    modelo = CHAVES[tabela][0]
+    return [c for c in modelo.__fields__ if c != "type"]
+
+def _comparar(urns_a: pd.Series, hash_a: np.ndarray, urns_b: pd.Series, hash_b: np.ndarray):
+    # Em URNs repetidos conta a última linha, como na conversão
+    a = pd.Series(hash_a, index=urns_a.to_numpy())
+    b = pd.Series(hash_b, index=urns_b.to_numpy())
+    a = a[~a.index.duplicated(keep="last")]
+    b = b[~b.index.duplicated(keep="last")]
+    existentes = b.index.isin(a.index)
+    criadas = b.index[~existentes]
+    comuns = b.index[existentes]
+    atualizadas = comuns[b[comuns].to_numpy() != a[comuns].to_numpy()]
+    removidas = a.index[~a.index.isin(b.index)]
+    return list(criadas), list(atualizadas), list(removidas)
+
+def _linhas(df: pd.DataFrame, urns: pd.Series, escolhidos: set) -> pd.DataFrame:
+    mascara = urns.isin(escolhidos).to_numpy() & ~urns.duplicated(keep="last").to_numpy()
+    return df[mascara]
+
+def _separar(entidades, criadas: list, atualizadas: list) -> DiffTabela:
+    por_id = {e["id"]: e for e in entidades}
+    return DiffTabela([por_id[u] for u in criadas if u in por_id],
+                      [por_id[u] for u in atualizadas if u in por_id], [])
+
+def diff_tabela(antigo: str, novo: str, tabela: str, feed_novo: GtfsFeed = None) -> DiffTabela:
+    if tabela == "route_trip_stop":
+        return diff_route_trip_stop(antigo, novo, feed_novo)
+    if tabela not in CHAVES:
+        raise ValueError(f"Tabela GTFS inválida: '{tabela}'. Usar uma de {list(CHAVES) + ['route_trip_stop']}.")
+    feed_novo = feed_novo or GtfsFeed(novo)
+    colunas = _colunas_modelo(tabela)
+    df_a, df_b = ler_tabela_bruta(antigo, tabela), ler_tabela_bruta(novo, tabela)
+    urns_a, urns_b = urns_tabela(df_a, tabela), urns_tabela(df_b, tabela)
+    criadas, atualizadas, removidas = _comparar(urns_a, hash_linhas(df_a, colunas), urns_b, hash_linhas(df_b, colunas))
+
+    if not criadas and not atualizadas:
+        entidades = []
+    elif tabela == "stop_times":
+        entidades = stop_times_to_ngsi_ld_columnar(stop_times_tabela(_linhas(df_b, urns_b, set(criadas + atualizadas))))
+    elif tabela == "shapes":
+        entidades = shapes_to_ngsi_ld_columnar(shapes_tabela(_linhas(df_b, urns_b, set(criadas + atualizadas))))
+    else:
+        entidades = feed_novo.ngsi(tabela, lazy=True)
+    return _separar(entidades, criadas, atualizadas)._replace(removidas=removidas)
+
+# Hash de cada chave (0 se não existir), sem passar por float: um reindex com
+# chaves em falta converte os uint64 em float64 e perde precisão
+def _hash_por_chave(hashes: pd.Series, chaves: pd.Series) -> np.ndarray:
+    pos = hashes.index.get_indexer(chaves.to_numpy())
+    valores = hashes.to_numpy(dtype=np.uint64)
+    return np.where(pos >= 0, valores[pos] if len(valores) else np.uint64(0), np.uint64(0)).astype(np.uint64)
+
+# GtfsRouteTripStop: o hash de cada linha de stop_times é combinado com os
+# hashes da trip, da route e da stop, para apanhar alterações nas dimensões
+def _route_trip_stop_urns_hashes(pasta: str):
+    st = ler_tabela_bruta(pasta, "stop_times")
+    dims = {t: ler_tabela_bruta(pasta, t) for t in COLUNAS_RTS}
+    if not len(st) or not len(dims["trips"]):
+        return st, pd.Series([], dtype=str), np.empty(0, dtype=np.uint64)
+
+    def por_id(tabela, col):
+        df = dims[tabela]
+        h = pd.Series(hash_linhas(df, COLUNAS_RTS[tabela]), index=df[col].to_numpy()) if len(df) else pd.Series([], dtype=np.uint64)
+        return h[~h.index.duplicated(keep="last")]
+
+    h_trip, h_route, h_stop = por_id("trips", "trip_id"), por_id("routes", "route_id"), por_id("stops", "stop_id")
+    rota_da_trip = dims["trips"].drop_duplicates("trip_id", keep="last").set_index("trip_id")["route_id"]
+
+    st = st[st["trip_id"].isin(h_trip.index).to_numpy()]
+    seq = _texto_chave(st, "stop_sequence")
+    urns = ("urn:ngsi-ld:GtfsRouteTripStop:"
+            + st["trip_id"].astype(str).str.rsplit(":", n=1).str[-1] + "_"
+            + st["stop_id"].astype(str).str.rsplit(":", n=1).str[-1] + "_" + seq)
+    componentes = pd.DataFrame({
+        "stop_time": hash_linhas(st, _colunas_modelo("stop_times")),
+        "trip": _hash_por_chave(h_trip, st["trip_id"]),
+        "route": _hash_por_chave(h_route, rota_da_trip.reindex(st["trip_id"])),
+        "stop": _hash_por_chave(h_stop, st["stop_id"]),
+    })
+    return st, urns, pd.util.hash_pandas_object(componentes, index=False).to_numpy()
+
+def diff_route_trip_stop(antigo: str, novo: str, feed_novo: GtfsFeed = None) -> DiffTabela:
+    feed_novo = feed_novo or GtfsFeed(novo)
+    _, urns_a, hash_a = _route_trip_stop_urns_hashes(antigo)
+    st_b, urns_b, hash_b = _route_trip_stop_urns_hashes(novo)
+    criadas, atualizadas, removidas = _comparar(urns_a, hash_a, urns_b, hash_b)
+    entidades = []
+    if criadas or atualizadas:
+        linhas = stop_times_tabela(_linhas(st_b, urns_b, set(criadas + atualizadas)))
+        entidades = iter_gtfs_RouteTripStop_ngsi([linhas], *feed_novo.dimensoes_route_trip_stop())
+    return _separar(entidades, criadas, atualizadas)._replace(removidas=removidas)
+
+def diff_feeds(antigo: str, novo: str, tabelas: list = None) -> dict:
+    feed_novo = GtfsFeed(novo)
+    tabelas = tabelas or list(CHAVES) + ["route_trip_stop"]
+    return {t: diff_tabela(antigo, novo, t, feed_novo) for t in tabelas}
+
+# Por tabela: {tabela}_delta.jsonld (entidades a criar/atualizar) e
+# {tabela}_removidas.json (URNs a apagar), só para as tabelas com alterações
+def escrever_diff(diff: dict, pasta: str = ".", formato: str = None, **opcoes) -> None:
+    Path(pasta).mkdir(parents=True, exist_ok=True)
+    for tabela, d in diff.items():
+        if d.criadas or d.atualizadas:
+            escrever_ngsi_ld(d.criadas + d.atualizadas, str(Path(pasta) / f"{tabela}_delta.jsonld"), formato, **opcoes)
+        if d.removidas:
+            with open(Path(pasta) / f"{tabela}_removidas.json", "w", encoding="utf-8") as f:
+                json.dump(d.removidas, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    # python gtfsDiff.py <pasta_antiga> <pasta_nova> [pasta_saida]
+    antigo, novo = sys.argv[1], sys.argv[2]
+    diff = diff_feeds(antigo, novo)
+    print(f"{'Tabela':<20} {'Criadas':>10} {'Atualizadas':>12} {'Removidas':>10}")
+    print("-" * 55)
+    for tabela, d in diff.items():
+        print(f"{tabela:<20} {len(d.criadas):>10} {len(d.atualizadas):>12} {len(d.removidas):>10}")
+    escrever_diff(diff, sys.argv[3] if len(sys.argv) > 3 else "gtfs_diff")
@@ -1,125 +1,266 @@
-
-print("\n")
-print("\n")
-print("\n")
-print("\n")
-
-
-import json
-
-with open("GtfsRouteTripStop.jsonld", "r", encoding="utf-8") as f:
-    routetripstop_ngsi = json.load(f)
-
-def mostrar_tabela_paragens(trip_id: str):
-    trip_urn = f"urn:ngsi-ld:GtfsTrip:{trip_id}"
-    entidades = [e for e in routetripstop_ngsi if e["hasTrip"]["object"] == trip_urn]
-    entidades.sort(key=lambda e: e["stopSequence"]["value"])
-
-    max_len = max(len(e["stopName"]["value"]) for e in entidades)
-    col_width = max(20, max_len + 2)
-
-    print(f"{'Sequência':<10} {'Nº da Paragem':<15} {'Nome da Paragem':<{col_width}} {'Tempo de Chegada':<10}")
-    print("-" * (col_width + 44))
-
-    for e in entidades:
-        seq = e["stopSequence"]["value"]
-        stop_name = e["stopName"]["value"]
-        stop_id = e["hasStop"]["object"].split(":")[-1]  # extrair apenas o id (sem URN completo)
-        arr = e["arrivalTime"]["value"]
-        print(f"{seq:<10} {stop_id:<15} {stop_name:<{col_width}} {arr:<10}")
-
-# Exemplo
-mostrar_tabela_paragens("87_157")
-
-print("\n")
-print("\n")
-print("\n")
-print("\n")
-
-def mostrar_autocarros_paragem(stop_id: str):
-    stop_urn = f"urn:ngsi-ld:GtfsStop:{stop_id}"
-    entidades = [e for e in routetripstop_ngsi if e["hasStop"]["object"] == stop_urn]
-    rotas_vistas = set()
-    entidades.sort(key=lambda e: e["arrivalTime"]["value"])
-
-    max_len_short = max(len(e.get("routeShortName", {}).get("value", "-")) for e in entidades)
-    max_len_long  = max(len(e.get("routeLongName", {}).get("value", "-")) for e in entidades)
-    col_width_short = max(20, max_len_short + 2)
-    col_width_long  = max(20, max_len_long + 2)
-
-    print(f"{'Nº do Autocarro':<{col_width_short}} {'Nome do Autocarro':<{col_width_long}}")
-    print("-" * (col_width_short + col_width_long))
-
-    for e in entidades:
-        route_short = e.get("routeShortName", {}).get("value", "-")
-        route_long  = e.get("routeLongName", {}).get("value", "-")
-        chave = (route_short, route_long)
-        if chave in rotas_vistas:
-            continue
-        rotas_vistas.add(chave)
-        print(f"{route_short:<{col_width_short}} {route_long:<{col_width_long}}")
-
-# Exemplo
-mostrar_autocarros_paragem("1722")
-
-from datetime import datetime, timedelta
-
-print("\n")
-print("\n")
-print("\n")
-print("\n")
-
-from datetime import datetime, timedelta
-
-def mostrar_autocarros_15min(stop_id: str, hora: str):
-    stop_urn = f"urn:ngsi-ld:GtfsStop:{stop_id}"
-    entidades = [e for e in routetripstop_ngsi if e["hasStop"]["object"] == stop_urn]
-
-    hora_atual = datetime.strptime(hora, "%H:%M:%S")
-
-    limite = hora_atual + timedelta(minutes=15)
-
-    # filtrar autocarros que chegam nos próximos 15 minutos
-    proximos = []
-    for e in entidades:
-        arr_time_str = e["arrivalTime"]["value"]
-        arr_time = datetime.strptime(arr_time_str, "%H:%M:%S")
-        if hora_atual <= arr_time <= limite:
-            proximos.append((arr_time, e))
-
-    # ordenar pela hora de chegada
-    proximos.sort(key=lambda x: x[0])
-
-    max_len_short = max(len(e[1].get("routeShortName", {}).get("value", "-")) for e in proximos)
-    max_len_long  = max(len(e[1].get("routeLongName", {}).get("value", "-")) for e in proximos)
-    col_width_short = max(20, max_len_short + 2)
-    col_width_long  = max(20, max_len_long + 2)
-
-    print(f"{'Nº do Autocarro':<{col_width_short}} {'Nome do Autocarro':<{col_width_long}} {'Tempo de Chegada':<25} {'Em (Minutos e Segundos)':<20}")
-    print("-" * (col_width_short + col_width_long + 51))
-
-    rotas_vistas = set()
-    for arr_time, e in proximos:
-        route_short = e.get("routeShortName", {}).get("value", "-")
-        route_long  = e.get("routeLongName", {}).get("value", "-")
-        chave = (route_short, route_long)
-        if chave in rotas_vistas:
-            continue
-        rotas_vistas.add(chave)
-        delta = arr_time - hora_atual
-        total_segundos = int(delta.total_seconds())
-        if total_segundos <= 0:
-            tempo_restante = "A passar na paragem"
-        else:
-            minutos, segundos = divmod(total_segundos, 60)
-            tempo_restante = f"{minutos:02d}m{segundos:02d}s"
-        print(f"{route_short:<{col_width_short}} {route_long:<{col_width_long}} {arr_time.strftime('%H:%M:%S'):<25} {tempo_restante:<20}")
-
-# Exemplo
-mostrar_autocarros_15min("1722", "13:00:00")
-
-
-print("\n")
-print("\n")
-print("\n")
-print("\n")
\ No newline at end of file
+import json
+from datetime import date, timedelta
+from typing import NamedTuple, Optional, Union
+import numpy as np
+from gtfsCalendario import CalendarioServicos, data_gtfs
+from gtfsCache import PASTA_GTFS, FeedCompilado, TabelaStrings, abrir_feed
+
+# Horas GTFS podem passar das 24:00:00 (viagens que terminam depois da meia-noite)
+SEGUNDOS_DIA = 24 * 3600
+
+def hora_para_segundos(hora: str) -> int:
+    h, m, s = hora.strip().split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+def segundos_para_hora(segundos: int) -> str:
+    h, resto = divmod(int(segundos), 3600)
+    return f"{h:02d}:{resto // 60:02d}:{resto % 60:02d}"
+
+# Resultados das consultas
+class ParagemViagem(NamedTuple):
+    stop_sequence: int
+    stop_id: str
+    stop_name: Optional[str]
+    arrival_time: str
+
+class Autocarro(NamedTuple):
+    route_short_name: str
+    route_long_name: str
+
+class Passagem(NamedTuple):
+    route_short_name: str
+    route_long_name: str
+    arrival_time: str
+    em_segundos: int
+
+# Índices construídos uma vez sobre colunas inteiras (strings internadas numa
+# TabelaStrings): stop_times ordenados por (viagem, stopSequence) e por
+# (paragem, hora de chegada), com procura binária em numpy.
+# Com um CalendarioServicos, as consultas aceitam uma data e só devolvem
+# viagens cujo serviço está ativo nesse dia.
+class ConsultasHorarios:
+    def __init__(self, entidades: list, calendario: Optional[CalendarioServicos] = None):
+        internadas = {}
+        def cod(v):
+            return -1 if v is None else internadas.setdefault(v, len(internadas))
+        cols = {k: [] for k in ("trip", "stop", "seq", "arr_s", "arr", "servico", "short", "long", "nome")}
+        for e in entidades:
+            arr = e["arrivalTime"]["value"]
+            cols["trip"].append(cod(e["hasTrip"]["object"].split(":")[-1]))
+            cols["stop"].append(cod(e["hasStop"]["object"].split(":")[-1]))
+            cols["seq"].append(e["stopSequence"]["value"])
+            cols["arr_s"].append(hora_para_segundos(arr))
+            cols["arr"].append(cod(arr))
+            cols["servico"].append(cod(e.get("hasService", {}).get("object", "").split(":")[-1] or None))
+            cols["short"].append(cod(e.get("routeShortName", {}).get("value")))
+            cols["long"].append(cod(e.get("routeLongName", {}).get("value")))
+            cols["nome"].append(cod(e.get("stopName", {}).get("value")))
+        self._indexar(TabelaStrings.de_lista(list(internadas)),
+                      {k: np.array(v, dtype=np.int64) for k, v in cols.items()}, calendario)
+
+    @classmethod
+    def de_ficheiro(cls, caminho: str = "GtfsRouteTripStop.jsonld",
+                    calendario: Optional[CalendarioServicos] = None) -> "ConsultasHorarios":
+        with open(caminho, "r", encoding="utf-8") as f:
+            return cls(json.load(f), calendario)
+
+    # A partir da cache binária do feed (gtfsCache), sem passar pelo JSON:
+    # mesma junção que o GtfsRouteTripStop (stop_times sem trip são ignorados)
+    @classmethod
+    def de_feed(cls, feed: FeedCompilado, calendario: Optional[CalendarioServicos] = None) -> "ConsultasHorarios":
+        def buscar(tabela, col, linhas):
+            valores = np.asarray(feed.coluna(tabela, col)).astype(np.int64)
+            return np.where(linhas >= 0, valores[np.maximum(linhas, 0)], -1)
+
+        trip = np.asarray(feed.coluna("stop_times", "trip_id")).astype(np.int64)
+        viagem = feed.linhas_por_codigo("trips", "trip_id")[trip]
+        tem_trip = viagem >= 0
+        viagem = viagem[tem_trip]
+        rota = feed.linhas_por_codigo("routes", "route_id")[buscar("trips", "route_id", viagem)]
+        stop = np.asarray(feed.coluna("stop_times", "stop_id")).astype(np.int64)[tem_trip]
+        paragem = feed.linhas_por_codigo("stops", "stop_id")[stop]
+        cols = {
+            "trip": trip[tem_trip],
+            "stop": stop,
+            "seq": np.asarray(feed.coluna("stop_times", "stop_sequence"))[tem_trip],
+            "arr_s": np.asarray(feed.coluna("stop_times", "arrival_time_segundos")).astype(np.int64)[tem_trip],
+            "arr": np.asarray(feed.coluna("stop_times", "arrival_time")).astype(np.int64)[tem_trip],
+            "servico": buscar("trips", "service_id", viagem),
+            "short": buscar("routes", "route_short_name", rota),
+            "long": buscar("routes", "route_long_name", rota),
+            "nome": buscar("stops", "stop_name", paragem),
+        }
+        consultas = cls.__new__(cls)
+        consultas._indexar(feed.strings, cols, calendario)
+        return consultas
+
+    def _indexar(self, strings: TabelaStrings, cols: dict, calendario: Optional[CalendarioServicos]):
+        self.strings = strings
+        self.calendario = calendario
+        self._codigos_ativos = {}
+        o = np.lexsort((cols["seq"], cols["trip"]))
+        self._v = {k: cols[k][o] for k in ("trip", "seq", "stop", "nome", "arr", "servico")}
+        o = np.lexsort((cols["arr_s"], cols["stop"]))
+        self._p = {k: cols[k][o] for k in ("stop", "arr_s", "arr", "short", "long", "servico")}
+        # Pares (autocarro, serviço) distintos por paragem, pela ordem da primeira passagem
+        chaves = [self._p[k] for k in ("servico", "long", "short", "stop")]
+        o = np.lexsort([np.arange(len(o))] + chaves)
+        repetido = np.zeros(len(o), dtype=bool)
+        repetido[1:] = True
+        for c in chaves:
+            ordenada = c[o]
+            repetido[1:] &= ordenada[1:] == ordenada[:-1]
+        primeiro = np.sort(o[~repetido])
+        self._r = {k: self._p[k][primeiro] for k in ("stop", "short", "long", "servico")}
+
+    def _texto(self, codigo: int, omissao=None):
+        return omissao if codigo < 0 else self.strings[codigo]
+
+    # Códigos dos serviços ativos na data (None = sem filtro)
+    def _ativos(self, data: Optional[Union[str, date]]) -> Optional[frozenset]:
+        if data is None:
+            return None
+        if self.calendario is None:
+            raise ValueError("Consulta por data requer um CalendarioServicos.")
+        servicos = self.calendario.servicos_ativos(data)
+        if servicos not in self._codigos_ativos:
+            self._codigos_ativos[servicos] = frozenset(self.strings.codigo(s) for s in servicos)
+        return self._codigos_ativos[servicos]
+
+    def _fatia(self, chaves: np.ndarray, texto: str):
+        c = self.strings.codigo(texto)
+        if c < 0:
+            return 0, 0
+        return int(np.searchsorted(chaves, c, "left")), int(np.searchsorted(chaves, c, "right"))
+
+    def paragens_da_viagem(self, trip_id: str, data: Optional[Union[str, date]] = None) -> list:
+        a, b = self._fatia(self._v["trip"], trip_id)
+        ativos = self._ativos(data)
+        if a == b or (ativos is not None and int(self._v["servico"][b - 1]) not in ativos):
+            return []
+        v = self._v
+        return [ParagemViagem(seq, self.strings[stop], self._texto(nome), self.strings[arr])
+                for seq, stop, nome, arr in zip(v["seq"][a:b].tolist(), v["stop"][a:b].tolist(),
+                                                v["nome"][a:b].tolist(), v["arr"][a:b].tolist())]
+
+    # Autocarros distintos que passam na paragem, pela ordem da primeira passagem
+    def autocarros_da_paragem(self, stop_id: str, data: Optional[Union[str, date]] = None) -> list:
+        a, b = self._fatia(self._r["stop"], stop_id)
+        ativos = self._ativos(data)
+        p = {k: self._r[k][a:b].tolist() for k in ("short", "long", "servico")}
+        pares = dict.fromkeys((short, long_) for short, long_, servico in zip(p["short"], p["long"], p["servico"])
+                              if ativos is None or servico in ativos)
+        return [Autocarro(self._texto(s, "-"), self._texto(l, "-")) for s, l in pares]
+
+    # Primeira passagem de cada autocarro nos próximos `minutos` a partir de `hora`
+    def proximos_autocarros(self, stop_id: str, hora: Union[str, int], minutos: int = 15,
+                            data: Optional[Union[str, date]] = None) -> list:
+        inicio = hora_para_segundos(hora) if isinstance(hora, str) else hora
+        fim = inicio + minutos * 60
+        a, b = self._fatia(self._p["stop"], stop_id)
+        chegadas = self._p["arr_s"][a:b]
+
+        encontradas = []
+        # Com data, também as viagens do dia de serviço anterior com horas
+        # depois das 24:00 (sem data não se sabe se esse dia teve serviço)
+        dias = [(0, data)]
+        if data is not None:
+            dias.append((SEGUNDOS_DIA, data_gtfs(data) - timedelta(days=1)))
+        for base, dia in dias:
+            ativos = self._ativos(dia)
+            i = a + int(np.searchsorted(chegadas, inicio + base, "left"))
+            j = a + int(np.searchsorted(chegadas, fim + base, "right"))
+            p = {k: self._p[k][i:j].tolist() for k in ("arr_s", "servico", "short", "long", "arr")}
+            encontradas += [(seg - base, short, long_, arr)
+                            for seg, servico, short, long_, arr in zip(p["arr_s"], p["servico"], p["short"], p["long"], p["arr"])
+                            if ativos is None or servico in ativos]
+        encontradas.sort(key=lambda x: x[0])
+
+        vistas = set()
+        out = []
+        for segundos, short, long_, arr in encontradas:
+            if (short, long_) in vistas:
+                continue
+            vistas.add((short, long_))
+            out.append(Passagem(self._texto(short, "-"), self._texto(long_, "-"), self.strings[arr], segundos - inicio))
+        return out
+
+# Consultas sobre o feed por omissão, preparadas só no primeiro uso; a cache
+# binária é compilada na primeira execução e reaberta (mmap) nas seguintes
+_consultas = None
+
+def consultas_padrao() -> ConsultasHorarios:
+    global _consultas
+    if _consultas is None:
+        feed = abrir_feed(PASTA_GTFS)
+        calendario = CalendarioServicos(feed.tabela("calendar"), feed.tabela("calendar_dates"))
+        _consultas = ConsultasHorarios.de_feed(feed, calendario)
+    return _consultas
+
+def mostrar_tabela_paragens(trip_id: str, data: Optional[date] = None, consultas: Optional[ConsultasHorarios] = None):
+    paragens = (consultas or consultas_padrao()).paragens_da_viagem(trip_id, data)
+
+    max_len = max((len(p.stop_name or "") for p in paragens), default=0)
+    col_width = max(20, max_len + 2)
+
+    print(f"{'Sequência':<10} {'Nº da Paragem':<15} {'Nome da Paragem':<{col_width}} {'Tempo de Chegada':<10}")
+    print("-" * (col_width + 44))
+
+    for p in paragens:
+        print(f"{p.stop_sequence:<10} {p.stop_id:<15} {p.stop_name or '-':<{col_width}} {p.arrival_time:<10}")
+
+def mostrar_autocarros_paragem(stop_id: str, data: Optional[date] = None, consultas: Optional[ConsultasHorarios] = None):
+    autocarros = (consultas or consultas_padrao()).autocarros_da_paragem(stop_id, data)
+
+    max_len_short = max((len(a.route_short_name) for a in autocarros), default=0)
+    max_len_long  = max((len(a.route_long_name) for a in autocarros), default=0)
+    col_width_short = max(20, max_len_short + 2)
+    col_width_long  = max(20, max_len_long + 2)
+
+    print(f"{'Nº do Autocarro':<{col_width_short}} {'Nome do Autocarro':<{col_width_long}}")
+    print("-" * (col_width_short + col_width_long))
+
+    for a in autocarros:
+        print(f"{a.route_short_name:<{col_width_short}} {a.route_long_name:<{col_width_long}}")
+
+def mostrar_autocarros_15min(stop_id: str, hora: str, data: Optional[date] = None, consultas: Optional[ConsultasHorarios] = None):
+    proximos = (consultas or consultas_padrao()).proximos_autocarros(stop_id, hora, minutos=15, data=data)
+
+    max_len_short = max((len(p.route_short_name) for p in proximos), default=0)
+    max_len_long  = max((len(p.route_long_name) for p in proximos), default=0)
+    col_width_short = max(20, max_len_short + 2)
+    col_width_long  = max(20, max_len_long + 2)
+
+    print(f"{'Nº do Autocarro':<{col_width_short}} {'Nome do Autocarro':<{col_width_long}} {'Tempo de Chegada':<25} {'Em (Minutos e Segundos)':<20}")
+    print("-" * (col_width_short + col_width_long + 51))
+
+    for p in proximos:
+        if p.em_segundos <= 0:
+            tempo_restante = "A passar na paragem"
+        else:
+            minutos, segundos = divmod(p.em_segundos, 60)
+            tempo_restante = f"{minutos:02d}m{segundos:02d}s"
+        print(f"{p.route_short_name:<{col_width_short}} {p.route_long_name:<{col_width_long}} {p.arrival_time:<25} {tempo_restante:<20}")
+
+
+if __name__ == "__main__":
+    for _ in range(4):
+        print("\n")
+
+    # Exemplo
+    mostrar_tabela_paragens("87_157")
+
+    for _ in range(4):
+        print("\n")
+
+    # Exemplo
+    mostrar_autocarros_paragem("1722")
+
+    for _ in range(4):
+        print("\n")
+
+    # Exemplo (segunda-feira, 4 de novembro de 2024)
+    mostrar_autocarros_15min("1722", "13:00:00", date(2024, 11, 4))
+
+    for _ in range(4):
+        print("\n")
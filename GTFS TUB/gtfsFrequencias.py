@@ -0,0 +1,190 @@
+from datetime import date, timedelta
+from typing import Optional, Union
+import pandas as pd, numpy as np
+from gtfsCalendario import CalendarioServicos, data_gtfs
+from gtfsCache import INT_NULO, PASTA_GTFS, FeedCompilado, abrir_feed
+from gtfsFiltrar import segundos_para_hora
+
+# Frequências de serviço por rota e sentido numa data: partidas de cada viagem
+# (na primeira paragem ou numa paragem escolhida), intervalos entre partidas
+# consecutivas, viagens por hora, primeira/última partida e amplitude do serviço.
+# As datas com o mesmo conjunto de serviços ativos partilham o resultado.
+class FrequenciasServico:
+    def __init__(self, feed: FeedCompilado, calendario: Optional[CalendarioServicos] = None):
+        self.strings = feed.strings
+        self.calendario = calendario
+
+        def coluna(tabela, col):
+            return np.asarray(feed.coluna(tabela, col)).astype(np.int64)
+
+        viagem = feed.linhas_por_codigo("trips", "trip_id")[coluna("stop_times", "trip_id")]
+        tem_trip = viagem >= 0
+        viagem = viagem[tem_trip]
+        seq = coluna("stop_times", "stop_sequence")[tem_trip]
+        o = np.lexsort((seq, viagem))
+        # Uma linha por passagem, ordenada por (viagem, stopSequence)
+        self._viagem = viagem[o]
+        self._paragem = coluna("stop_times", "stop_id")[tem_trip][o]
+        self._partida = coluna("stop_times", "departure_time_segundos")[tem_trip][o]
+        self._primeira = np.r_[True, self._viagem[1:] != self._viagem[:-1]]
+
+        rota = coluna("trips", "route_id")
+        sentido = coluna("trips", "direction_id")
+        self._trip_id = coluna("trips", "trip_id")
+        self._trip_rota = rota
+        self._trip_sentido = np.where(sentido == INT_NULO, -1, sentido)
+        self._trip_servico = coluna("trips", "service_id")
+        linha_rota = feed.linhas_por_codigo("routes", "route_id")[rota]
+        nomes = coluna("routes", "route_short_name")
+        self._trip_nome = np.where(linha_rota >= 0, nomes[np.maximum(linha_rota, 0)], -1)
+        self._cache = {}
+
+    @classmethod
+    def de_txt(cls, pasta: str = PASTA_GTFS) -> "FrequenciasServico":
+        feed = abrir_feed(pasta)
+        return cls(feed, CalendarioServicos(feed.tabela("calendar"), feed.tabela("calendar_dates")))
+
+    def _servicos(self, data: Optional[Union[str, date]]) -> Optional[frozenset]:
+        if data is None:
+            return None
+        if self.calendario is None:
+            raise ValueError("Consulta por data requer um CalendarioServicos.")
+        return self.calendario.servicos_ativos(data)
+
+    # Partidas (uma linha por viagem ou por passagem na paragem), ordenadas por
+    # rota, sentido e hora, com o intervalo para a partida anterior (NaN na primeira)
+    def partidas(self, data: Optional[Union[str, date]] = None, paragem: Optional[str] = None) -> pd.DataFrame:
+        servicos = self._servicos(data)
+        chave = (servicos, paragem)
+        if chave not in self._cache:
+            if paragem is None:
+                linhas = self._primeira
+            else:
+                linhas = self._paragem == self.strings.codigo(paragem)
+            viagem = self._viagem[linhas]
+            if servicos is not None:
+                codigos = [self.strings.codigo(s) for s in servicos]
+                ativa = np.isin(self._trip_servico[viagem], codigos)
+                viagem, partida = viagem[ativa], self._partida[linhas][ativa]
+            else:
+                partida = self._partida[linhas]
+            rota = self._trip_rota[viagem]
+            sentido = self._trip_sentido[viagem]
+            o = np.lexsort((partida, sentido, rota))
+            rota, sentido, partida, viagem = rota[o], sentido[o], partida[o], viagem[o]
+            novo_grupo = np.r_[True, (rota[1:] != rota[:-1]) | (sentido[1:] != sentido[:-1])][:len(rota)]
+            intervalo = np.diff(partida, prepend=partida[:1]).astype(float)
+            intervalo[novo_grupo] = np.nan
+            self._cache[chave] = pd.DataFrame({
+                "route_id": self.strings.descodificar(rota),
+                "route_short_name": [None if c < 0 else self.strings[c] for c in self._trip_nome[viagem].tolist()],
+                "direction_id": sentido,
+                "trip_id": self.strings.descodificar(self._trip_id[viagem]),
+                "partida_s": partida,
+                "hora": partida // 3600,
+                "intervalo_s": intervalo,
+            })
+        return self._cache[chave]
+
+    # Viagens e intervalo médio por rota, sentido e hora de partida
+    def por_hora(self, data: Optional[Union[str, date]] = None, paragem: Optional[str] = None) -> pd.DataFrame:
+        return (self.partidas(data, paragem)
+                .groupby(["route_id", "route_short_name", "direction_id", "hora"], sort=True, dropna=False)
+                .agg(viagens=("trip_id", "size"), intervalo_medio_s=("intervalo_s", "mean"))
+                .reset_index())
+
+    # Uma linha por rota e sentido; a hora de ponta é a hora com mais partidas
+    def resumo(self, data: Optional[Union[str, date]] = None, paragem: Optional[str] = None) -> pd.DataFrame:
+        chave = ("resumo", self._servicos(data), paragem)
+        if chave in self._cache:
+            return self._cache[chave]
+        colunas = ["route_id", "route_short_name", "direction_id"]
+        partidas = self.partidas(data, paragem)
+        resumo = (partidas.groupby(colunas, sort=True, dropna=False)
+                  .agg(viagens=("trip_id", "size"),
+                       primeira_partida_s=("partida_s", "min"),
+                       ultima_partida_s=("partida_s", "max"),
+                       intervalo_min_s=("intervalo_s", "min"),
+                       intervalo_medio_s=("intervalo_s", "mean"),
+                       intervalo_mediano_s=("intervalo_s", "median"),
+                       intervalo_max_s=("intervalo_s", "max"))
+                  .reset_index())
+        resumo["amplitude_s"] = resumo["ultima_partida_s"] - resumo["primeira_partida_s"]
+        pico = (self.por_hora(data, paragem)
+                .sort_values(colunas + ["viagens", "hora"], ascending=[True, True, True, False, True], kind="stable")
+                .drop_duplicates(colunas)
+                .rename(columns={"hora": "hora_ponta", "viagens": "viagens_hora_ponta",
+                                 "intervalo_medio_s": "intervalo_ponta_s"}))
+        self._cache[chave] = resumo.merge(pico, on=colunas, how="left")
+        return self._cache[chave]
+
+    # Resumo para cada data do período (inclusive), com a coluna "data" em YYYYMMDD
+    def resumo_periodo(self, inicio: Union[str, date], fim: Union[str, date],
+                       paragem: Optional[str] = None) -> pd.DataFrame:
+        inicio, fim = data_gtfs(inicio), data_gtfs(fim)
+        tabelas = []
+        for i in range((fim - inicio).days + 1):
+            dia = inicio + timedelta(days=i)
+            tabelas.append(self.resumo(dia, paragem).assign(data=dia.strftime("%Y%m%d")))
+        return pd.concat(tabelas, ignore_index=True) if tabelas else self.resumo(None, paragem).assign(data=None)
+
+    def to_ngsi_ld(self, data: Optional[Union[str, date]] = None, paragem: Optional[str] = None) -> list:
+        return frequencias_to_ngsi_ld(self.resumo(data, paragem), self.por_hora(data, paragem),
+                                      None if data is None else data_gtfs(data), paragem)
+
+def frequencias_to_ngsi_ld(resumo: pd.DataFrame, por_hora: pd.DataFrame,
+                           data: Optional[date] = None, paragem: Optional[str] = None) -> list:
+    def segundos(v):
+        return None if pd.isna(v) else int(round(v))
+
+    por_grupo = {chave: dict(zip(g["hora"].tolist(), g["viagens"].tolist()))
+                 for chave, g in por_hora.groupby(["route_id", "direction_id"], sort=False)}
+    sufixo = (f"_{paragem}" if paragem else "") + (f"_{data.strftime('%Y%m%d')}" if data else "")
+    out = []
+    for r in resumo.to_dict("records"):
+        sentido = None if r["direction_id"] < 0 else int(r["direction_id"])
+        ngsi = {"id": f"urn:ngsi-ld:GtfsRouteFrequency:{r['route_id']}_{r['direction_id']}{sufixo}",
+                "type": "GtfsRouteFrequency",
+                "hasRoute": {"type": "Relationship", "object": f"urn:ngsi-ld:GtfsRoute:{r['route_id']}"}}
+        if paragem:
+            ngsi["hasStop"] = {"type": "Relationship", "object": f"urn:ngsi-ld:GtfsStop:{paragem}"}
+        if sentido is not None:
+            ngsi["direction"] = {"type": "Property", "value": sentido}
+        if data:
+            ngsi["appliesOn"] = {"type": "Property", "value": data.strftime("%Y%m%d")}
+        ngsi["numberOfTrips"] = {"type": "Property", "value": int(r["viagens"])}
+        ngsi["firstDeparture"] = {"type": "Property", "value": segundos_para_hora(r["primeira_partida_s"])}
+        ngsi["lastDeparture"] = {"type": "Property", "value": segundos_para_hora(r["ultima_partida_s"])}
+        ngsi["serviceSpan"] = {"type": "Property", "value": int(r["amplitude_s"]), "unitCode": "SEC"}
+        for nome, col in (("headwayMin", "intervalo_min_s"), ("headwayMean", "intervalo_medio_s"),
+                          ("headwayMedian", "intervalo_mediano_s"), ("headwayMax", "intervalo_max_s"),
+                          ("peakHeadway", "intervalo_ponta_s")):
+            if segundos(r[col]) is not None:
+                ngsi[nome] = {"type": "Property", "value": segundos(r[col]), "unitCode": "SEC"}
+        ngsi["peakHour"] = {"type": "Property", "value": f"{int(r['hora_ponta']):02d}:00"}
+        ngsi["peakTrips"] = {"type": "Property", "value": int(r["viagens_hora_ponta"])}
+        horas = por_grupo.get((r["route_id"], r["direction_id"]), {})
+        ngsi["tripsPerHour"] = {"type": "Property", "value": {f"{h:02d}:00": int(n) for h, n in horas.items()}}
+        ngsi["@context"] = [
+            "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
+        ]
+        out.append(ngsi)
+    return out
+
+def mostrar_resumo(resumo: pd.DataFrame):
+    print(f"{'Linha':<8} {'Sentido':<8} {'Viagens':>8} {'Primeira':>10} {'Última':>10} "
+          f"{'Interv. médio':>14} {'Ponta':>6} {'Interv. ponta':>14}")
+    print("-" * 86)
+    for r in resumo.itertuples():
+        medio = "-" if pd.isna(r.intervalo_medio_s) else f"{r.intervalo_medio_s / 60:.1f} min"
+        ponta = "-" if pd.isna(r.intervalo_ponta_s) else f"{r.intervalo_ponta_s / 60:.1f} min"
+        sentido = "-" if r.direction_id < 0 else r.direction_id
+        print(f"{r.route_short_name or r.route_id:<8} {sentido:<8} {r.viagens:>8} "
+              f"{segundos_para_hora(r.primeira_partida_s):>10} {segundos_para_hora(r.ultima_partida_s):>10} "
+              f"{medio:>14} {int(r.hora_ponta):>4}h {ponta:>14}")
+
+
+if __name__ == "__main__":
+    frequencias = FrequenciasServico.de_txt()
+    # Exemplo (segunda-feira, 4 de novembro de 2024)
+    mostrar_resumo(frequencias.resumo(date(2024, 11, 4)))
@@ -0,0 +1,411 @@
+import json
+import math
+import sys
+from bisect import bisect_left
+from datetime import date, timedelta
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+import numpy as np
+from gtfsCalendario import CalendarioServicos, data_gtfs
+from gtfsCache import PASTA_GTFS, FeedCompilado, abrir_feed
+from gtfsFiltrar import SEGUNDOS_DIA, hora_para_segundos, segundos_para_hora
+
+# O índice espacial é partilhado com os outros conjuntos de dados (raiz do repositório)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from indiceEspacial import IndiceEspacial, coordenadas_entidade, haversine_m
+
+INFINITO = 1 << 40
+
+# Resultados: horas em segundos desde a meia-noite da data da consulta
+class Perna(NamedTuple):
+    modo: str                        # "autocarro" ou "a pé"
+    de_stop_id: str
+    para_stop_id: str
+    partida: int
+    chegada: int
+    trip_id: Optional[str] = None
+    route_short_name: Optional[str] = None
+
+class Itinerario(NamedTuple):
+    partida: int
+    chegada: int
+    transbordos: int
+    pernas: list
+
+# Isócrona: arrays alinhados com stop_ids; chegada = -1 se a paragem não é
+# alcançável até limite; autocarros = nº de autocarros usados (0 = só a pé)
+class Isocrona(NamedTuple):
+    origem: str
+    partida: int
+    limite: int
+    stop_ids: list
+    lat: np.ndarray
+    lon: np.ndarray
+    chegada: np.ndarray
+    autocarros: np.ndarray
+    raio_pe_m: float
+    velocidade_pe_m_s: float
+
+# Planeador de viagens RAPTOR (uma ronda por viagem de autocarro) sobre a cache
+# binária do feed. As viagens são agrupadas em padrões (mesma rota e mesma
+# sequência de paragens, sem ultrapassagens), com as horas em matrizes
+# viagem × paragem; os transbordos a pé entre paragens próximas são gerados
+# a partir das coordenadas (distância em linha reta).
+# Devolve as soluções não dominadas em (hora de chegada, nº de transbordos).
+class PlaneadorViagens:
+    def __init__(self, feed: FeedCompilado, calendario: Optional[CalendarioServicos] = None,
+                 raio_pe_m: float = 400.0, velocidade_pe_m_s: float = 1.2, transbordo_s: int = 60):
+        self.strings = feed.strings
+        self.calendario = calendario
+        self.transbordo_s = transbordo_s
+        self.raio_pe_m = raio_pe_m
+        self.velocidade_pe_m_s = velocidade_pe_m_s
+
+        def coluna(tabela, col):
+            return np.asarray(feed.coluna(tabela, col)).astype(np.int64)
+
+        trip = coluna("stop_times", "trip_id")
+        viagem = feed.linhas_por_codigo("trips", "trip_id")[trip]
+        tem_trip = viagem >= 0
+        viagem = viagem[tem_trip]
+        stop = coluna("stop_times", "stop_id")[tem_trip]
+        seq = coluna("stop_times", "stop_sequence")[tem_trip]
+        chegada = coluna("stop_times", "arrival_time_segundos")[tem_trip]
+        partida = coluna("stop_times", "departure_time_segundos")[tem_trip]
+
+        # Paragens numeradas de 0 a n_paragens - 1
+        codigos, paragem = np.unique(stop, return_inverse=True)
+        self.n_paragens = len(codigos)
+        self._stop_ids = feed.strings.descodificar(codigos)
+        self._indice = {s: i for i, s in enumerate(self._stop_ids)}
+
+        self._trip_ids = coluna("trips", "trip_id")
+        self._trip_servico = coluna("trips", "service_id")
+        rota = feed.linhas_por_codigo("routes", "route_id")[coluna("trips", "route_id")]
+        nomes = coluna("routes", "route_short_name")
+        self._trip_rota = np.where(rota >= 0, nomes[np.maximum(rota, 0)], -1)
+
+        # Padrões: viagens com a mesma rota e a mesma sequência de paragens
+        o = np.lexsort((seq, viagem))
+        viagem, paragem, chegada, partida = viagem[o], paragem[o], chegada[o], partida[o]
+        inicios = np.flatnonzero(np.r_[True, viagem[1:] != viagem[:-1]])
+        fins = np.r_[inicios[1:], len(viagem)]
+        grupos = {}
+        for a, b in zip(inicios.tolist(), fins.tolist()):
+            v = int(viagem[a])
+            grupos.setdefault((int(self._trip_rota[v]), paragem[a:b].tobytes()), []).append((v, a, b))
+
+        self._pat_paragens, self._pat_viagens, self._pat_chegadas, self._pat_partidas = [], [], [], []
+        for (_, chave), viagens in grupos.items():
+            paragens = np.frombuffer(chave, dtype=paragem.dtype).tolist()
+            viagens.sort(key=lambda x: (partida[x[1]], x[0]))
+            # Divide o grupo se uma viagem ultrapassa outra (a procura binária
+            # da próxima viagem numa paragem exige a mesma ordem em todas)
+            subgrupos = []
+            for v, a, b in viagens:
+                for sub in subgrupos:
+                    _, ua, ub = sub[-1]
+                    if (partida[a:b] >= partida[ua:ub]).all() and (chegada[a:b] >= chegada[ua:ub]).all():
+                        sub.append((v, a, b))
+                        break
+                else:
+                    subgrupos.append([(v, a, b)])
+            for sub in subgrupos:
+                self._pat_paragens.append(paragens)
+                self._pat_viagens.append(np.array([v for v, _, _ in sub], dtype=np.int64))
+                self._pat_chegadas.append(np.array([chegada[a:b] for _, a, b in sub], dtype=np.int64))
+                self._pat_partidas.append(np.array([partida[a:b] for _, a, b in sub], dtype=np.int64))
+
+        # Paragem -> [(padrão, posição)]
+        self._padroes_da_paragem = [[] for _ in range(self.n_paragens)]
+        for p, paragens in enumerate(self._pat_paragens):
+            for i, s in enumerate(paragens):
+                self._padroes_da_paragem[s].append((p, i))
+
+        # Transbordos a pé: paragem -> [(paragem, segundos)]
+        self._a_pe = [[] for _ in range(self.n_paragens)]
+        linhas = feed.linhas_por_codigo("stops", "stop_id")[codigos]
+        com_coords = np.flatnonzero(linhas >= 0)
+        lat = np.asarray(feed.coluna("stops", "stop_lat"))[linhas[com_coords]]
+        lon = np.asarray(feed.coluna("stops", "stop_lon"))[linhas[com_coords]]
+        validas = ~(np.isnan(lat) | np.isnan(lon))
+        com_coords, lat, lon = com_coords[validas], lat[validas], lon[validas]
+        self._lat = np.full(self.n_paragens, np.nan)
+        self._lon = np.full(self.n_paragens, np.nan)
+        self._lat[com_coords], self._lon[com_coords] = lat, lon
+        if len(com_coords) and raio_pe_m > 0:
+            indice = IndiceEspacial(lat, lon, com_coords.tolist())
+            for s, la, lo in zip(com_coords.tolist(), lat.tolist(), lon.tolist()):
+                self._a_pe[s] = [(q, math.ceil(dist / velocidade_pe_m_s))
+                                 for q, dist in indice.no_raio(la, lo, raio_pe_m) if q != s]
+
+        self._horarios = {}
+
+    @classmethod
+    def de_txt(cls, pasta: str = PASTA_GTFS, **kwargs) -> "PlaneadorViagens":
+        feed = abrir_feed(pasta)
+        return cls(feed, CalendarioServicos(feed.tabela("calendar"), feed.tabela("calendar_dates")), **kwargs)
+
+    # Viagens de cada padrão que circulam na data, incluindo as do dia anterior
+    # que passam da meia-noite (com as horas deslocadas -24h); por padrão fica
+    # (linhas das viagens, partidas por paragem, chegadas por viagem)
+    def _horario(self, data: Optional[Union[str, date]]) -> list:
+        data = None if data is None else data_gtfs(data)
+        if data not in self._horarios:
+            if data is None:
+                hoje, ontem = None, frozenset()
+            else:
+                if self.calendario is None:
+                    raise ValueError("Consulta por data requer um CalendarioServicos.")
+                hoje = [self.strings.codigo(s) for s in self.calendario.servicos_ativos(data)]
+                ontem = [self.strings.codigo(s) for s in self.calendario.servicos_ativos(data - timedelta(days=1))]
+            horario = []
+            for viagens, chegadas, partidas in zip(self._pat_viagens, self._pat_chegadas, self._pat_partidas):
+                servicos = self._trip_servico[viagens]
+                sel_hoje = np.ones(len(viagens), dtype=bool) if hoje is None else np.isin(servicos, hoje)
+                sel_ontem = np.isin(servicos, list(ontem)) & (chegadas[:, -1] >= SEGUNDOS_DIA)
+                v = np.r_[viagens[sel_ontem], viagens[sel_hoje]]
+                c = np.vstack((chegadas[sel_ontem] - SEGUNDOS_DIA, chegadas[sel_hoje]))
+                p = np.vstack((partidas[sel_ontem] - SEGUNDOS_DIA, partidas[sel_hoje]))
+                o = np.argsort(p[:, 0], kind="stable") if len(v) else np.empty(0, dtype=np.int64)
+                horario.append((v[o].tolist(), p[o].T.tolist(), c[o].tolist()))
+            self._horarios[data] = horario
+        return self._horarios[data]
+
+    def _paragem(self, stop_id: str) -> int:
+        s = self._indice.get(str(stop_id))
+        if s is None:
+            raise ValueError(f"Paragem desconhecida: '{stop_id}'.")
+        return s
+
+    # Rondas RAPTOR a partir da paragem o: por ronda k, chegada geral (autocarro
+    # ou a pé) e chegada de autocarro, com o predecessor de cada uma (guardam a
+    # ronda em que foram obtidas). Só conta o que chega até limite e, com um
+    # destino d, o que chega antes da melhor chegada a d.
+    def _rondas(self, o: int, t0: int, horario: list, max_rondas: int, limite: int = INFINITO, d: int = -1) -> list:
+        n = self.n_paragens
+        melhor = [INFINITO] * n
+        melhor_bus = [INFINITO] * n
+        chegada = [INFINITO] * n
+        chegada_bus = [INFINITO] * n
+        pai = [None] * n
+        pai_bus = [None] * n
+        corte = min(limite, INFINITO - 1) + 1
+        chegada[o] = chegada_bus[o] = melhor[o] = melhor_bus[o] = t0
+        if o == d:
+            corte = t0
+        marcadas = {o}
+        for q, w in self._a_pe[o]:
+            a = t0 + w
+            if a < melhor[q] and a < corte:
+                chegada[q] = melhor[q] = a
+                pai[q] = ("pe", o, w, 0)
+                marcadas.add(q)
+                if q == d:
+                    corte = a
+        rondas = [(chegada, chegada_bus, pai, pai_bus)]
+
+        for k in range(1, max_rondas + 1):
+            if not marcadas:
+                break
+            ant_chegada, _, ant_pai, _ = rondas[-1]
+            chegada, chegada_bus = list(ant_chegada), list(rondas[-1][1])
+            pai, pai_bus = list(ant_pai), list(rondas[-1][3])
+
+            fila = {}
+            for s in marcadas:
+                for p, i in self._padroes_da_paragem[s]:
+                    if i < fila.get(p, INFINITO):
+                        fila[p] = i
+
+            novas, melhoradas = [], set()
+            for p, inicio in fila.items():
+                viagens, partidas, chegadas = horario[p]
+                if not viagens:
+                    continue
+                paragens = self._pat_paragens[p]
+                t, embarque = -1, -1
+                for i in range(inicio, len(paragens)):
+                    s = paragens[i]
+                    if t >= 0:
+                        a = chegadas[t][i]
+                        # A chegada de autocarro conta mesmo que não bata a chegada
+                        # a pé, porque os troços a pé só partem de chegadas de autocarro
+                        if a < melhor_bus[s] and a < corte:
+                            chegada_bus[s] = melhor_bus[s] = a
+                            pai_bus[s] = (k, p, t, embarque, i)
+                            novas.append(s)
+                            if a < melhor[s]:
+                                chegada[s] = melhor[s] = a
+                                pai[s] = ("bus", k)
+                                melhoradas.add(s)
+                                if s == d:
+                                    corte = a
+                    pronto = ant_chegada[s]
+                    if pronto < INFINITO:
+                        if ant_pai[s] is not None and ant_pai[s][0] == "bus":
+                            pronto += self.transbordo_s
+                        if t < 0 or pronto <= partidas[i][t]:
+                            j = bisect_left(partidas[i], pronto)
+                            if j < len(viagens) and (t < 0 or j < t):
+                                t, embarque = j, i
+
+            # Um troço a pé depois de cada viagem de autocarro
+            marcadas = melhoradas
+            for s in novas:
+                base = chegada_bus[s]
+                for q, w in self._a_pe[s]:
+                    a = base + w
+                    if a < melhor[q] and a < corte:
+                        chegada[q] = melhor[q] = a
+                        pai[q] = ("pe", s, w, k)
+                        marcadas.add(q)
+                        if q == d:
+                            corte = a
+
+            rondas.append((chegada, chegada_bus, pai, pai_bus))
+        return rondas
+
+    def planear(self, origem: str, destino: str, hora: Union[str, int],
+                data: Optional[Union[str, date]] = None, max_transbordos: int = 4) -> list:
+        o, d = self._paragem(origem), self._paragem(destino)
+        t0 = hora_para_segundos(hora) if isinstance(hora, str) else int(hora)
+        horario = self._horario(data)
+        rondas = self._rondas(o, t0, horario, max_transbordos + 1, d=d)
+        # Uma solução por ronda que melhora a chegada ao destino
+        solucoes = []
+        for k, (chegada, _, _, _) in enumerate(rondas):
+            if chegada[d] < (solucoes[-1][1] if solucoes else INFINITO):
+                solucoes.append((k, chegada[d]))
+        return [self._itinerario(rondas, horario, k, d, t0) for k, _ in solucoes]
+
+    # Chegada mais cedo a todas as paragens alcançáveis até hora + orcamento_s
+    def isocrona(self, origem: str, hora: Union[str, int], orcamento_s: int,
+                 data: Optional[Union[str, date]] = None, max_transbordos: int = 4) -> "Isocrona":
+        o = self._paragem(origem)
+        t0 = hora_para_segundos(hora) if isinstance(hora, str) else int(hora)
+        rondas = self._rondas(o, t0, self._horario(data), max_transbordos + 1, limite=t0 + orcamento_s)
+        chegadas = np.array([r[0] for r in rondas], dtype=np.int64)
+        chegada = chegadas[-1]
+        alcancada = chegada < INFINITO
+        # Autocarros usados: primeira ronda com a chegada final
+        autocarros = np.argmax(chegadas == chegada, axis=0)
+        return Isocrona(self._stop_ids[o], t0, t0 + orcamento_s, self._stop_ids, self._lat, self._lon,
+                        np.where(alcancada, chegada, -1), np.where(alcancada, autocarros, -1),
+                        self.raio_pe_m, self.velocidade_pe_m_s)
+
+    def _itinerario(self, rondas: list, horario: list, k: int, s: int, t0: int) -> Itinerario:
+        pernas = []
+        n_bus = 0
+        while True:
+            chegada, chegada_bus, pai, pai_bus = rondas[k]
+            if pai[s] is None:
+                break
+            if pai[s][0] == "pe":
+                _, q, w, k = pai[s]
+                partida = rondas[k][1][q]
+                pernas.append(Perna("a pé", self._stop_ids[q], self._stop_ids[s], partida, partida + w))
+                s = q
+                if rondas[k][3][s] is None:
+                    break
+            k, p, t, embarque, desembarque = rondas[k][3][s]
+            viagens, partidas, chegadas = horario[p]
+            b = self._pat_paragens[p][embarque]
+            v = viagens[t]
+            pernas.append(Perna("autocarro", self._stop_ids[b], self._stop_ids[s],
+                                partidas[embarque][t], chegadas[t][desembarque],
+                                self.strings[int(self._trip_ids[v])],
+                                self.strings[int(self._trip_rota[v])] if self._trip_rota[v] >= 0 else None))
+            n_bus += 1
+            s, k = b, k - 1
+        pernas.reverse()
+        chegada = pernas[-1].chegada if pernas else t0
+        return Itinerario(t0, chegada, max(n_bus - 1, 0), pernas)
+
+# Chegada a pontos quaisquer (fim a pé a partir das paragens alcançadas),
+# -1 se não são alcançáveis até ao limite da isócrona
+def alcance_pontos(iso: Isocrona, lat, lon, bloco: int = 256) -> np.ndarray:
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    melhor = np.full(len(lat), INFINITO, dtype=np.int64)
+    paragens = np.flatnonzero((iso.chegada >= 0) & ~np.isnan(iso.lat))
+    # Por blocos de paragens, para a matriz de distâncias não crescer demasiado
+    for ini in range(0, len(paragens), bloco):
+        b = paragens[ini:ini + bloco]
+        dist = haversine_m(iso.lat[b, None], iso.lon[b, None], lat[None, :], lon[None, :])
+        t = iso.chegada[b, None] + np.ceil(dist / iso.velocidade_pe_m_s).astype(np.int64)
+        t[dist > iso.raio_pe_m] = INFINITO
+        melhor = np.minimum(melhor, t.min(axis=0, initial=INFINITO))
+    return np.where(melhor <= iso.limite, melhor, -1)
+
+# [(id, chegada)] das entidades NGSI-LD alcançáveis (pelo vértice mais
+# próximo), ordenadas por chegada
+def alcance_entidades(iso: Isocrona, entidades: list, atributo: str = "location") -> list:
+    ids, dono, lat, lon = [], [], [], []
+    for e in entidades:
+        vertices = coordenadas_entidade(e, atributo)
+        if not vertices:
+            continue
+        for v in vertices:
+            lon.append(v[0])
+            lat.append(v[1])
+            dono.append(len(ids))
+        ids.append(e["id"])
+    t = alcance_pontos(iso, lat, lon)
+    melhor = np.full(len(ids), INFINITO, dtype=np.int64)
+    np.minimum.at(melhor, np.asarray(dono, dtype=np.int64), np.where(t >= 0, t, INFINITO))
+    return [(ids[i], int(melhor[i])) for i in np.argsort(melhor, kind="stable").tolist() if melhor[i] < INFINITO]
+
+# FeatureCollection GeoJSON no formato NGSI-LD (application/geo+json): uma
+# Feature por paragem alcançada e, se forem dadas, por entidade alcançada
+def isocrona_para_geojson(iso: Isocrona, entidades: Optional[list] = None, atributo: str = "location") -> dict:
+    def feature(id_, tipo, lon, lat, chegada):
+        return {
+            "id": id_,
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {
+                "type": tipo,
+                "arrivalTime": {"type": "Property", "value": segundos_para_hora(chegada)},
+                "travelTime": {"type": "Property", "value": chegada - iso.partida, "unitCode": "SEC"},
+            },
+        }
+
+    features = []
+    for i in np.flatnonzero((iso.chegada >= 0) & ~np.isnan(iso.lat)).tolist():
+        features.append(feature(f"urn:ngsi-ld:GtfsStop:{iso.stop_ids[i]}", "GtfsStop",
+                                float(iso.lon[i]), float(iso.lat[i]), int(iso.chegada[i])))
+    if entidades:
+        por_id = {e["id"]: e for e in entidades}
+        for id_, chegada in alcance_entidades(iso, entidades, atributo):
+            lon, lat = coordenadas_entidade(por_id[id_], atributo)[0]
+            features.append(feature(id_, por_id[id_].get("type"), lon, lat, chegada))
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "@context": [
+            "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
+        ],
+    }
+
+def mostrar_itinerarios(itinerarios: list):
+    for it in itinerarios:
+        print(f"Chegada {segundos_para_hora(it.chegada)} | {it.transbordos} transbordo(s) | "
+              f"{(it.chegada - it.partida) // 60} min")
+        for perna in it.pernas:
+            linha = f"Autocarro {perna.route_short_name or '-'}" if perna.modo == "autocarro" else "A pé"
+            print(f"  {segundos_para_hora(perna.partida)} {perna.de_stop_id:<8} -> "
+                  f"{segundos_para_hora(perna.chegada)} {perna.para_stop_id:<8} {linha}")
+        print()
+
+
+if __name__ == "__main__":
+    planeador = PlaneadorViagens.de_txt()
+    # Exemplo (segunda-feira, 4 de novembro de 2024, às 08:10)
+    mostrar_itinerarios(planeador.planear("1722", "1001", "08:10:00", date(2024, 11, 4)))
+
+    # Esculturas alcançáveis em 20 minutos a partir da paragem 1722, às 10:00
+    iso = planeador.isocrona("1722", "10:00:00", 20 * 60, date(2024, 11, 4))
+    with open(Path(__file__).resolve().parent.parent / "estatuarias_ngsi.jsonld", "r", encoding="utf-8") as f:
+        estatuarias = json.load(f)
+    for id_, chegada in alcance_entidades(iso, estatuarias):
+        print(f"{id_:<45} {segundos_para_hora(chegada)}")
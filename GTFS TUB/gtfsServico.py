@@ -0,0 +1,193 @@
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+from gtfsCache import ESQUEMA, PASTA_GTFS, abrir_feed
+from gtfsCalendario import CalendarioServicos, data_gtfs
+from gtfsFiltrar import ConsultasHorarios
+
+# Serviço HTTP/1.1 (asyncio, só biblioteca padrão) com as consultas do gtfsFiltrar:
+#   GET  /viagens/{trip_id}/paragens[?data=YYYYMMDD]
+#   GET  /paragens/{stop_id}/autocarros[?data=YYYYMMDD]
+#   GET  /paragens/{stop_id}/proximos?hora=HH:MM:SS[&minutos=15][&data=YYYYMMDD]
+#   GET  /estado
+#   POST /recarregar
+# Os índices são construídos no arranque. Um feed novo (POST /recarregar ou
+# alteração dos .txt) é carregado numa thread e trocado de uma vez: os pedidos
+# em curso terminam com os índices antigos e nenhum pedido fica por responder.
+
+ESTADOS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+class ErroHttp(Exception):
+    def __init__(self, estado: int, mensagem: str):
+        super().__init__(mensagem)
+        self.estado = estado
+
+# Parâmetros validados aqui, para a resposta 400 explicar o formato esperado
+_HORA = re.compile(r"\d{1,2}:[0-5]\d:[0-5]\d")
+
+def _parametro_data(q: dict):
+    valor = q.get("data")
+    if valor is None:
+        return None
+    try:
+        return data_gtfs(valor)
+    except ValueError:
+        raise ErroHttp(400, f"Parâmetro inválido: 'data' = '{valor}' (YYYYMMDD).") from None
+
+def _parametro_hora(q: dict) -> str:
+    if "hora" not in q:
+        raise ErroHttp(400, "Parâmetro em falta: 'hora' (HH:MM:SS).")
+    if not _HORA.fullmatch(q["hora"].strip()):
+        raise ErroHttp(400, f"Parâmetro inválido: 'hora' = '{q['hora']}' (HH:MM:SS).")
+    return q["hora"]
+
+def _parametro_minutos(q: dict) -> int:
+    valor = q.get("minutos", "15")
+    if not valor.strip().isdigit():
+        raise ErroHttp(400, f"Parâmetro inválido: 'minutos' = '{valor}' (inteiro não negativo).")
+    return int(valor)
+
+def carregar_consultas(pasta: str):
+    feed = abrir_feed(pasta)
+    calendario = CalendarioServicos(feed.tabela("calendar"), feed.tabela("calendar_dates"))
+    return ConsultasHorarios.de_feed(feed, calendario), feed.hash
+
+class ServicoHorarios:
+    def __init__(self, pasta: str = PASTA_GTFS):
+        self.pasta = pasta
+        self.consultas, self.hash = carregar_consultas(pasta)
+        self.carregado_em = time.time()
+        self.pedidos = 0
+        self._assinatura = self._assinatura_ficheiros()
+        self._recarga = asyncio.Lock()
+
+    # Data de modificação e tamanho dos .txt, para detetar um feed novo sem ler os ficheiros
+    def _assinatura_ficheiros(self) -> tuple:
+        out = []
+        for nome in sorted(ESQUEMA):
+            caminho = Path(self.pasta) / f"{nome}.txt"
+            if caminho.exists():
+                st = caminho.stat()
+                out.append((nome, st.st_mtime_ns, st.st_size))
+        return tuple(out)
+
+    async def recarregar(self) -> bool:
+        async with self._recarga:
+            assinatura = await asyncio.to_thread(self._assinatura_ficheiros)
+            consultas, hash_ = await asyncio.to_thread(carregar_consultas, self.pasta)
+            mudou = hash_ != self.hash
+            self.consultas, self.hash, self.carregado_em = consultas, hash_, time.time()
+            # Só depois de carregar: se falhar, vigiar volta a tentar
+            self._assinatura = assinatura
+            return mudou
+
+    async def vigiar(self, intervalo_s: float = 30.0):
+        while True:
+            await asyncio.sleep(intervalo_s)
+            if await asyncio.to_thread(self._assinatura_ficheiros) == self._assinatura:
+                continue
+            try:
+                if await self.recarregar():
+                    print(f"Feed recarregado ({self.hash[:12]})")
+            except Exception as e:
+                # Um feed inválido não substitui o que está em serviço
+                print(f"Aviso: não foi possível recarregar o feed: {e}")
+
+    async def responder(self, metodo: str, alvo: str):
+        url = urlsplit(alvo)
+        partes = [unquote(p) for p in url.path.split("/") if p]
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        consultas = self.consultas
+
+        if partes == ["recarregar"]:
+            if metodo != "POST":
+                raise ErroHttp(405, "Usar POST.")
+            return {"recarregado": await self.recarregar(), "hash": self.hash}
+        if metodo != "GET":
+            raise ErroHttp(405, "Usar GET.")
+        if partes == ["estado"]:
+            return {"hash": self.hash, "carregado_em": self.carregado_em, "pedidos": self.pedidos}
+        if len(partes) == 3 and partes[0] == "viagens" and partes[2] == "paragens":
+            return [p._asdict() for p in consultas.paragens_da_viagem(partes[1], _parametro_data(q))]
+        if len(partes) == 3 and partes[0] == "paragens" and partes[2] == "autocarros":
+            return [a._asdict() for a in consultas.autocarros_da_paragem(partes[1], _parametro_data(q))]
+        if len(partes) == 3 and partes[0] == "paragens" and partes[2] == "proximos":
+            hora, minutos, data = _parametro_hora(q), _parametro_minutos(q), _parametro_data(q)
+            return [p._asdict() for p in consultas.proximos_autocarros(partes[1], hora, minutos=minutos, data=data)]
+        raise ErroHttp(404, f"Recurso desconhecido: '{url.path}'.")
+
+    async def ligacao(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    cabecalho = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(_resposta(431, {"erro": ESTADOS[431]}, False))
+                    break
+                linhas = cabecalho.decode("latin-1").split("\r\n")
+                try:
+                    metodo, alvo, versao = linhas[0].split(" ")
+                    cabecalhos = {k.strip().lower(): v.strip()
+                                  for k, _, v in (l.partition(":") for l in linhas[1:] if l)}
+                    tamanho = int(cabecalhos.get("content-length") or 0)
+                    if tamanho < 0:
+                        raise ValueError(tamanho)
+                except ValueError:
+                    writer.write(_resposta(400, {"erro": "Pedido HTTP inválido."}, False))
+                    break
+                if tamanho:
+                    await reader.readexactly(tamanho)
+                ligacao = cabecalhos.get("connection", "").lower()
+                manter = ligacao != "close" if versao == "HTTP/1.1" else ligacao == "keep-alive"
+
+                self.pedidos += 1
+                try:
+                    estado, corpo = 200, await self.responder(metodo, alvo)
+                except ErroHttp as e:
+                    estado, corpo = e.estado, {"erro": str(e)}
+                except ValueError as e:
+                    estado, corpo = 400, {"erro": str(e)}
+                except Exception as e:
+                    estado, corpo = 500, {"erro": f"{type(e).__name__}: {e}"}
+                writer.write(_resposta(estado, corpo, manter))
+                await writer.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def _resposta(estado: int, corpo, manter: bool) -> bytes:
+    dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+    return (f"HTTP/1.1 {estado} {ESTADOS[estado]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(dados)}\r\n"
+            f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n").encode("latin-1") + dados
+
+async def servir(host: str = "127.0.0.1", porta: int = 8080, pasta: str = PASTA_GTFS, vigiar_s: float = 30.0):
+    servico = await asyncio.to_thread(ServicoHorarios, pasta)
+    servidor = await asyncio.start_server(servico.ligacao, host, porta)
+    vigia = asyncio.create_task(servico.vigiar(vigiar_s)) if vigiar_s else None
+    print(f"A servir em http://{host}:{porta} (feed {servico.hash[:12]})")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        if vigia:
+            vigia.cancel()
+
+
+if __name__ == "__main__":
+    # python gtfsServico.py [porta]
+    try:
+        asyncio.run(servir(porta=int(sys.argv[1]) if len(sys.argv) > 1 else 8080))
+    except KeyboardInterrupt:
+        pass
@@ -1,7 +1,163 @@
 from pydantic import BaseModel, Field, AnyUrl
 from typing import Optional
+from pathlib import Path
+import sys
 import pandas as pd, numpy as np, json
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from saidaNgsiLd import escrever_ngsi_ld
+from instrumentacaoNgsiLd import etapa, medido, medir_iteravel
+from mapeamentoNgsiLd import Geo, Mapeamento, Relacao, mapeador
+from gtfsCache import PASTA_GTFS
+
+CONTEXTO_GTFS = ("https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld",)
+
+# Validação por colunas: as linhas que falham as verificações vetoriais
+# são validadas uma a uma pelo modelo pydantic correspondente
+_RE_INT = r"[+-]?\d+"
+_RE_FLOAT = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+
+def _linhas_invalidas(df: pd.DataFrame, obrigatorios=(), inteiros=(), decimais=(), anulaveis=()) -> np.ndarray:
+    invalidas = np.zeros(len(df), dtype=bool)
+    for col in obrigatorios:
+        invalidas |= df[col].isna().to_numpy()
+    for col, padrao in [(c, _RE_INT) for c in inteiros] + [(c, _RE_FLOAT) for c in decimais]:
+        ok = df[col].str.fullmatch(padrao).eq(True).to_numpy()
+        # Em colunas anuláveis (Optional[int], Optional[float]) o vazio é válido
+        if col in anulaveis:
+            ok |= df[col].isna().to_numpy()
+        invalidas |= ~ok
+    return invalidas
+
+# Valores das colunas `campos` de df: nas linhas válidas são convertidos por
+# colunas (int/float); as inválidas passam pelo modelo pydantic, que converte
+# o valor ou levanta o mesmo erro. Partilhado por tabelas tipadas e registos.
+def _colunas_validadas(df: pd.DataFrame, modelo, campos, invalidas: np.ndarray,
+                       inteiros=(), decimais=()) -> list:
+    validas = ~invalidas
+    colunas = []
+    for c in campos:
+        valores = df[c].to_numpy(dtype=object).copy() if c in df.columns else np.full(len(df), None, dtype=object)
+        if c in inteiros or c in decimais:
+            preenchidas = validas & ~pd.isna(valores)
+            tipo = np.int64 if c in inteiros else float
+            valores[preenchidas] = valores[preenchidas].astype(tipo).tolist()
+        colunas.append(valores)
+    for pos in np.flatnonzero(invalidas):
+        obj = modelo(**df.iloc[pos].to_dict())
+        for i, c in enumerate(campos):
+            colunas[i][pos] = getattr(obj, c)
+    return colunas
+
+def _tabela_tipada(df: pd.DataFrame, model, obrigatorios=(), inteiros=(), decimais=()) -> pd.DataFrame:
+    invalidas = _linhas_invalidas(df, obrigatorios, inteiros, decimais)
+    colunas = _colunas_validadas(df, model, obrigatorios, invalidas, inteiros, decimais)
+    tabela = pd.DataFrame(dict(zip(obrigatorios, colunas)), index=df.index, columns=list(obrigatorios))
+    for col in inteiros:
+        tabela[col] = tabela[col].astype(np.int64)
+    for col in decimais:
+        tabela[col] = tabela[col].astype(float)
+    return tabela
+
+# Leitura por blocos, para as tabelas grandes (stop_times, shapes) não
+# serem carregadas inteiras em memória
+def ler_csv_em_blocos(caminho: str, chunksize: int = 50_000, **kwargs):
+    nome = Path(caminho).name
+    blocos = iter(pd.read_csv(caminho, dtype=str, chunksize=chunksize, **kwargs))
+    while True:
+        with etapa("leitura_csv", nome) as e:
+            bloco = next(blocos, None)
+            e.linhas = 0 if bloco is None else len(bloco)
+        if bloco is None:
+            return
+        with etapa("nan_para_none", nome, len(bloco)):
+            bloco = bloco.replace({np.nan: None})
+            bloco.columns = bloco.columns.str.strip()
+        yield bloco
+
+# Registos compactos: classes com __slots__ geradas a partir dos modelos
+# pydantic (mesmos campos e aliases), para as linhas que só servem de
+# transporte até à conversão NGSI-LD. .dict() aceita os mesmos argumentos
+# que o do modelo, por isso os *_to_ngsi_ld funcionam com os dois.
+class _Registo:
+    __slots__ = ()
+    modelo = None
+    _campos = ()
+    _aliases = {}
+
+    def __init__(self, *valores):
+        for campo, valor in zip(self._campos, valores):
+            object.__setattr__(self, campo, valor)
+
+    def dict(self, by_alias: bool = False, exclude_unset: bool = False, exclude_none: bool = False,
+             include: Optional[set] = None) -> dict:
+        out = {}
+        for campo in self.modelo.__fields__:
+            if include is not None and campo not in include:
+                continue
+            if campo == "type":
+                # Nunca vem do CSV: só conta como definido com exclude_unset=False
+                if exclude_unset:
+                    continue
+                valor = self.type
+            else:
+                valor = getattr(self, campo)
+            if exclude_none and valor is None:
+                continue
+            out[self._aliases[campo] if by_alias else campo] = valor
+        return out
+
+    def para_modelo(self):
+        return self.modelo(**{c: getattr(self, c) for c in self._campos})
+
+    def __eq__(self, outro) -> bool:
+        return type(self) is type(outro) and all(getattr(self, c) == getattr(outro, c) for c in self._campos)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{c}={getattr(self, c)!r}' for c in self._campos)})"
+
+_REGISTOS = {}
+
+def registo_compacto(modelo) -> type:
+    if modelo not in _REGISTOS:
+        campos = tuple(c for c in modelo.__fields__ if c != "type")
+        _REGISTOS[modelo] = type(f"{modelo.__name__}Registo", (_Registo,), {
+            "__slots__": campos,
+            "modelo": modelo,
+            "type": modelo.__fields__["type"].default,
+            "_campos": campos,
+            "_aliases": {c: f.alias for c, f in modelo.__fields__.items()},
+        })
+    return _REGISTOS[modelo]
+
+# Leitura em bloco para registos compactos: as regras do modelo (obrigatório,
+# int, float) são verificadas por colunas e só as linhas que falham passam
+# pelo modelo pydantic, que converte o valor ou levanta o mesmo erro.
+# Campos de outros tipos (ex.: AnyUrl) levam todas as linhas ao modelo.
+def ler_registos(caminho: str, modelo, **kwargs) -> list:
+    registo = registo_compacto(modelo)
+    nome = Path(caminho).name
+    with etapa("leitura_csv", nome) as e:
+        df = pd.read_csv(caminho, dtype=str, **kwargs)
+        e.linhas = len(df)
+    with etapa("nan_para_none", nome, len(df)):
+        df = df.replace({np.nan: None})
+    with etapa("modelos", registo.type, len(df)):
+        return _registos_do_csv(df, modelo, registo)
+
+def _registos_do_csv(df: pd.DataFrame, modelo, registo) -> list:
+    campos = {c: modelo.__fields__[c] for c in registo._campos}
+    inteiros = [c for c, f in campos.items() if f.type_ is int]
+    decimais = [c for c, f in campos.items() if f.type_ is float]
+    if all(f.type_ in (str, int, float) for f in campos.values()) and set(campos) <= set(df.columns):
+        invalidas = _linhas_invalidas(df, obrigatorios=[c for c, f in campos.items() if not f.allow_none],
+                                      inteiros=inteiros, decimais=decimais,
+                                      anulaveis=[c for c, f in campos.items() if f.allow_none])
+    else:
+        invalidas = np.ones(len(df), dtype=bool)
+    colunas = _colunas_validadas(df, modelo, campos, invalidas, inteiros, decimais)
+    return [registo(*linha) for linha in zip(*(v.tolist() for v in colunas))]
+
 # GtfsAgency
 class GtfsAgency(BaseModel):
     agency_id: str
@@ -16,27 +172,13 @@ class GtfsAgency(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/agency.txt", dtype=str).replace({np.nan: None})
-agencies = [GtfsAgency.parse_obj(row.to_dict()) for _, row in df.iterrows()]
+def ler_agency(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    return [GtfsAgency.parse_obj(row.to_dict()) for _, row in df.iterrows()]
 
-def agency_to_ngsi_ld(agency: GtfsAgency) -> dict:
-    data = agency.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsAgency:{data['agency_id']}",
-            "type": "GtfsAgency"}
-    for key, value in data.items():
-        if key in ("agency_id","@type"):
-            continue
-        else:
-            ngsi[key] = {
-                "type": "Property",
-                "value": value if not isinstance(value, list) else [v for v in value if v]
-            }
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
-
-gtfsAgency_ngsi = [agency_to_ngsi_ld(a) for a in agencies]
+agency_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsAgency", ("agency_id",), CONTEXTO_GTFS, ignorar=("agency_id",)),
+    GtfsAgency, "agency_to_ngsi_ld")
 
 
 
@@ -54,28 +196,17 @@ class GtfsStop(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/stops.txt", dtype=str).replace({np.nan: None})
-df["stop_lat"] = df["stop_lat"].astype(float)
-df["stop_lon"] = df["stop_lon"].astype(float)
-stops = [GtfsStop(**row.to_dict()) for _, row in df.iterrows()]
-
-def stop_to_ngsi_ld(stop: GtfsStop) -> dict:
-    data = stop.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsStop:{data['stop_id']}", 
-            "type": "GtfsStop"}
-    ngsi["name"] = {"type": "Property", "value": data["name"]}
-    if data.get("zoneCode"):
-        ngsi["zoneCode"] = {"type": "Property", "value": data["zoneCode"]}
-    ngsi["location"] = {
-        "type": "GeoProperty",
-        "value": {"type": "Point", "coordinates": [data["stop_lon"], data["stop_lat"]]}
-    }
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_stops(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    df["stop_lat"] = df["stop_lat"].astype(float)
+    df["stop_lon"] = df["stop_lon"].astype(float)
+    return [GtfsStop(**row.to_dict()) for _, row in df.iterrows()]
 
-stops_ngsi = [stop_to_ngsi_ld(s) for s in stops]
+stop_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsStop", ("stop_id",), CONTEXTO_GTFS,
+               geo={"location": Geo("stop_lon", "stop_lat")},
+               ignorar=("stop_id", "stop_lat", "stop_lon")),
+    GtfsStop, "stop_to_ngsi_ld")
 
 
 
@@ -93,27 +224,15 @@ class GtfsRoute(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/routes.txt", dtype=str).replace({np.nan: None})
-routes = [GtfsRoute(**row.to_dict()) for _, row in df.iterrows()]
-
-def route_to_ngsi_ld(route: GtfsRoute) -> dict:
-    data = route.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsRoute:{data['route_id']}", "type": "GtfsRoute"}
-    for k, v in data.items():
-        if k in ("route_id","type"): continue
-        if k == "operatedBy":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsAgency:{v}"
-            }
-        else:
-            ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_routes(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    return [GtfsRoute(**row.to_dict()) for _, row in df.iterrows()]
 
-routes_ngsi = [route_to_ngsi_ld(r) for r in routes]
+route_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsRoute", ("route_id",), CONTEXTO_GTFS,
+               relacoes={"operatedBy": Relacao("GtfsAgency")},
+               ignorar=("route_id",)),
+    GtfsRoute, "route_to_ngsi_ld")
 
 
 
@@ -132,37 +251,17 @@ class GtfsTrip(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/trips.txt", dtype=str).replace({np.nan: None})
-trips = [GtfsTrip(**row.to_dict()) for _, row in df.iterrows()]
-
-def trip_to_ngsi_ld(trip: GtfsTrip) -> dict:
-    data = trip.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsTrip:{data['trip_id']}", "type": "GtfsTrip"}
-    for k, v in data.items():
-        if k in ("trip_id","type"): continue
-        if k == "hasRoute":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsRoute:{v}"
-            }
-        elif k == "hasService":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsCalendarRule:{v}"
-            }
-        elif k == "hasShape":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsShape:{v}"
-            }
-        else:
-            ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_trips(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    return [GtfsTrip(**row.to_dict()) for _, row in df.iterrows()]
 
-trips_ngsi = [trip_to_ngsi_ld(t) for t in trips]
+trip_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsTrip", ("trip_id",), CONTEXTO_GTFS,
+               relacoes={"hasRoute": Relacao("GtfsRoute"),
+                         "hasService": Relacao("GtfsCalendarRule"),
+                         "hasShape": Relacao("GtfsShape")},
+               ignorar=("trip_id",)),
+    GtfsTrip, "trip_to_ngsi_ld")
 
 
 
@@ -180,34 +279,44 @@ class GtfsStopTime(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/stop_times.txt", dtype=str).replace({np.nan: None})
-df["stop_sequence"] = df["stop_sequence"].astype(int)
-stop_times = [GtfsStopTime(**row.to_dict()) for _, row in df.iterrows()]
-
-def stoptime_to_ngsi_ld(st: GtfsStopTime) -> dict:
-    data = st.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsStopTime:{data['hasTrip']}_{data['stopSequence']}",
-            "type": "GtfsStopTime"}
-    for k, v in data.items():
-        if k in ("type",): continue
-        if k == "hasTrip":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsTrip:{v}"
-            }
-        elif k == "hasStop":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsStop:{v}"
-            }
-        else:
-            ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
+
+stoptime_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsStopTime", ("hasTrip", "stopSequence"), CONTEXTO_GTFS,
+               relacoes={"hasTrip": Relacao("GtfsTrip"), "hasStop": Relacao("GtfsStop")}),
+    GtfsStopTime, "stoptime_to_ngsi_ld")
+
+# Conversão por colunas (equivalente a stoptime_to_ngsi_ld linha a linha)
+@medido("modelos", "GtfsStopTime")
+def stop_times_tabela(df: pd.DataFrame) -> pd.DataFrame:
+    return _tabela_tipada(df, GtfsStopTime,
+                          obrigatorios=("trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"),
+                          inteiros=("stop_sequence",))
+
+@medido("conversao_ngsi_ld", "GtfsStopTime")
+def stop_times_to_ngsi_ld_columnar(tabela: pd.DataFrame) -> list:
+    trip = tabela["trip_id"].astype(str)
+    stop = tabela["stop_id"].astype(str)
+    seq = tabela["stop_sequence"]
+    ids = ("urn:ngsi-ld:GtfsStopTime:" + trip + "_" + seq.astype(str)).tolist()
+    trip_urns = ("urn:ngsi-ld:GtfsTrip:" + trip).tolist()
+    stop_urns = ("urn:ngsi-ld:GtfsStop:" + stop).tolist()
+    return [
+        {"id": id_,
+         "type": "GtfsStopTime",
+         "hasTrip": {"type": "Relationship", "object": trip_urn},
+         "arrivalTime": {"type": "Property", "value": arr},
+         "departureTime": {"type": "Property", "value": dep},
+         "hasStop": {"type": "Relationship", "object": stop_urn},
+         "stopSequence": {"type": "Property", "value": s},
+         "@context": list(CONTEXTO_GTFS)}
+        for id_, trip_urn, arr, dep, stop_urn, s in zip(
+            ids, trip_urns, tabela["arrival_time"].tolist(), tabela["departure_time"].tolist(),
+            stop_urns, seq.tolist())
     ]
-    return ngsi
 
-stop_times_ngsi = [stoptime_to_ngsi_ld(st) for st in stop_times]
+def iter_stop_times_ngsi(caminho: str, chunksize: int = 50_000):
+    for bloco in ler_csv_em_blocos(caminho, chunksize):
+        yield from stop_times_to_ngsi_ld_columnar(stop_times_tabela(bloco))
 
 
 
@@ -230,21 +339,13 @@ class GtfsCalendarRule(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/calendar.txt", dtype=str).replace({np.nan: None})
-calendars = [GtfsCalendarRule(**row.to_dict()) for _, row in df.iterrows()]
-
-def calendar_to_ngsi_ld(c: GtfsCalendarRule) -> dict:
-    data = c.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsCalendarRule:{data['service_id']}", "type": "GtfsCalendarRule"}
-    for k, v in data.items():
-        if k in ("service_id","type"): continue
-        ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_calendar(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    return [GtfsCalendarRule(**row.to_dict()) for _, row in df.iterrows()]
 
-calendars_ngsi = [calendar_to_ngsi_ld(c) for c in calendars]
+calendar_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsCalendarRule", ("service_id",), CONTEXTO_GTFS, ignorar=("service_id",)),
+    GtfsCalendarRule, "calendar_to_ngsi_ld")
 
 
 
@@ -260,28 +361,15 @@ class GtfsCalendarDateRule(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/calendar_dates.txt", dtype=str).replace({np.nan: None})
-df["exception_type"] = df["exception_type"].astype(int)
-cal_dates = [GtfsCalendarDateRule(**row.to_dict()) for _, row in df.iterrows()]
-
-def caldate_to_ngsi_ld(cd: GtfsCalendarDateRule) -> dict:
-    data = cd.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsCalendarDateRule:{data['hasService']}_{data['appliesOn']}",
-            "type": "GtfsCalendarDateRule"}
-    for k, v in data.items():
-        if k in ("type",): continue
-        if k == "hasService":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsCalendarRule:{v}"
-            }
-        ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_calendar_dates(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    df["exception_type"] = df["exception_type"].astype(int)
+    return [GtfsCalendarDateRule(**row.to_dict()) for _, row in df.iterrows()]
 
-cal_dates_ngsi = [caldate_to_ngsi_ld(cd) for cd in cal_dates]
+caldate_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsCalendarDateRule", ("hasService", "appliesOn"), CONTEXTO_GTFS,
+               relacoes={"hasService": Relacao("GtfsCalendarRule")}),
+    GtfsCalendarDateRule, "caldate_to_ngsi_ld")
 
 
 
@@ -300,25 +388,17 @@ class GtfsFareAttribute(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/fare_attributes.txt", dtype=str).replace({np.nan: None})
-df["price"] = df["price"].astype(float)
-df["payment_method"] = df["payment_method"].astype(int)
-df["transfers"] = df["transfers"].astype(int)
-df["transfer_duration"] = df["transfer_duration"].astype(int)
-fares = [GtfsFareAttribute(**row.to_dict()) for _, row in df.iterrows()]
-
-def fare_to_ngsi_ld(f: GtfsFareAttribute) -> dict:
-    data = f.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsFareAttribute:{data['fare_id']}", "type": "GtfsFareAttribute"}
-    for k, v in data.items():
-        if k in ("fare_id","type"): continue
-        ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_fare_attributes(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    df["price"] = df["price"].astype(float)
+    df["payment_method"] = df["payment_method"].astype(int)
+    df["transfers"] = df["transfers"].astype(int)
+    df["transfer_duration"] = df["transfer_duration"].astype(int)
+    return [GtfsFareAttribute(**row.to_dict()) for _, row in df.iterrows()]
 
-fares_ngsi = [fare_to_ngsi_ld(f) for f in fares]
+fare_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsFareAttribute", ("fare_id",), CONTEXTO_GTFS, ignorar=("fare_id",)),
+    GtfsFareAttribute, "fare_to_ngsi_ld")
 
 
 
@@ -336,32 +416,14 @@ class GtfsFareRule(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/fare_rules.txt", dtype=str).replace({np.nan: None})
-fare_rules = [GtfsFareRule(**row.to_dict()) for _, row in df.iterrows()]
-
-def farerule_to_ngsi_ld(fr: GtfsFareRule) -> dict:
-    data = fr.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsFareRule:{data['hasFare']}_{data['containsId']}", "type": "GtfsFareRule"}
-    for k, v in data.items():
-        if k in ("type",): continue
-        if k == "hasFare":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsFareAttribute:{v}"
-            }
-        elif k == "hasRoute":
-            ngsi[k] = {
-                "type": "Relationship",
-                "object": f"urn:ngsi-ld:GtfsRoute:{v}"
-            }
-        else:
-            ngsi[k] = {"type": "Property", "value": v}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
+def ler_fare_rules(caminho: str) -> list:
+    df = pd.read_csv(caminho, dtype=str).replace({np.nan: None})
+    return [GtfsFareRule(**row.to_dict()) for _, row in df.iterrows()]
 
-fare_rules_ngsi = [farerule_to_ngsi_ld(fr) for fr in fare_rules]
+farerule_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsFareRule", ("hasFare", "containsId"), CONTEXTO_GTFS,
+               relacoes={"hasFare": Relacao("GtfsFareAttribute"), "hasRoute": Relacao("GtfsRoute")}),
+    GtfsFareRule, "farerule_to_ngsi_ld")
 
 
 
@@ -378,136 +440,428 @@ class GtfsShape(BaseModel):
     class Config:
         allow_population_by_field_name = True
 
-df = pd.read_csv("Schemas - versao 2/GTFS TUB/txt/shapes.txt", dtype=str, encoding="utf-8-sig").replace({np.nan: None})
-df.columns = df.columns.str.strip()
-df["shape_pt_lat"] = df["shape_pt_lat"].astype(float)
-df["shape_pt_lon"] = df["shape_pt_lon"].astype(float)
-df["shape_pt_sequence"] = df["shape_pt_sequence"].astype(int)
-shapes = [GtfsShape(**row.to_dict()) for _, row in df.iterrows()]
-
-def shape_to_ngsi_ld(shape: GtfsShape) -> dict:
-    data = shape.dict(by_alias=True, exclude_unset=True, exclude_none=True)
-    ngsi = {"id": f"urn:ngsi-ld:GtfsShape:{data['shape_id']}_{data['shape_pt_sequence']}",
-            "type": "GtfsShape"}
-    ngsi["location"] = {
-        "type": "GeoProperty",
-        "value": {"type": "Point",
-                  "coordinates": [data["shape_pt_lon"], data["shape_pt_lat"]]}
-    }
-    ngsi["shape_pt_sequence"] = {"type": "Property", "value": data["shape_pt_sequence"]}
-    ngsi["@context"] = [
-        "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-    ]
-    return ngsi
-
-shapes_ngsi = [shape_to_ngsi_ld(s) for s in shapes]
-
-
-
-#print(json.dumps(gtfsAgency_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(stops_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(routes_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(trips_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(stop_times_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(calendars_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(cal_dates_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(fares_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(fare_rules_ngsi[0], indent=2, ensure_ascii=False))
-#print(json.dumps(shapes_ngsi[0], indent=2, ensure_ascii=False))
 
+shape_to_ngsi_ld = mapeador(
+    Mapeamento("GtfsShape", ("shape_id", "shape_pt_sequence"), CONTEXTO_GTFS,
+               geo={"location": Geo("shape_pt_lon", "shape_pt_lat")},
+               ignorar=("shape_id", "shape_pt_lat", "shape_pt_lon"), geo_no_inicio=True),
+    GtfsShape, "shape_to_ngsi_ld")
+
+# Conversão por colunas (equivalente a shape_to_ngsi_ld linha a linha)
+@medido("modelos", "GtfsShape")
+def shapes_tabela(df: pd.DataFrame) -> pd.DataFrame:
+    return _tabela_tipada(df, GtfsShape,
+                          obrigatorios=("shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"),
+                          inteiros=("shape_pt_sequence",),
+                          decimais=("shape_pt_lat", "shape_pt_lon"))
+
+@medido("conversao_ngsi_ld", "GtfsShape")
+def shapes_to_ngsi_ld_columnar(tabela: pd.DataFrame) -> list:
+    seq = tabela["shape_pt_sequence"]
+    ids = ("urn:ngsi-ld:GtfsShape:" + tabela["shape_id"].astype(str) + "_" + seq.astype(str)).tolist()
+    return [
+        {"id": id_,
+         "type": "GtfsShape",
+         "location": {
+             "type": "GeoProperty",
+             "value": {"type": "Point", "coordinates": [lon, lat]}
+         },
+         "shape_pt_sequence": {"type": "Property", "value": s},
+         "@context": list(CONTEXTO_GTFS)}
+        for id_, lon, lat, s in zip(
+            ids, tabela["shape_pt_lon"].tolist(), tabela["shape_pt_lat"].tolist(), seq.tolist())
+    ]
 
+def iter_shapes_ngsi(caminho: str, chunksize: int = 50_000):
+    for bloco in ler_csv_em_blocos(caminho, chunksize, encoding="utf-8-sig"):
+        yield from shapes_to_ngsi_ld_columnar(shapes_tabela(bloco))
+
+# GtfsShape agregado: uma entidade por shape_id com a geometria em LineString
+# (urn:ngsi-ld:GtfsShape:{shape_id}, o URN usado em hasShape das trips)
+RAIO_TERRA_M = 6_371_008.8
+
+def _douglas_peucker(xy: np.ndarray, tolerancia: float) -> np.ndarray:
+    # Devolve a máscara dos pontos a manter; xy em metros
+    n = len(xy)
+    manter = np.zeros(n, dtype=bool)
+    manter[[0, -1]] = True
+    pilha = [(0, n - 1)]
+    while pilha:
+        i, j = pilha.pop()
+        if j - i < 2:
+            continue
+        seg = xy[j] - xy[i]
+        pts = xy[i + 1:j] - xy[i]
+        comp = np.hypot(seg[0], seg[1])
+        if comp == 0:
+            dist = np.hypot(pts[:, 0], pts[:, 1])
+        else:
+            dist = np.abs(seg[0] * pts[:, 1] - seg[1] * pts[:, 0]) / comp
+        k = int(np.argmax(dist))
+        if dist[k] > tolerancia:
+            m = i + 1 + k
+            manter[m] = True
+            pilha += [(i, m), (m, j)]
+    return manter
+
+def simplificar_linha(lon: np.ndarray, lat: np.ndarray, tolerancia_m: float) -> np.ndarray:
+    # Projeção equirretangular local, suficiente para a escala de uma linha urbana
+    if len(lon) < 3:
+        return np.ones(len(lon), dtype=bool)
+    lat0 = np.radians(lat.mean())
+    xy = np.column_stack((np.radians(lon) * np.cos(lat0), np.radians(lat))) * RAIO_TERRA_M
+    return _douglas_peucker(xy, tolerancia_m)
+
+def codificar_polyline(lon: np.ndarray, lat: np.ndarray, precisao: int = 5) -> str:
+    # Encoded Polyline Algorithm Format (Google), pares (lat, lon)
+    fator = 10 ** precisao
+    valores = np.column_stack((np.round(lat * fator), np.round(lon * fator))).astype(np.int64)
+    deltas = np.diff(valores, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    deltas = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    out = []
+    for v in deltas.tolist():
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+@medido("conversao_ngsi_ld", "GtfsShape")
+def shapes_to_ngsi_ld_linestring(tabela: pd.DataFrame, tolerancia_m: Optional[float] = None,
+                                 casas_decimais: Optional[int] = 6, polyline: bool = False) -> list:
+    # tolerancia_m: simplificação Douglas–Peucker (None = sem simplificação)
+    # casas_decimais: arredondamento das coordenadas (6 casas ≈ 0,1 m)
+    # polyline: escreve a geometria em "encodedPolyline" em vez do GeoProperty,
+    #           com precisão igual a casas_decimais (5 se None)
+    ordenada = tabela.sort_values(["shape_id", "shape_pt_sequence"], kind="stable")
+    shape_ids = ordenada["shape_id"].astype(str).to_numpy()
+    lon_all = ordenada["shape_pt_lon"].to_numpy(dtype=float)
+    lat_all = ordenada["shape_pt_lat"].to_numpy(dtype=float)
+    inicios = np.flatnonzero(np.r_[True, shape_ids[1:] != shape_ids[:-1]])
+    fins = np.r_[inicios[1:], len(shape_ids)]
 
+    out = []
+    for ini, fim in zip(inicios.tolist(), fins.tolist()):
+        lon, lat = lon_all[ini:fim], lat_all[ini:fim]
+        if tolerancia_m is not None:
+            manter = simplificar_linha(lon, lat, tolerancia_m)
+            lon, lat = lon[manter], lat[manter]
+        ngsi = {"id": f"urn:ngsi-ld:GtfsShape:{shape_ids[ini]}", "type": "GtfsShape"}
+        if polyline:
+            ngsi["encodedPolyline"] = {"type": "Property",
+                                       "value": codificar_polyline(lon, lat, casas_decimais or 5)}
+        else:
+            if casas_decimais is not None:
+                lon, lat = np.round(lon, casas_decimais), np.round(lat, casas_decimais)
+            coords = np.column_stack((lon, lat)).tolist()
+            ngsi["location"] = {
+                "type": "GeoProperty",
+                "value": {"type": "LineString", "coordinates": coords} if len(coords) > 1
+                         else {"type": "Point", "coordinates": coords[0]}
+            }
+        ngsi["@context"] = list(CONTEXTO_GTFS)
+        out.append(ngsi)
+    return out
 
 
 
 
-def build_gtfs_RouteTripStop_ngsi(trips_ngsi, routes_ngsi, stops_ngsi, stop_times_ngsi):
-    def _urn_tail(urn: str) -> str:
-        return urn.split(":")[-1] if urn else None
-    def _prop(entity: dict, key: str):
-        return entity.get(key, {}).get("value") if entity else None
-    def _rel(entity: dict, key: str):
-        return entity.get(key, {}).get("object") if entity else None
-    def _coords(stop_entity: dict):
-        loc = stop_entity.get("location", {}).get("value") if stop_entity else None
-        if isinstance(loc, dict) and "coordinates" in loc:
-            lon, lat = loc["coordinates"]
-            return lat, lon
-        return None, None
 
-    trips_idx  = {t["id"]: t for t in trips_ngsi}
-    routes_idx = {r["id"]: r for r in routes_ngsi}
-    stops_idx  = {s["id"]: s for s in stops_ngsi}
 
-    out = []
-    for st in stop_times_ngsi:
-        trip_urn = st["hasTrip"]["object"]
-        stop_urn = st["hasStop"]["object"]
-        seq      = _prop(st, "stopSequence")
-        arr      = _prop(st, "arrivalTime")
-        dep      = _prop(st, "departureTime")
-
-        trip = trips_idx.get(trip_urn)
-        if not trip:
-            continue
 
-        # Dados da trip
-        route_urn = trip["hasRoute"]["object"]
-        head_sign = _prop(trip, "headSign")
-        direction = _prop(trip, "direction")
-        service_id = _rel(trip, "hasService")
-        shape_id = _rel(trip, "hasShape")
-
-        # Dados da route
-        route = routes_idx.get(route_urn, {})
-        route_short = _prop(route, "shortName")
-        route_long  = _prop(route, "LongName") or _prop(route, "longName")
-        route_type  = _prop(route, "routeType")
-        agency_id = _rel(route, "operatedBy")
-
-        # Dados do stop
-        stop = stops_idx.get(stop_urn, {})
-        stop_name = _prop(stop, "name")
-        zone_code = _prop(stop, "zoneCode")
-        stop_lat, stop_lon = _coords(stop)
-
-        # Cria a instância NGSI-LD
+# GtfsRouteTripStop
+# Junção stop_times ⋈ trips ⋈ routes ⋈ stops sobre as tabelas tipadas;
+# os dicionários NGSI-LD só são criados no fim
+def modelos_para_tabela(modelos: list, colunas: list) -> pd.DataFrame:
+    return pd.DataFrame([m.dict(include=set(colunas)) for m in modelos], columns=colunas, dtype=object)
+
+@medido("juncao", "GtfsRouteTripStop")
+def preparar_dimensoes_route_trip_stop(trips: pd.DataFrame, routes: pd.DataFrame, stops: pd.DataFrame):
+    # Em ids repetidos fica a última linha
+    viagens = trips[["trip_id", "route_id", "service_id", "trip_headsign", "direction_id", "shape_id"]]
+    viagens = viagens.drop_duplicates("trip_id", keep="last")
+    rotas = routes[["route_id", "agency_id", "route_short_name", "route_long_name", "route_type"]]
+    rotas = rotas.drop_duplicates("route_id", keep="last")
+    viagens = viagens.merge(rotas, on="route_id", how="left")
+    paragens = stops[["stop_id", "stop_name", "stop_lat", "stop_lon", "zone_id"]]
+    paragens = paragens.drop_duplicates("stop_id", keep="last")
+    return viagens, paragens
+
+@medido("juncao", "GtfsRouteTripStop")
+def juntar_route_trip_stop(stop_times: pd.DataFrame, viagens: pd.DataFrame, paragens: pd.DataFrame):
+    tem_trip = stop_times["trip_id"].isin(viagens["trip_id"]).to_numpy()
+    orfaos = stop_times[~tem_trip]
+    juncao = (stop_times[tem_trip]
+              .merge(viagens, on="trip_id", how="left")
+              .merge(paragens, on="stop_id", how="left"))
+    return juncao, orfaos
+
+def _coluna(juncao: pd.DataFrame, col: str) -> list:
+    valores = juncao[col].astype(object)
+    return valores.where(valores.notna(), None).tolist()
+
+def _urns(juncao: pd.DataFrame, col: str, prefixo: str) -> list:
+    valores = juncao[col]
+    return (prefixo + valores.astype(str)).where(valores.notna(), None).tolist()
+
+def route_trip_stop_to_ngsi_ld(juncao: pd.DataFrame):
+    seq = juncao["stop_sequence"]
+    ids = ("urn:ngsi-ld:GtfsRouteTripStop:"
+           + juncao["trip_id"].astype(str).str.rsplit(":", n=1).str[-1] + "_"
+           + juncao["stop_id"].astype(str).str.rsplit(":", n=1).str[-1] + "_"
+           + seq.astype(str)).tolist()
+    colunas = zip(
+        ids,
+        _urns(juncao, "trip_id", "urn:ngsi-ld:GtfsTrip:"),
+        _urns(juncao, "route_id", "urn:ngsi-ld:GtfsRoute:"),
+        _urns(juncao, "stop_id", "urn:ngsi-ld:GtfsStop:"),
+        _urns(juncao, "agency_id", "urn:ngsi-ld:GtfsAgency:"),
+        _urns(juncao, "service_id", "urn:ngsi-ld:GtfsCalendarRule:"),
+        _urns(juncao, "shape_id", "urn:ngsi-ld:GtfsShape:"),
+        _coluna(juncao, "route_short_name"), _coluna(juncao, "route_long_name"),
+        _coluna(juncao, "route_type"), _coluna(juncao, "trip_headsign"),
+        _coluna(juncao, "direction_id"), _coluna(juncao, "stop_name"),
+        _coluna(juncao, "zone_id"), _coluna(juncao, "stop_lat"), _coluna(juncao, "stop_lon"),
+        seq.tolist(), juncao["arrival_time"].tolist(), juncao["departure_time"].tolist(),
+    )
+    for (id_, trip_urn, route_urn, stop_urn, agency_urn, service_urn, shape_urn,
+         route_short, route_long, route_type, head_sign, direction, stop_name,
+         zone_code, stop_lat, stop_lon, s, arr, dep) in colunas:
+        # Relationships
         entity = {
-            "id": f"urn:ngsi-ld:GtfsRouteTripStop:{_urn_tail(trip_urn)}_{_urn_tail(stop_urn)}_{seq}",
+            "id": id_,
             "type": "GtfsRouteTripStop",
-            # Relationships
             "hasTrip":  {"type": "Relationship", "object": trip_urn},
             "hasRoute": {"type": "Relationship", "object": route_urn},
             "hasStop":  {"type": "Relationship", "object": stop_urn},
-            **({"operatedBy": {"type": "Relationship", "object": agency_id}} if agency_id else {}),
-            **({"hasService": {"type": "Relationship", "object": service_id}} if service_id else {}),
-            **({"hasShape": {"type": "Relationship", "object": shape_id}} if shape_id else {}),
-            # Route 
-            **({"routeShortName": {"type": "Property", "value": route_short}} if route_short else {}),
-            **({"routeLongName":  {"type": "Property", "value": route_long}}  if route_long  else {}),
-            **({"routeType":      {"type": "Property", "value": route_type}}  if route_type  else {}),
-            # Trip 
-            **({"headSign": {"type": "Property", "value": head_sign}} if head_sign else {}),
-            **({"direction": {"type": "Property", "value": direction}} if direction is not None else {}),
-            # Stop 
-            **({"stopName": {"type": "Property", "value": stop_name}} if stop_name else {}),
-            **({"zoneCode": {"type": "Property", "value": zone_code}} if zone_code else {}),
-            **({"location": {"type": "GeoProperty","value": {"type": "Point","coordinates": [stop_lon, stop_lat]}
-    }
-} if stop_lat and stop_lon else {}),
-            # StopTime 
-            "stopSequence": {"type": "Property", "value": seq},
-            "arrivalTime":  {"type": "Property", "value": arr},
-            "departureTime":{"type": "Property", "value": dep},
-            "@context": [
-                "https://raw.githubusercontent.com/smart-data-models/dataModel.UrbanMobility/master/context.jsonld"
-            ]
         }
-        out.append(entity)
-    return out
-
-routetripstop_ngsi = build_gtfs_RouteTripStop_ngsi(trips_ngsi, routes_ngsi, stops_ngsi, stop_times_ngsi)
-
-# Exportar
-with open("GtfsRouteTripStop.jsonld", "w", encoding="utf-8") as f:
-    json.dump(routetripstop_ngsi, f, ensure_ascii=False, indent=2)
+        if agency_urn:
+            entity["operatedBy"] = {"type": "Relationship", "object": agency_urn}
+        if service_urn:
+            entity["hasService"] = {"type": "Relationship", "object": service_urn}
+        if shape_urn:
+            entity["hasShape"] = {"type": "Relationship", "object": shape_urn}
+        # Route
+        if route_short:
+            entity["routeShortName"] = {"type": "Property", "value": route_short}
+        if route_long:
+            entity["routeLongName"] = {"type": "Property", "value": route_long}
+        if route_type:
+            entity["routeType"] = {"type": "Property", "value": route_type}
+        # Trip
+        if head_sign:
+            entity["headSign"] = {"type": "Property", "value": head_sign}
+        if direction is not None:
+            entity["direction"] = {"type": "Property", "value": direction}
+        # Stop
+        if stop_name:
+            entity["stopName"] = {"type": "Property", "value": stop_name}
+        if zone_code:
+            entity["zoneCode"] = {"type": "Property", "value": zone_code}
+        if stop_lat and stop_lon:
+            entity["location"] = {"type": "GeoProperty",
+                                  "value": {"type": "Point", "coordinates": [stop_lon, stop_lat]}}
+        # StopTime
+        entity["stopSequence"] = {"type": "Property", "value": s}
+        entity["arrivalTime"] = {"type": "Property", "value": arr}
+        entity["departureTime"] = {"type": "Property", "value": dep}
+        entity["@context"] = list(CONTEXTO_GTFS)
+        yield entity
+
+# stop_times: tabela tipada (stop_times_tabela); trips, routes e stops: tabelas
+# com os nomes de colunas do GTFS (ver modelos_para_tabela).
+# Os stop_times sem trip são ignorados e, se for dada uma lista em orfaos,
+# acrescentados a essa lista.
+def build_gtfs_RouteTripStop_ngsi(stop_times, trips, routes, stops, lazy=False, orfaos=None):
+    viagens, paragens = preparar_dimensoes_route_trip_stop(trips, routes, stops)
+    juncao, sem_trip = juntar_route_trip_stop(stop_times, viagens, paragens)
+    if orfaos is not None and len(sem_trip):
+        orfaos.append(sem_trip)
+    entidades = medir_iteravel(route_trip_stop_to_ngsi_ld(juncao), "conversao_ngsi_ld", "GtfsRouteTripStop")
+    return entidades if lazy else list(entidades)
+
+# Versão em streaming: recebe os blocos tipados de stop_times
+def iter_gtfs_RouteTripStop_ngsi(blocos_stop_times, trips, routes, stops, orfaos=None):
+    viagens, paragens = preparar_dimensoes_route_trip_stop(trips, routes, stops)
+    for bloco in blocos_stop_times:
+        juncao, sem_trip = juntar_route_trip_stop(bloco, viagens, paragens)
+        if orfaos is not None and len(sem_trip):
+            orfaos.append(sem_trip)
+        yield from medir_iteravel(route_trip_stop_to_ngsi_ld(juncao), "conversao_ngsi_ld", "GtfsRouteTripStop")
+
+
+
+
+
+
+# GtfsFeed
+# Feed com carregamento preguiçoso: cada tabela só é lida e validada no
+# primeiro acesso e fica guardada; a conversão e a exportação são sempre
+# pedidas explicitamente
+class GtfsFeed:
+    # Tabelas pequenas: listas de registos compactos (ver ler_registos); os
+    # ler_* continuam a devolver os modelos pydantic
+    _MODELOS = {
+        "agency": GtfsAgency,
+        "stops": GtfsStop,
+        "routes": GtfsRoute,
+        "trips": GtfsTrip,
+        "calendar": GtfsCalendarRule,
+        "calendar_dates": GtfsCalendarDateRule,
+        "fare_attributes": GtfsFareAttribute,
+        "fare_rules": GtfsFareRule,
+    }
+    _CONVERSORES = {
+        "agency": agency_to_ngsi_ld,
+        "stops": stop_to_ngsi_ld,
+        "routes": route_to_ngsi_ld,
+        "trips": trip_to_ngsi_ld,
+        "calendar": calendar_to_ngsi_ld,
+        "calendar_dates": caldate_to_ngsi_ld,
+        "fare_attributes": fare_to_ngsi_ld,
+        "fare_rules": farerule_to_ngsi_ld,
+    }
+    # Tabelas grandes: tabelas tipadas, que também podem ser lidas por blocos
+    _TIPADAS = {
+        "stop_times": (stop_times_tabela, stop_times_to_ngsi_ld_columnar, {}),
+        "shapes": (shapes_tabela, shapes_to_ngsi_ld_columnar, {"encoding": "utf-8-sig"}),
+    }
+    TABELAS = list(_MODELOS) + list(_TIPADAS)
+
+    def __init__(self, pasta: str = PASTA_GTFS, chunksize: int = 50_000):
+        self.pasta = Path(pasta)
+        self.chunksize = chunksize
+        self._tabelas = {}
+
+    def caminho(self, tabela: str) -> str:
+        if tabela not in self.TABELAS:
+            raise ValueError(f"Tabela GTFS inválida: '{tabela}'. Usar uma de {self.TABELAS}.")
+        return str(self.pasta / f"{tabela}.txt")
+
+    def carregada(self, tabela: str) -> bool:
+        return tabela in self._tabelas
+
+    def tabela(self, tabela: str):
+        if tabela not in self._tabelas:
+            caminho = self.caminho(tabela)
+            if tabela in self._MODELOS:
+                self._tabelas[tabela] = ler_registos(caminho, self._MODELOS[tabela])
+            else:
+                self._tabelas[tabela] = pd.concat(list(self.blocos(tabela)), ignore_index=True)
+        return self._tabelas[tabela]
+
+    @property
+    def agency(self) -> list:
+        return self.tabela("agency")
+
+    @property
+    def stops(self) -> list:
+        return self.tabela("stops")
+
+    @property
+    def routes(self) -> list:
+        return self.tabela("routes")
+
+    @property
+    def trips(self) -> list:
+        return self.tabela("trips")
+
+    @property
+    def calendar(self) -> list:
+        return self.tabela("calendar")
+
+    @property
+    def calendar_dates(self) -> list:
+        return self.tabela("calendar_dates")
+
+    @property
+    def fare_attributes(self) -> list:
+        return self.tabela("fare_attributes")
+
+    @property
+    def fare_rules(self) -> list:
+        return self.tabela("fare_rules")
+
+    @property
+    def stop_times(self) -> pd.DataFrame:
+        return self.tabela("stop_times")
+
+    @property
+    def shapes(self) -> pd.DataFrame:
+        return self.tabela("shapes")
+
+    # Blocos tipados de stop_times/shapes; se a tabela já estiver carregada
+    # é devolvida inteira, senão é lida do disco sem ficar guardada
+    def blocos(self, tabela: str):
+        if tabela not in self._TIPADAS:
+            raise ValueError(f"Leitura por blocos só para {list(self._TIPADAS)}: '{tabela}'.")
+        if tabela in self._tabelas:
+            yield self._tabelas[tabela]
+            return
+        tipar, _, kwargs = self._TIPADAS[tabela]
+        for bloco in ler_csv_em_blocos(self.caminho(tabela), self.chunksize, **kwargs):
+            yield tipar(bloco)
+
+    def ngsi(self, tabela: str, lazy: bool = False):
+        if tabela in self._CONVERSORES:
+            entidades = map(self._CONVERSORES[tabela], self.tabela(tabela))
+        elif tabela in self._TIPADAS:
+            converter = self._TIPADAS[tabela][1]
+            entidades = (e for bloco in self.blocos(tabela) for e in converter(bloco))
+        else:
+            raise ValueError(f"Tabela GTFS inválida: '{tabela}'. Usar uma de {self.TABELAS}.")
+        return entidades if lazy else list(entidades)
+
+    def shapes_linestring(self, tolerancia_m: Optional[float] = None,
+                          casas_decimais: Optional[int] = 6, polyline: bool = False) -> list:
+        return shapes_to_ngsi_ld_linestring(self.shapes, tolerancia_m, casas_decimais, polyline)
+
+    def dimensoes_route_trip_stop(self):
+        return (modelos_para_tabela(self.trips, ["trip_id", "route_id", "service_id", "trip_headsign", "direction_id", "shape_id"]),
+                modelos_para_tabela(self.routes, ["route_id", "agency_id", "route_short_name", "route_long_name", "route_type"]),
+                modelos_para_tabela(self.stops, ["stop_id", "stop_name", "stop_lat", "stop_lon", "zone_id"]))
+
+    def route_trip_stop_ngsi(self, lazy: bool = False, orfaos: Optional[list] = None):
+        entidades = iter_gtfs_RouteTripStop_ngsi(self.blocos("stop_times"), *self.dimensoes_route_trip_stop(),
+                                                 orfaos=orfaos)
+        return entidades if lazy else list(entidades)
+
+    # Exportação em streaming (stop_times e shapes são lidos por blocos se
+    # ainda não estiverem carregados); opções de saída em saidaNgsiLd
+    def exportar(self, tabela: str, caminho: str, formato: Optional[str] = None, **opcoes) -> int:
+        return escrever_ngsi_ld(self.ngsi(tabela, lazy=True), caminho, formato, **opcoes)
+
+    def exportar_route_trip_stop(self, caminho: str = "GtfsRouteTripStop.jsonld", formato: Optional[str] = None,
+                                 orfaos: Optional[list] = None, **opcoes) -> int:
+        return escrever_ngsi_ld(self.route_trip_stop_ngsi(lazy=True, orfaos=orfaos), caminho, formato, **opcoes)
+
+    # Uma GtfsShape por shape_id (LineString): são as entidades referidas
+    # por hasShape em GtfsTrip e GtfsRouteTripStop
+    def exportar_shapes_linestring(self, caminho: str = "gtfs_shapes_linestring_ngsi.jsonld",
+                                   formato: Optional[str] = None, tolerancia_m: Optional[float] = None,
+                                   casas_decimais: Optional[int] = 6, polyline: bool = False, **opcoes) -> int:
+        return escrever_ngsi_ld(self.shapes_linestring(tolerancia_m, casas_decimais, polyline), caminho, formato, **opcoes)
+
+
+if __name__ == "__main__":
+    feed = GtfsFeed()
+
+    #print(json.dumps(feed.ngsi("agency")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("stops")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("routes")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("trips")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(next(feed.ngsi("stop_times", lazy=True)), indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("calendar")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("calendar_dates")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("fare_attributes")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.ngsi("fare_rules")[0], indent=2, ensure_ascii=False))
+    #print(json.dumps(next(feed.ngsi("shapes", lazy=True)), indent=2, ensure_ascii=False))
+    #print(json.dumps(feed.shapes_linestring(tolerancia_m=2)[0], indent=2, ensure_ascii=False))
+
+    # Exportar (stop_times.txt é lido por blocos e cada entidade é escrita logo que é gerada)
+    stop_times_orfaos = []
+    feed.exportar_route_trip_stop("GtfsRouteTripStop.jsonld", orfaos=stop_times_orfaos)
+    n_orfaos = sum(len(o) for o in stop_times_orfaos)
+    if n_orfaos:
+        print(f"Aviso: {n_orfaos} stop_times sem trip correspondente foram ignorados "
+              f"(ex.: trip_id {stop_times_orfaos[0]['trip_id'].iloc[0]})")
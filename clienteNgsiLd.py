@@ -0,0 +1,363 @@
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+from saidaNgsiLd import abrir_texto, link_contexto
+
+# Carregamento de entidades NGSI-LD num context broker por lotes, com
+# POST /ngsi-ld/v1/entityOperations/upsert. Cada thread de envio mantém uma
+# ligação keep-alive; no máximo max_em_curso lotes estão em curso ao mesmo
+# tempo (o leitor das entidades espera por uma vaga). Os lotes que falham por
+# erro de rede, 429 ou 5xx são repetidos com espera exponencial.
+# Com contexto_link as entidades vão sem @context e o contexto segue no
+# cabeçalho Link (corpo application/json), o que reduz o tamanho dos pedidos.
+
+CAMINHO_UPSERT = "/ngsi-ld/v1/entityOperations/upsert"
+
+# Entidades de um ficheiro *_ngsi.jsonld (lista JSON, {"@context", "@graph"}
+# ou NDJSON, com ou sem compressão .gz/.zst), lidas por blocos sem carregar o
+# ficheiro inteiro. O @context partilhado do ficheiro é acrescentado a cada
+# entidade, a não ser que incluir_contexto=False (envio com cabeçalho Link)
+def ler_entidades(caminho: str, bloco: int = 1 << 20, incluir_contexto: bool = True):
+    with abrir_texto(caminho) as f:
+        fluxo = _Fluxo(f, bloco)
+        inicio = fluxo.saltar()
+        contexto = None
+        if inicio == "{":
+            # Documento {"@context": ..., "@graph": [...]} ou primeira linha de NDJSON
+            fluxo.guardar = True
+            fluxo.pos += 1
+            chave = fluxo.valor() if fluxo.saltar() == '"' else None
+            if chave == "@context":
+                fluxo.saltar(" \t\r\n:")
+                contexto = fluxo.valor()
+                chave = fluxo.valor() if fluxo.saltar(" \t\r\n,") == '"' else None
+            fluxo.guardar = False
+            if chave != "@graph":
+                inicio = None
+        if inicio not in ("[", "{"):
+            for linha in _linhas(fluxo.buffer, f, bloco):
+                if linha.strip():
+                    yield json.loads(linha)
+            return
+        if fluxo.saltar(" \t\r\n:") != "[":
+            raise ValueError(f"Ficheiro NGSI-LD inválido: '{caminho}'.")
+        fluxo.pos += 1
+        while True:
+            # Salta espaços e vírgulas entre entidades
+            proximo = fluxo.saltar(" \t\r\n,")
+            if not proximo:
+                raise ValueError(f"Ficheiro JSON incompleto: '{caminho}'.")
+            if proximo == "]":
+                return
+            entidade = fluxo.valor()
+            if incluir_contexto and contexto is not None and "@context" not in entidade:
+                entidade["@context"] = contexto
+            yield entidade
+
+# Leitura de JSON por blocos: o texto já lido é descartado, exceto com
+# guardar=True (para poder voltar ao início do ficheiro)
+class _Fluxo:
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, f, bloco: int):
+        self.f = f
+        self.bloco = bloco
+        self.buffer = f.read(bloco)
+        self.pos = 0
+        self.guardar = False
+
+    def _mais(self) -> bool:
+        mais = self.f.read(self.bloco)
+        if not mais:
+            return False
+        if not self.guardar:
+            self.buffer, self.pos = self.buffer[self.pos:], 0
+        self.buffer += mais
+        return True
+
+    # Próximo carácter fora de `ignorar` ("" no fim do ficheiro)
+    def saltar(self, ignorar: str = " \t\r\n") -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ignorar:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._mais():
+                return ""
+
+    def valor(self):
+        while True:
+            try:
+                valor, self.pos = self._decoder.raw_decode(self.buffer, self.pos)
+                return valor
+            except json.JSONDecodeError:
+                if not self._mais():
+                    raise
+
+def _linhas(buffer: str, f, bloco: int):
+    resto = buffer
+    while True:
+        mais = f.read(bloco)
+        if not mais:
+            yield from resto.splitlines()
+            return
+        resto += mais
+        *linhas, resto = resto.split("\n")
+        yield from linhas
+
+def _lotes(entidades: Iterable[dict], tamanho: int):
+    lote = []
+    for e in entidades:
+        lote.append(e)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inicio = time.perf_counter()
+        self.fim = None
+        self.entidades = 0
+        self.entidades_ok = 0
+        self.lotes = 0
+        self.lotes_falhados = 0
+        self.repeticoes = 0
+        self.bytes_enviados = 0
+        self.tempo_pedidos_s = 0.0
+        # Entidades rejeitadas: [(id, erro)] (lotes falhados e erros parciais 207)
+        self.erros = []
+
+    def registar(self, **valores):
+        with self._lock:
+            for nome, valor in valores.items():
+                if nome == "erros":
+                    self.erros.extend(valor)
+                else:
+                    setattr(self, nome, getattr(self, nome) + valor)
+
+    @property
+    def duracao_s(self) -> float:
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    @property
+    def entidades_por_s(self) -> float:
+        return self.entidades_ok / self.duracao_s if self.duracao_s > 0 else 0.0
+
+    def resumo(self) -> dict:
+        return {
+            "entidades": self.entidades,
+            "entidades_ok": self.entidades_ok,
+            "entidades_com_erro": len(self.erros),
+            "lotes": self.lotes,
+            "lotes_falhados": self.lotes_falhados,
+            "repeticoes": self.repeticoes,
+            "bytes_enviados": self.bytes_enviados,
+            "duracao_s": round(self.duracao_s, 3),
+            "entidades_por_s": round(self.entidades_por_s, 1),
+            "latencia_media_lote_ms": round(1000 * self.tempo_pedidos_s / max(self.lotes + self.repeticoes, 1), 1),
+        }
+
+class ClienteNgsiLd:
+    def __init__(self, url_broker: str = "http://localhost:1026", tamanho_lote: int = 500,
+                 max_em_curso: int = 4, tentativas: int = 5, espera_base_s: float = 0.5,
+                 timeout_s: float = 60.0, opcoes: Optional[str] = None, tenant: Optional[str] = None,
+                 contexto_link=None):
+        url = urlsplit(url_broker)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"URL do broker inválido: '{url_broker}'. Usar http:// ou https://.")
+        self._https = url.scheme == "https"
+        self._host = url.hostname
+        self._porta = url.port
+        self._caminho = url.path.rstrip("/") + CAMINHO_UPSERT + (f"?options={opcoes}" if opcoes else "")
+        self.tamanho_lote = tamanho_lote
+        self.max_em_curso = max_em_curso
+        self.tentativas = tentativas
+        self.espera_base_s = espera_base_s
+        self.timeout_s = timeout_s
+        self._cabecalhos = {"Content-Type": "application/ld+json", "Connection": "keep-alive"}
+        if tenant:
+            self._cabecalhos["NGSILD-Tenant"] = tenant
+        self.link = link_contexto(contexto_link) if contexto_link else None
+        if self.link:
+            self._cabecalhos["Content-Type"] = "application/json"
+            self._cabecalhos["Link"] = self.link
+        self._local = threading.local()
+        # Todas as ligações abertas pelas threads, fechadas no fim do upsert
+        self._ligacoes = []
+        self._lock_ligacoes = threading.Lock()
+
+    # Ligação keep-alive da thread atual
+    def _ligacao(self) -> http.client.HTTPConnection:
+        ligacao = getattr(self._local, "ligacao", None)
+        if ligacao is None:
+            classe = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            ligacao = self._local.ligacao = classe(self._host, self._porta, timeout=self.timeout_s)
+            with self._lock_ligacoes:
+                self._ligacoes.append(ligacao)
+        return ligacao
+
+    def _fechar(self):
+        ligacao = getattr(self._local, "ligacao", None)
+        if ligacao is not None:
+            ligacao.close()
+            self._local.ligacao = None
+
+    def _fechar_todas(self):
+        with self._lock_ligacoes:
+            ligacoes, self._ligacoes = self._ligacoes, []
+        for ligacao in ligacoes:
+            ligacao.close()
+        self._local = threading.local()
+
+    def _enviar(self, lote: list, metricas: Metricas):
+        corpo = json.dumps(lote, ensure_ascii=False).encode("utf-8")
+        ultimo_erro = None
+        for tentativa in range(self.tentativas):
+            if tentativa:
+                metricas.registar(repeticoes=1)
+            espera = None
+            t = time.perf_counter()
+            try:
+                ligacao = self._ligacao()
+                ligacao.request("POST", self._caminho, body=corpo, headers=self._cabecalhos)
+                resposta = ligacao.getresponse()
+                dados = resposta.read()
+                metricas.registar(bytes_enviados=len(corpo), tempo_pedidos_s=time.perf_counter() - t)
+                if resposta.status in (200, 201, 204):
+                    metricas.registar(entidades_ok=len(lote))
+                    return
+                if resposta.status == 207:
+                    erros = [(e.get("entityId"), e.get("error")) for e in json.loads(dados or b"{}").get("errors", [])]
+                    metricas.registar(entidades_ok=len(lote) - len(erros), erros=erros)
+                    return
+                ultimo_erro = f"HTTP {resposta.status}: {dados[:200].decode('utf-8', 'replace')}"
+                if resposta.status != 429 and resposta.status < 500:
+                    break
+                if resposta.getheader("Retry-After", "").isdigit():
+                    espera = int(resposta.getheader("Retry-After"))
+            except (OSError, http.client.HTTPException) as e:
+                metricas.registar(tempo_pedidos_s=time.perf_counter() - t)
+                ultimo_erro = f"{type(e).__name__}: {e}"
+                self._fechar()
+            if tentativa + 1 < self.tentativas:
+                time.sleep(espera if espera is not None else self.espera_base_s * 2 ** tentativa * (0.5 + random.random()))
+        metricas.registar(lotes_falhados=1, erros=[(e.get("id"), ultimo_erro) for e in lote])
+
+    def upsert(self, entidades: Iterable[dict]) -> Metricas:
+        metricas = Metricas()
+        vagas = threading.BoundedSemaphore(self.max_em_curso)
+
+        def tarefa(lote):
+            try:
+                self._enviar(lote, metricas)
+            except Exception as e:
+                # Ex.: resposta 207 com um corpo inesperado; o lote conta como falhado
+                erro = f"{type(e).__name__}: {e}"
+                metricas.registar(lotes_falhados=1, erros=[(x.get("id"), erro) for x in lote])
+            finally:
+                vagas.release()
+
+        if self.link:
+            entidades = ({k: v for k, v in e.items() if k != "@context"} for e in entidades)
+        try:
+            with ThreadPoolExecutor(self.max_em_curso, thread_name_prefix="ngsi-ld") as executor:
+                for lote in _lotes(entidades, self.tamanho_lote):
+                    # Contrapressão: só se lê o lote seguinte quando há uma vaga
+                    vagas.acquire()
+                    metricas.registar(entidades=len(lote), lotes=1)
+                    executor.submit(tarefa, lote)
+        finally:
+            self._fechar_todas()
+        metricas.fim = time.perf_counter()
+        return metricas
+
+    def upsert_ficheiro(self, caminho: str) -> Metricas:
+        return self.upsert(ler_entidades(caminho, incluir_contexto=self.link is None))
+
+# Broker simulado para testes locais: aceita upserts, guarda as entidades em
+# memória e falha uma fração dos pedidos com 503
+class BrokerSimulado(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, porta: int = 0, taxa_falhas: float = 0.0, latencia_s: float = 0.0):
+        self.entidades = {}
+        self.pedidos = 0
+        self.taxa_falhas = taxa_falhas
+        self.latencia_s = latencia_s
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", porta), _PedidoSimulado)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def iniciar(self) -> "BrokerSimulado":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class _PedidoSimulado(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        broker = self.server
+        with broker._lock:
+            broker.pedidos += 1
+        if broker.latencia_s:
+            time.sleep(broker.latencia_s)
+        if not self.path.startswith(CAMINHO_UPSERT):
+            return self._responder(404, {"type": "https://uri.etsi.org/ngsi-ld/errors/ResourceNotFound"})
+        if random.random() < broker.taxa_falhas:
+            return self._responder(503, {"type": "https://uri.etsi.org/ngsi-ld/errors/InternalError"})
+        try:
+            entidades = json.loads(corpo)
+        except ValueError:
+            return self._responder(400, {"type": "https://uri.etsi.org/ngsi-ld/errors/InvalidRequest"})
+        erros = []
+        with broker._lock:
+            for e in entidades:
+                if not isinstance(e, dict) or "id" not in e or "type" not in e:
+                    erros.append({"entityId": e.get("id") if isinstance(e, dict) else None,
+                                  "error": {"type": "https://uri.etsi.org/ngsi-ld/errors/BadRequestData"}})
+                else:
+                    broker.entidades[e["id"]] = e
+        if erros:
+            return self._responder(207, {"success": [], "errors": erros})
+        self._responder(204, None)
+
+    def _responder(self, estado: int, corpo):
+        dados = b"" if corpo is None else json.dumps(corpo).encode("utf-8")
+        self.send_response(estado)
+        if dados:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+if __name__ == "__main__":
+    # python clienteNgsiLd.py <url_broker> <ficheiro.jsonld>...
+    # python clienteNgsiLd.py --simulado <ficheiro.jsonld>...   (broker local em memória)
+    if len(sys.argv) < 3:
+        print("Uso: python clienteNgsiLd.py <url_broker|--simulado> <ficheiro.jsonld>...")
+        sys.exit(1)
+    url = sys.argv[1]
+    if url == "--simulado":
+        url = BrokerSimulado(taxa_falhas=0.05).iniciar().url
+    cliente = ClienteNgsiLd(url)
+    for caminho in sys.argv[2:]:
+        metricas = cliente.upsert_ficheiro(caminho)
+        print(caminho, json.dumps(metricas.resumo(), ensure_ascii=False))
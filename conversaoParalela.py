@@ -0,0 +1,204 @@
+import os
+import runpy
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+import pandas as pd, numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "GTFS TUB"))
+from gtfsTUB import PASTA_GTFS, GtfsFeed, juntar_route_trip_stop, preparar_dimensoes_route_trip_stop, route_trip_stop_to_ngsi_ld
+from gtfsDiff import ler_tabela_bruta
+from saidaNgsiLd import EscritorNgsiLd, OpcoesSaida, caminho_saida, juntar_fragmentos, opcoes_saida
+from instrumentacaoNgsiLd import medir_iteravel
+
+# Conversão em paralelo: as tabelas do GTFS e os scripts dos outros datasets
+# são tarefas independentes distribuídas por um conjunto de processos.
+# stop_times, shapes e GtfsRouteTripStop são divididos em partes contíguas
+# do ficheiro, cortadas só onde muda o trip_id/shape_id. Cada tarefa escreve
+# um fragmento e os fragmentos são juntados pela ordem das tarefas, por isso
+# os ficheiros finais são iguais aos da conversão sequencial.
+
+PASTA_REPO = Path(__file__).resolve().parent
+
+# Scripts de conversão dos outros datasets (escrevem o seu *_ngsi.jsonld)
+DATASETS = {
+    "Braga É Natal": ["festival.py", "evento.py", "local.py", "participante.py"],
+    "Estatuária de Braga": ["autor.py", "estatuaria.py"],
+    "Espaços DSI": ["edificioPydantic.py", "salaPydantic.py", "pessoaPydantic.py", "reservaPydantic.py"],
+}
+
+# Saídas derivadas das tabelas do feed (além de uma saída por tabela)
+DERIVADAS = ["route_trip_stop", "shapes_linestring"]
+
+# Tabelas divididas em partes e coluna onde se pode cortar
+CHAVES_CORTE = {"stop_times": "trip_id", "shapes": "shape_id", "route_trip_stop": "trip_id"}
+
+# segundos: tempo desde o início até a saída estar escrita
+class Resultado(NamedTuple):
+    nome: str
+    saida: Optional[str]
+    entidades: Optional[int]
+    segundos: float
+    erro: Optional[str] = None
+
+def saida_tabela(tabela: str) -> str:
+    return "GtfsRouteTripStop.jsonld" if tabela == "route_trip_stop" else f"gtfs_{tabela}_ngsi.jsonld"
+
+def _escrever_fragmento(entidades, caminho: str, opcoes: OpcoesSaida):
+    with EscritorNgsiLd(caminho, opcoes, fragmento=True) as escritor:
+        escritor.escrever_todas(entidades)
+    return escritor.n, escritor.contexto
+
+# Limites [inicio, fim) de até `partes` intervalos de linhas com tamanho
+# parecido, sem separar linhas seguidas com a mesma chave
+def cortes_por_chave(chaves: pd.Series, partes: int) -> list:
+    n = len(chaves)
+    if n == 0:
+        return []
+    valores = chaves.to_numpy()
+    mudancas = np.flatnonzero(valores[1:] != valores[:-1]) + 1
+    alvos = [n * i // partes for i in range(1, partes)]
+    pos = np.searchsorted(mudancas, alvos)
+    limites = sorted({int(mudancas[p]) for p in pos if p < len(mudancas)})
+    inicios = [0] + limites
+    return list(zip(inicios, limites + [n]))
+
+# Tarefas (executadas nos processos do conjunto)
+def _tarefa_tabela(pasta: str, tabela: str, fragmento: str, opcoes: OpcoesSaida):
+    feed = GtfsFeed(pasta)
+    if tabela == "shapes_linestring":
+        return _escrever_fragmento(feed.shapes_linestring(), fragmento, opcoes)
+    return _escrever_fragmento(feed.ngsi(tabela, lazy=True), fragmento, opcoes)
+
+def _tarefa_bloco(tabela: str, bloco: pd.DataFrame, fragmento: str, opcoes: OpcoesSaida):
+    tipar, converter, _ = GtfsFeed._TIPADAS[tabela]
+    return _escrever_fragmento(converter(tipar(bloco)), fragmento, opcoes)
+
+def _tarefa_bloco_route_trip_stop(bloco: pd.DataFrame, viagens: pd.DataFrame, paragens: pd.DataFrame,
+                                  fragmento: str, opcoes: OpcoesSaida):
+    tipar = GtfsFeed._TIPADAS["stop_times"][0]
+    juncao, sem_trip = juntar_route_trip_stop(tipar(bloco), viagens, paragens)
+    entidades = medir_iteravel(route_trip_stop_to_ngsi_ld(juncao), "conversao_ngsi_ld", "GtfsRouteTripStop")
+    return _escrever_fragmento(entidades, fragmento, opcoes), sem_trip
+
+# Variáveis NGSILD_* para os scripts escreverem com as mesmas opções
+def ambiente_saida(opcoes: OpcoesSaida):
+    valores = {"NGSILD_FORMATO": opcoes.formato, "NGSILD_REPRESENTACAO": opcoes.representacao,
+               "NGSILD_CONTEXTO": opcoes.contexto,
+               "NGSILD_INDENTACAO": "nenhuma" if opcoes.indentacao is None else str(opcoes.indentacao),
+               "NGSILD_COMPRESSAO": opcoes.compressao}
+    for nome, valor in valores.items():
+        if valor is None:
+            os.environ.pop(nome, None)
+        else:
+            os.environ[nome] = valor
+
+# Os scripts escrevem o *_ngsi.jsonld na pasta atual
+def _tarefa_script(script: str, pasta_saida: str, opcoes: OpcoesSaida) -> None:
+    ambiente_saida(opcoes)
+    os.chdir(pasta_saida)
+    runpy.run_path(script, run_name="__main__")
+
+def converter_em_paralelo(pasta_gtfs: str = PASTA_GTFS, pasta_saida: str = ".",
+                          tabelas: Optional[list] = None, datasets: Optional[list] = None,
+                          processos: Optional[int] = None, partes: Optional[int] = None,
+                          formato: Optional[str] = None, orfaos: Optional[list] = None, **opcoes) -> list:
+    opcoes = opcoes_saida(formato, **opcoes)
+    tabelas = GtfsFeed.TABELAS + DERIVADAS if tabelas is None else tabelas
+    datasets = list(DATASETS) if datasets is None else datasets
+    for t in tabelas:
+        if t not in GtfsFeed.TABELAS and t not in DERIVADAS:
+            raise ValueError(f"Tabela GTFS inválida: '{t}'. Usar uma de {GtfsFeed.TABELAS + DERIVADAS}.")
+    for d in datasets:
+        if d not in DATASETS:
+            raise ValueError(f"Dataset inválido: '{d}'. Usar um de {list(DATASETS)}.")
+    # Caminhos absolutos: as tarefas dos scripts mudam a pasta atual do processo
+    pasta_gtfs = str(Path(pasta_gtfs).resolve())
+    pasta_saida = Path(pasta_saida).resolve()
+    for t in tabelas:
+        origem = "stop_times" if t == "route_trip_stop" else t
+        if t in CHAVES_CORTE and not (Path(pasta_gtfs) / f"{origem}.txt").is_file():
+            raise ValueError(f"Ficheiro GTFS inexistente: '{Path(pasta_gtfs) / f'{origem}.txt'}'.")
+    processos = processos or os.cpu_count() or 1
+    partes = partes or processos
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+    feed = GtfsFeed(pasta_gtfs)
+    inicio = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(dir=pasta_saida, prefix=".conversao_") as tmp, \
+            ProcessPoolExecutor(processos) as executor:
+        # saída -> [(fragmento, futuro)], pela ordem em que são juntados
+        trabalhos = {}
+        brutas = {}
+        for tabela in tabelas:
+            saida = str(Path(pasta_saida) / saida_tabela(tabela))
+            if tabela not in CHAVES_CORTE:
+                fragmento = str(Path(tmp) / f"{tabela}.part")
+                trabalhos[saida] = [(fragmento, executor.submit(_tarefa_tabela, pasta_gtfs, tabela, fragmento, opcoes))]
+                continue
+            origem = "stop_times" if tabela == "route_trip_stop" else tabela
+            if origem not in brutas:
+                brutas[origem] = ler_tabela_bruta(pasta_gtfs, origem)
+            bruta = brutas[origem]
+            if tabela == "route_trip_stop":
+                viagens, paragens = preparar_dimensoes_route_trip_stop(*feed.dimensoes_route_trip_stop())
+            trabalhos[saida] = []
+            for i, (a, b) in enumerate(cortes_por_chave(bruta[CHAVES_CORTE[tabela]], partes)):
+                fragmento = str(Path(tmp) / f"{tabela}_{i:04d}.part")
+                if tabela == "route_trip_stop":
+                    futuro = executor.submit(_tarefa_bloco_route_trip_stop, bruta.iloc[a:b], viagens, paragens,
+                                             fragmento, opcoes)
+                else:
+                    futuro = executor.submit(_tarefa_bloco, tabela, bruta.iloc[a:b], fragmento, opcoes)
+                trabalhos[saida].append((fragmento, futuro))
+        brutas.clear()
+
+        scripts = {str(PASTA_REPO / d / s): executor.submit(_tarefa_script, str(PASTA_REPO / d / s),
+                                                            str(pasta_saida), opcoes)
+                   for d in datasets for s in DATASETS[d]}
+
+        resultados = []
+        for saida, partes_saida in trabalhos.items():
+            saida = caminho_saida(saida, opcoes.compressao)
+            nome = Path(saida).name
+            try:
+                fragmentos = []
+                for fragmento, futuro in partes_saida:
+                    resultado = futuro.result()
+                    if isinstance(resultado[0], tuple):
+                        resultado, sem_trip = resultado
+                        if orfaos is not None and len(sem_trip):
+                            orfaos.append(sem_trip)
+                    fragmentos.append((fragmento, *resultado))
+                n = juntar_fragmentos(fragmentos, saida, opcoes)
+                resultados.append(Resultado(nome, saida, n, time.perf_counter() - inicio))
+            except Exception as e:
+                resultados.append(Resultado(nome, None, None, time.perf_counter() - inicio, f"{type(e).__name__}: {e}"))
+        for script, futuro in scripts.items():
+            nome = str(Path(script).relative_to(PASTA_REPO))
+            try:
+                futuro.result()
+                resultados.append(Resultado(nome, None, None, time.perf_counter() - inicio))
+            except Exception as e:
+                resultados.append(Resultado(nome, None, None, time.perf_counter() - inicio, f"{type(e).__name__}: {e}"))
+    return resultados
+
+
+if __name__ == "__main__":
+    # python conversaoParalela.py [processos] [pasta_saida]
+    processos = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    stop_times_orfaos = []
+    resultados = converter_em_paralelo(pasta_saida=sys.argv[2] if len(sys.argv) > 2 else ".",
+                                       processos=processos, orfaos=stop_times_orfaos)
+    for r in resultados:
+        estado = f"ERRO {r.erro}" if r.erro else (f"{r.entidades} entidades" if r.entidades is not None else "ok")
+        print(f"{r.nome:<40} {r.segundos:>8.2f}s  {estado}")
+    n_orfaos = sum(len(o) for o in stop_times_orfaos)
+    if n_orfaos:
+        print(f"Aviso: {n_orfaos} stop_times sem trip correspondente foram ignorados "
+              f"(ex.: trip_id {stop_times_orfaos[0]['trip_id'].iloc[0]})")
+    if any(r.erro for r in resultados):
+        sys.exit(1)
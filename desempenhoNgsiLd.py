@@ -0,0 +1,399 @@
+import ast
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+import pandas as pd, numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent / "GTFS TUB"))
+from gtfsTUB import GtfsFeed, juntar_route_trip_stop, ler_csv_em_blocos, preparar_dimensoes_route_trip_stop, route_trip_stop_to_ngsi_ld
+from gtfsCache import PASTA_GTFS, abrir_feed, hora_para_segundos_coluna
+from gtfsCalendario import CalendarioServicos
+from gtfsDiff import ler_tabela_bruta
+from gtfsFiltrar import ConsultasHorarios
+from saidaNgsiLd import EscritorNgsiLd, opcoes_saida
+
+# Medição do desempenho dos conversores com dados sintéticos em escala.
+#   - GTFS: o feed do TUB multiplicado por um fator (cada cópia das viagens
+#     tem trip_id/shape_id próprios e horas deslocadas alguns minutos).
+#   - Datasets: Estatuaria.csv, Evento.csv e Autores.csv com N linhas
+#     (linhas reais repetidas, com ids novos), convertidos pelos próprios
+#     scripts; cada instrução do script conta para uma etapa (a do bloco
+#     with etapa(...) do script ou, fora destes, validacao,
+#     conversao_ngsi_ld, escrita_json ou preparacao).
+# Cada etapa é medida em tempo (mínimo e mediana de várias repetições) e em
+# memória (pico alocado durante a etapa, com tracemalloc, numa repetição à
+# parte). Os resultados são guardados em JSON para comparar execuções de
+# commits diferentes com um limite de regressão.
+
+PASTA_REPO = Path(__file__).resolve().parent
+PASTA_DADOS = ".desempenho"
+VERSAO = 1
+
+# Tabelas do GTFS copiadas sem alterações para o feed sintético
+TABELAS_FIXAS = ("agency", "stops", "routes", "calendar", "calendar_dates", "fare_attributes", "fare_rules")
+
+# (pasta do dataset, script, CSV, colunas com ids únicos)
+DATASETS = [
+    ("Estatuária de Braga", "estatuaria.py", "Estatuaria.csv", ("identificacao", "num_inventario")),
+    ("Braga É Natal", "evento.py", "Evento.csv", ("id_evento",)),
+    ("Estatuária de Braga", "autor.py", "Autores.csv", ("id_autor",)),
+]
+
+# Consultas do gtfsFiltrar: amostra de viagens e paragens, numa segunda-feira
+# do calendário do TUB
+CONSULTAS = 200
+DATA_CONSULTAS = date(2024, 11, 4)
+
+class Regressao(NamedTuple):
+    medicao: str
+    metrica: str
+    referencia: float
+    atual: float
+
+    @property
+    def variacao(self) -> float:
+        return self.atual / self.referencia - 1
+
+# Tempo e pico de memória acumulados por etapa (uma etapa pode ser medida
+# várias vezes, ex.: uma vez por bloco de stop_times)
+class Medidor:
+    def __init__(self, memoria: bool = False):
+        self.memoria = memoria
+        self.segundos = Counter()
+        self.picos = {}
+        self.linhas = Counter()
+
+    @contextmanager
+    def etapa(self, nome: str, linhas: int = 0):
+        if self.memoria:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.segundos[nome] += time.perf_counter() - inicio
+            self.linhas[nome] += linhas
+            if self.memoria:
+                pico = tracemalloc.get_traced_memory()[1] - base
+                self.picos[nome] = max(self.picos.get(nome, 0), pico)
+
+# Dados sintéticos (gerados uma vez por pasta e reaproveitados)
+def _horas_deslocadas(horas: pd.Series, minutos: int) -> pd.Series:
+    segundos = hora_para_segundos_coluna(horas) + minutos * 60
+    h, resto = np.divmod(segundos, 3600)
+    m, s = np.divmod(resto, 60)
+    texto = [f"{a:02d}:{b:02d}:{c:02d}" for a, b, c in zip(h.tolist(), m.tolist(), s.tolist())]
+    return pd.Series(texto, index=horas.index).where(horas.notna(), None)
+
+def gerar_gtfs_sintetico(fator: int, pasta_dados: str = PASTA_DADOS, pasta_gtfs=PASTA_GTFS) -> str:
+    if fator < 1:
+        raise ValueError(f"Fator inválido: {fator}. Usar um inteiro >= 1.")
+    destino = Path(pasta_dados) / f"gtfs_x{fator}"
+    if (destino / ".completo").exists():
+        return str(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    for tabela in TABELAS_FIXAS:
+        origem = Path(pasta_gtfs) / f"{tabela}.txt"
+        if origem.exists():
+            (destino / origem.name).write_bytes(origem.read_bytes())
+
+    # A cópia 0 é o feed original; as seguintes têm ids com sufixo "_x{k}"
+    def sufixo(col: pd.Series, k: int) -> pd.Series:
+        return col if k == 0 else (col + f"_x{k}").where(col.notna(), None)
+
+    trips = ler_tabela_bruta(str(pasta_gtfs), "trips")
+    stop_times = ler_tabela_bruta(str(pasta_gtfs), "stop_times")
+    shapes = ler_tabela_bruta(str(pasta_gtfs), "shapes")
+    for k in range(fator):
+        copia = dict(header=k == 0, mode="w" if k == 0 else "a", index=False)
+        t = trips.assign(trip_id=sufixo(trips["trip_id"], k), shape_id=sufixo(trips["shape_id"], k))
+        t.to_csv(destino / "trips.txt", **copia)
+        st = stop_times.assign(trip_id=sufixo(stop_times["trip_id"], k))
+        if k:
+            minutos = k % 60
+            st["arrival_time"] = _horas_deslocadas(st["arrival_time"], minutos)
+            st["departure_time"] = _horas_deslocadas(st["departure_time"], minutos)
+        st.to_csv(destino / "stop_times.txt", **copia)
+        shapes.assign(shape_id=sufixo(shapes["shape_id"], k)).to_csv(destino / "shapes.txt", **copia)
+    (destino / ".completo").touch()
+    return str(destino)
+
+def gerar_csv_sintetico(linhas: int, pasta_dados: str = PASTA_DADOS) -> str:
+    if linhas < 1:
+        raise ValueError(f"Número de linhas inválido: {linhas}. Usar um inteiro >= 1.")
+    destino = Path(pasta_dados) / f"csv_{linhas}"
+    if (destino / ".completo").exists():
+        return str(destino)
+    for pasta, _, nome, ids in DATASETS:
+        df = pd.read_csv(PASTA_REPO / pasta / "csv" / nome, dtype=str)
+        df = df.iloc[np.arange(linhas) % len(df)].reset_index(drop=True)
+        for col in ids:
+            df[col] = [str(i) for i in range(1, linhas + 1)]
+        (destino / pasta / "csv").mkdir(parents=True, exist_ok=True)
+        df.to_csv(destino / pasta / "csv" / nome, index=False)
+    (destino / ".completo").touch()
+    return str(destino)
+
+# Medições
+def medir_gtfs(pasta: str, medidor: Medidor, chunksize: int = 50_000) -> None:
+    m = medidor
+    feed = GtfsFeed(pasta, chunksize)
+    opcoes = opcoes_saida()
+    with m.etapa("tabelas_pequenas/modelos"):
+        dimensoes = feed.dimensoes_route_trip_stop()
+    with m.etapa("route_trip_stop/juncao"):
+        viagens, paragens = preparar_dimensoes_route_trip_stop(*dimensoes)
+
+    with tempfile.TemporaryDirectory(dir=pasta, prefix=".saida_") as tmp, \
+            EscritorNgsiLd(str(Path(tmp) / "GtfsRouteTripStop.jsonld"), opcoes) as escritor_rts:
+        for tabela in GtfsFeed._TIPADAS:
+            tipar, converter, kwargs = GtfsFeed._TIPADAS[tabela]
+            blocos = ler_csv_em_blocos(feed.caminho(tabela), chunksize, **kwargs)
+            with EscritorNgsiLd(str(Path(tmp) / f"{tabela}.jsonld"), opcoes) as escritor:
+                while True:
+                    with m.etapa(f"{tabela}/leitura_csv"):
+                        bloco = next(blocos, None)
+                    if bloco is None:
+                        break
+                    with m.etapa(f"{tabela}/modelos", len(bloco)):
+                        tipada = tipar(bloco)
+                    with m.etapa(f"{tabela}/conversao_ngsi_ld"):
+                        entidades = converter(tipada)
+                    with m.etapa(f"{tabela}/escrita_json", len(entidades)):
+                        for entidade in entidades:
+                            escritor.escrever(entidade)
+                    del entidades
+                    if tabela != "stop_times":
+                        continue
+                    with m.etapa("route_trip_stop/juncao"):
+                        juncao, _ = juntar_route_trip_stop(tipada, viagens, paragens)
+                    with m.etapa("route_trip_stop/conversao_ngsi_ld"):
+                        entidades = list(route_trip_stop_to_ngsi_ld(juncao))
+                    with m.etapa("route_trip_stop/escrita_json", len(entidades)):
+                        for entidade in entidades:
+                            escritor_rts.escrever(entidade)
+                    del entidades, juncao
+
+        # gtfsFiltrar: cache binária compilada de novo em cada repetição
+        with m.etapa("gtfsFiltrar/compilar_cache"):
+            compilado = abrir_feed(pasta, str(Path(tmp) / "cache"))
+        with m.etapa("gtfsFiltrar/indices"):
+            calendario = CalendarioServicos(compilado.tabela("calendar"), compilado.tabela("calendar_dates"))
+            consultas = ConsultasHorarios.de_feed(compilado, calendario)
+        aleatorio = np.random.default_rng(0)
+        viagens_amostra = aleatorio.choice(compilado.tabela("trips")["trip_id"].to_numpy(), CONSULTAS).tolist()
+        paragens_amostra = aleatorio.choice(compilado.tabela("stops")["stop_id"].to_numpy(), CONSULTAS).tolist()
+        with m.etapa("gtfsFiltrar/consultas", 3 * CONSULTAS):
+            for trip_id, stop_id in zip(viagens_amostra, paragens_amostra):
+                consultas.paragens_da_viagem(trip_id, DATA_CONSULTAS)
+                consultas.autocarros_da_paragem(stop_id, DATA_CONSULTAS)
+                consultas.proximos_autocarros(stop_id, "13:00:00", 15, DATA_CONSULTAS)
+        del consultas, compilado
+
+def _etapa_instrucao(instrucao: ast.stmt) -> str:
+    # Blocos já instrumentados no script: with etapa("nome", ...)
+    if isinstance(instrucao, ast.With):
+        for item in instrucao.items:
+            c = item.context_expr
+            if (isinstance(c, ast.Call) and isinstance(c.func, ast.Name) and c.func.id == "etapa"
+                    and c.args and isinstance(c.args[0], ast.Constant)):
+                return c.args[0].value
+    chamadas = {c.func.id if isinstance(c.func, ast.Name) else c.func.attr
+                for c in ast.walk(instrucao)
+                if isinstance(c, ast.Call) and isinstance(c.func, (ast.Name, ast.Attribute))}
+    if "escrever_ngsi_ld" in chamadas:
+        return "escrita_json"
+    if "validar_ou_falhar" in chamadas:
+        return "validacao"
+    if "read_csv" in chamadas:
+        return "leitura_csv"
+    if isinstance(instrucao, ast.Assign) and isinstance(instrucao.value, ast.ListComp):
+        alvo = instrucao.targets[0]
+        if isinstance(alvo, ast.Name) and alvo.id.endswith("_ngsi"):
+            return "conversao_ngsi_ld"
+        return "modelos"
+    return "preparacao"
+
+# Corre o script do dataset instrução a instrução, como se estivesse em
+# {pasta}/{dataset}/ (lê o CSV sintético) e com a saída numa pasta temporária.
+# Cada execução tem um nome de módulo próprio: o pydantic recusa validadores
+# repetidos com o mesmo módulo e nome
+_execucoes = itertools.count()
+
+def medir_script(pasta: str, dataset: str, script: str, medidor: Medidor) -> None:
+    caminho = PASTA_REPO / dataset / script
+    arvore = ast.parse(caminho.read_text(encoding="utf-8"), str(caminho))
+    ambiente = {"__name__": f"_desempenho_{Path(script).stem}_{next(_execucoes)}",
+                "__file__": str(Path(pasta).resolve() / dataset / script)}
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory(dir=pasta, prefix=".saida_") as tmp:
+        os.chdir(tmp)
+        try:
+            for instrucao in arvore.body:
+                codigo = compile(ast.Module([instrucao], type_ignores=[]), str(caminho), "exec")
+                with medidor.etapa(_etapa_instrucao(instrucao)):
+                    exec(codigo, ambiente)
+        finally:
+            os.chdir(anterior)
+
+# Uma repetição com tracemalloc (memória) e `repeticoes` só com o tempo
+def _medir(funcao, repeticoes: int, memoria: bool) -> dict:
+    tempos = []
+    medidor = None
+    if memoria:
+        medidor = Medidor(memoria=True)
+        tracemalloc.start()
+        try:
+            funcao(medidor)
+        finally:
+            tracemalloc.stop()
+    for _ in range(repeticoes):
+        m = Medidor()
+        funcao(m)
+        tempos.append(m)
+    medidor = medidor or tempos[0]
+    resultado = {}
+    for etapa in (tempos[0] if tempos else medidor).segundos:
+        segundos = [m.segundos[etapa] for m in tempos]
+        resultado[etapa] = {
+            "segundos": min(segundos) if segundos else None,
+            "mediana": statistics.median(segundos) if segundos else None,
+            "pico_mb": round(medidor.picos[etapa] / 2**20, 3) if etapa in medidor.picos else None,
+            "linhas": medidor.linhas[etapa] or None,
+        }
+    return resultado
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executar_desempenho(fatores=(1, 10), linhas=(10_000, 100_000), repeticoes: int = 3, memoria: bool = True,
+                        pasta_dados: str = PASTA_DADOS, chunksize: int = 50_000) -> dict:
+    if repeticoes < 1:
+        raise ValueError(f"Número de repetições inválido: {repeticoes}. Usar um inteiro >= 1.")
+    Path(pasta_dados).mkdir(parents=True, exist_ok=True)
+    medicoes, erros = {}, {}
+    for fator in fatores:
+        pasta = gerar_gtfs_sintetico(fator, pasta_dados)
+        nome = f"gtfs_x{fator}"
+        try:
+            etapas = _medir(lambda m: medir_gtfs(pasta, m, chunksize), repeticoes, memoria)
+        except Exception as e:
+            erros[nome] = f"{type(e).__name__}: {e}"
+            continue
+        medicoes.update({f"{nome}/{etapa}": valores for etapa, valores in etapas.items()})
+    for n in linhas:
+        pasta = gerar_csv_sintetico(n, pasta_dados)
+        for dataset, script, _, _ in DATASETS:
+            nome = f"{Path(script).stem}_{n}"
+            try:
+                etapas = _medir(lambda m: medir_script(pasta, dataset, script, m), repeticoes, memoria)
+            except Exception as e:
+                erros[nome] = f"{type(e).__name__}: {e}"
+                continue
+            medicoes.update({f"{nome}/{etapa}": valores for etapa, valores in etapas.items()})
+    return {
+        "versao": VERSAO,
+        "commit": _commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processadores": os.cpu_count(),
+        "repeticoes": repeticoes,
+        "medicoes": medicoes,
+        "erros": erros,
+    }
+
+# Medições em que o tempo (mínimo) ou o pico de memória subiram mais do que
+# o limite; tempos abaixo de `minimo_segundos` nas duas execuções são ruído
+def comparar(atual: dict, referencia: dict, limite: float = 0.2, limite_memoria: Optional[float] = None,
+             minimo_segundos: float = 0.05) -> list:
+    limite_memoria = limite if limite_memoria is None else limite_memoria
+    regressoes = []
+    for nome, valores in atual["medicoes"].items():
+        antes = referencia["medicoes"].get(nome)
+        if antes is None:
+            continue
+        for metrica, lim, minimo in (("segundos", limite, minimo_segundos), ("pico_mb", limite_memoria, 1.0)):
+            a, b = antes.get(metrica), valores.get(metrica)
+            if a is None or b is None or max(a, b) < minimo:
+                continue
+            if b > max(a, 1e-9) * (1 + lim):
+                regressoes.append(Regressao(nome, metrica, a, b))
+    return regressoes
+
+def imprimir_resultados(resultados: dict, referencia: Optional[dict] = None, saida=None):
+    saida = saida or sys.stdout
+    anteriores = referencia["medicoes"] if referencia else {}
+    largura = max(map(len, resultados["medicoes"]), default=0)
+    for nome, v in resultados["medicoes"].items():
+        linha = f"{nome:<{largura}} {v['segundos']:>9.3f}s"
+        linha += f" {v['pico_mb']:>9.1f} MB" if v["pico_mb"] is not None else " " * 13
+        antes = anteriores.get(nome)
+        if antes and antes.get("segundos"):
+            linha += f"  {v['segundos'] / antes['segundos'] - 1:+7.1%}"
+        print(linha, file=saida)
+    for nome, erro in resultados["erros"].items():
+        print(f"{nome}: ERRO {erro}", file=saida)
+
+
+if __name__ == "__main__":
+    # python desempenhoNgsiLd.py [--fatores 1,10,100] [--linhas 10000,100000] [--repeticoes N]
+    #                            [--sem-memoria] [--dados pasta] [--saida ficheiro.json]
+    #                            [--comparar referencia.json] [--limite 0.2]
+    # Termina com código 1 se houver erros ou regressões em relação à referência
+    args = sys.argv[1:]
+    memoria = "--sem-memoria" not in args
+    args = [a for a in args if a != "--sem-memoria"]
+    inteiros = lambda v: tuple(int(x) for x in v.split(",") if x)
+    kwargs, extras = {}, {"saida": None, "comparar": None, "limite": 0.2}
+    for opcao, nome, tipo in (("--fatores", "fatores", inteiros), ("--linhas", "linhas", inteiros),
+                              ("--repeticoes", "repeticoes", int), ("--dados", "pasta_dados", str),
+                              ("--saida", "saida", str), ("--comparar", "comparar", str), ("--limite", "limite", float)):
+        if opcao in args:
+            i = args.index(opcao)
+            valor = tipo(args[i + 1])
+            if nome in extras:
+                extras[nome] = valor
+            else:
+                kwargs[nome] = valor
+            del args[i:i + 2]
+    if args:
+        print(f"Argumentos desconhecidos: {args}")
+        sys.exit(2)
+    resultados = executar_desempenho(memoria=memoria, **kwargs)
+    saida = extras["saida"] or str(Path(kwargs.get("pasta_dados", PASTA_DADOS)) / "resultados"
+                                   / f"{resultados['commit'] or 'local'}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    Path(saida).parent.mkdir(parents=True, exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    referencia = None
+    if extras["comparar"]:
+        with open(extras["comparar"], "r", encoding="utf-8") as f:
+            referencia = json.load(f)
+    imprimir_resultados(resultados, referencia)
+    print(f"Resultados em {saida}")
+    regressoes = comparar(resultados, referencia, extras["limite"]) if referencia else []
+    for r in regressoes:
+        unidade = "s" if r.metrica == "segundos" else " MB"
+        print(f"REGRESSÃO {r.medicao} {r.metrica}: {r.referencia:.3f}{unidade} -> {r.atual:.3f}{unidade} ({r.variacao:+.1%})")
+    if regressoes or resultados["erros"]:
+        sys.exit(1)
@@ -0,0 +1,203 @@
+import json
+import math
+import re
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+
+RAIO_TERRA_M = 6_371_008.8
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# Vértices [lon, lat] de uma geometria GeoJSON
+def _vertices(geometria: dict) -> list:
+    tipo, coords = geometria.get("type"), geometria.get("coordinates")
+    if coords is None:
+        return []
+    if tipo == "Point":
+        return [coords]
+    if tipo in ("LineString", "MultiPoint"):
+        return list(coords)
+    if tipo in ("Polygon", "MultiLineString"):
+        return [c for parte in coords for c in parte]
+    if tipo == "MultiPolygon":
+        return [c for poligono in coords for anel in poligono for c in anel]
+    return []
+
+# Coordenadas de uma entidade NGSI-LD: GeoProperty "location" (normalizado ou
+# keyValues) ou GeoCoordinates schema.org em "geo"
+def coordenadas_entidade(entidade: dict, atributo: str = "location") -> list:
+    for nome in (atributo, "geo"):
+        attr = entidade.get(nome)
+        valor = attr.get("value", attr) if isinstance(attr, dict) else None
+        if not isinstance(valor, dict):
+            continue
+        if "coordinates" in valor:
+            return _vertices(valor)
+        if valor.get("latitude") is not None and valor.get("longitude") is not None:
+            return [[float(valor["longitude"]), float(valor["latitude"])]]
+    return []
+
+def _ponto_em_poligono(lon: np.ndarray, lat: np.ndarray, aneis: list) -> np.ndarray:
+    # Regra par-ímpar sobre todos os anéis (o primeiro é o exterior, os outros buracos)
+    dentro = np.zeros(len(lon), dtype=bool)
+    for anel in aneis:
+        xy = np.asarray(anel, dtype=float)
+        x1, y1 = xy[:, 0], xy[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            cruza = (ay > lat) != (by > lat)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_int = ax + (lat - ay) * (bx - ax) / (by - ay)
+            dentro ^= cruza & (lon < x_int)
+    return dentro
+
+# Índice em grelha regular (células de tamanho_celula_m) com as células
+# ordenadas numa estrutura CSR; as distâncias finais são sempre haversine.
+# Geometrias não pontuais são indexadas pelos vértices e cada entidade aparece
+# uma vez nos resultados, com a distância do vértice mais próximo.
+# Não trata o antimeridiano nem os polos.
+class IndiceEspacial:
+    def __init__(self, lat, lon, ids: Optional[list] = None, dono=None, tamanho_celula_m: float = 250.0):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self._dono = np.arange(len(self.lat)) if dono is None else np.asarray(dono, dtype=np.int64)
+        self.ids = list(ids) if ids is not None else list(range(int(self._dono.max()) + 1 if len(self._dono) else 0))
+        self.tamanho_celula_m = tamanho_celula_m
+
+        n = len(self.lat)
+        self._lat0 = float(self.lat.min()) if n else 0.0
+        self._lon0 = float(self.lon.min()) if n else 0.0
+        lat_ref = math.radians(float(np.abs(self.lat).max())) if n else 0.0
+        self._dlat = math.degrees(tamanho_celula_m / RAIO_TERRA_M)
+        self._dlon = self._dlat / max(math.cos(lat_ref), 1e-6)
+        self._linhas = int((self.lat.max() - self._lat0) // self._dlat) + 1 if n else 1
+        self._colunas = int((self.lon.max() - self._lon0) // self._dlon) + 1 if n else 1
+
+        chaves = self._celula_lat(self.lat) * self._colunas + self._celula_lon(self.lon)
+        self._ordem = np.argsort(chaves, kind="stable")
+        self._chaves = chaves[self._ordem]
+
+    @classmethod
+    def de_entidades(cls, entidades: list, atributo: str = "location", tamanho_celula_m: float = 250.0) -> "IndiceEspacial":
+        ids, dono, lon, lat = [], [], [], []
+        for e in entidades:
+            vertices = coordenadas_entidade(e, atributo)
+            if not vertices:
+                continue
+            for v in vertices:
+                lon.append(v[0])
+                lat.append(v[1])
+                dono.append(len(ids))
+            ids.append(e["id"])
+        return cls(lat, lon, ids, dono, tamanho_celula_m)
+
+    @classmethod
+    def de_tabela(cls, df, lat: str = "stop_lat", lon: str = "stop_lon", id: str = "stop_id",
+                  tamanho_celula_m: float = 250.0) -> "IndiceEspacial":
+        validas = df[lat].notna() & df[lon].notna()
+        df = df[validas]
+        return cls(df[lat].astype(float).to_numpy(), df[lon].astype(float).to_numpy(),
+                   df[id].tolist(), tamanho_celula_m=tamanho_celula_m)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _celula_lat(self, lat):
+        return np.clip(((np.asarray(lat) - self._lat0) // self._dlat).astype(np.int64), 0, self._linhas - 1)
+
+    def _celula_lon(self, lon):
+        return np.clip(((np.asarray(lon) - self._lon0) // self._dlon).astype(np.int64), 0, self._colunas - 1)
+
+    # Índices dos pontos nas células que cobrem o retângulo
+    def _candidatos(self, lat_min, lat_max, lon_min, lon_max) -> np.ndarray:
+        if not len(self._chaves):
+            return np.empty(0, dtype=np.int64)
+        i0, i1 = self._celula_lat([lat_min, lat_max])
+        j0, j1 = self._celula_lon([lon_min, lon_max])
+        linhas = np.arange(i0, i1 + 1) * self._colunas
+        ini = np.searchsorted(self._chaves, linhas + j0, side="left")
+        fim = np.searchsorted(self._chaves, linhas + j1, side="right")
+        if len(ini) == 1:
+            return self._ordem[ini[0]:fim[0]]
+        return np.concatenate([self._ordem[a:b] for a, b in zip(ini, fim)])
+
+    # Uma linha por entidade, com a menor distância, ordenado por distância
+    def _por_entidade(self, pontos: np.ndarray, dist: np.ndarray) -> list:
+        ordem = np.argsort(dist, kind="stable")
+        donos = self._dono[pontos[ordem]]
+        _, primeiro = np.unique(donos, return_index=True)
+        primeiro.sort()
+        return [(self.ids[d], float(m)) for d, m in zip(donos[primeiro].tolist(), dist[ordem][primeiro].tolist())]
+
+    # Entidades a entre min_m e max_m metros de (lat, lon)
+    def no_raio(self, lat: float, lon: float, max_m: float, min_m: float = 0.0) -> list:
+        dlat = math.degrees(max_m / RAIO_TERRA_M)
+        lat_ext = min(abs(lat) + dlat, 89.9)
+        dlon = math.degrees(max_m / (RAIO_TERRA_M * math.cos(math.radians(lat_ext))))
+        pontos = self._candidatos(lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        dist = haversine_m(lat, lon, self.lat[pontos], self.lon[pontos])
+        resultado = self._por_entidade(pontos[dist <= max_m], dist[dist <= max_m])
+        return [r for r in resultado if r[1] >= min_m] if min_m > 0 else resultado
+
+    # As k entidades mais próximas (raio de procura duplicado até haver k)
+    def k_proximos(self, lat: float, lon: float, k: int, max_m: Optional[float] = None) -> list:
+        if k <= 0 or not len(self.ids):
+            return []
+        raio = self.tamanho_celula_m
+        limite = max_m if max_m is not None else math.pi * RAIO_TERRA_M
+        while True:
+            raio = min(raio, limite)
+            resultado = self.no_raio(lat, lon, raio)
+            if len(resultado) >= k or raio >= limite:
+                return resultado[:k]
+            raio *= 2
+
+    # Entidades com algum vértice dentro do polígono (coordenadas GeoJSON: lista de anéis)
+    def dentro(self, poligono: list) -> list:
+        exterior = np.asarray(poligono[0], dtype=float)
+        pontos = self._candidatos(exterior[:, 1].min(), exterior[:, 1].max(),
+                                  exterior[:, 0].min(), exterior[:, 0].max())
+        if not len(pontos):
+            return []
+        dentro = _ponto_em_poligono(self.lon[pontos], self.lat[pontos], poligono)
+        donos = np.unique(self._dono[pontos[dentro]])
+        return [self.ids[d] for d in donos.tolist()]
+
+    # Consulta no estilo NGSI-LD: georel=near;maxDistance==300 ou within,
+    # geometry=Point|Polygon, coordinates em GeoJSON (lista ou texto)
+    def consulta_ngsi_ld(self, georel: str, geometry: str, coordinates: Union[str, list]) -> list:
+        if isinstance(coordinates, str):
+            coordinates = json.loads(coordinates)
+        partes = georel.split(";")
+        relacao = partes[0].strip()
+        if relacao == "near":
+            if geometry != "Point":
+                raise ValueError("georel=near só é suportado com geometry=Point.")
+            params = {}
+            for p in partes[1:]:
+                m = re.fullmatch(r"\s*(maxDistance|minDistance)==([0-9.]+)\s*", p)
+                if not m:
+                    raise ValueError(f"Modificador inválido em georel: '{p}'.")
+                params[m.group(1)] = float(m.group(2))
+            lon, lat = coordinates
+            if "maxDistance" not in params:
+                raise ValueError("georel=near requer maxDistance.")
+            return self.no_raio(lat, lon, params["maxDistance"], params.get("minDistance", 0.0))
+        if relacao == "within":
+            if geometry != "Polygon":
+                raise ValueError("georel=within só é suportado com geometry=Polygon.")
+            return self.dentro(coordinates)
+        raise ValueError(f"georel não suportado: '{georel}'.")
+
+
+if __name__ == "__main__":
+    with open(Path(__file__).resolve().parent / "estatuarias_ngsi.jsonld", "r", encoding="utf-8") as f:
+        indice = IndiceEspacial.de_entidades(json.load(f))
+    # Esculturas a menos de 300 m da Avenida Central
+    for id_, dist in indice.consulta_ngsi_ld("near;maxDistance==300", "Point", [-8.4225, 41.5527]):
+        print(f"{id_:<35} {dist:8.1f} m")
@@ -0,0 +1,368 @@
+import atexit
+import cProfile
+import functools
+import json
+import multiprocessing.util
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+# Instrumentação por etapa dos conversores: tempo real, tempo de CPU, linhas
+# por segundo e pico de memória (tracemalloc), por etapa e por tipo de
+# entidade (na leitura dos CSV, o tipo é o nome do ficheiro). Os conversores
+# reportam com etapa() (blocos), medido() (funções), medir_funcao() e
+# medir_iteravel() (chamadas por entidade, sem memória).
+# Controlada por variáveis de ambiente, lidas na importação:
+#   NGSILD_INSTRUMENTACAO        "0"/vazio: desligada (etapa() devolve sempre o
+#                                mesmo objeto e medido()/medir_* devolvem a
+#                                própria função ou iterável); "1" (ou "tempo"):
+#                                tempos e linhas; "memoria": também o pico de
+#                                memória de cada etapa (bastante mais lento)
+#   NGSILD_INSTRUMENTACAO_SAIDA  relatório JSON (instrumentacao_ngsi_ld.json)
+#   NGSILD_PERFIL                "etapa" ou "etapa:tipo": corre só essa etapa
+#                                com cProfile e tracemalloc ({saida}.perfil.prof
+#                                e {saida}.perfil_memoria.txt)
+# O tempo próprio de uma etapa exclui as etapas medidas dentro dela (ex.: a
+# conversão de entidades geradas de forma preguiçosa durante a escrita).
+# Nos processos filhos (conversaoParalela, pipelineNgsiLd) cada processo
+# grava uma parte ao terminar; o processo principal junta as partes, escreve
+# o relatório e mostra o resumo em stderr.
+
+_MODOS = {"": False, "0": False, "1": True, "tempo": True, "memoria": True}
+_MODO = os.environ.get("NGSILD_INSTRUMENTACAO", "").strip().lower()
+if _MODO not in _MODOS:
+    raise ValueError(f"NGSILD_INSTRUMENTACAO inválido: '{_MODO}'. Usar '0', '1' (tempo) ou 'memoria'.")
+ATIVA = _MODOS[_MODO]
+MEMORIA = _MODO == "memoria"
+SAIDA = Path(os.environ.get("NGSILD_INSTRUMENTACAO_SAIDA") or "instrumentacao_ngsi_ld.json").resolve()
+PERFIL = tuple(os.environ.get("NGSILD_PERFIL", "").split(":", 1)) if os.environ.get("NGSILD_PERFIL") else None
+
+_perf = time.perf_counter
+_cpu = time.process_time
+
+# (etapa, tipo) -> valores acumulados
+class _Acumulado:
+    __slots__ = ("chamadas", "linhas", "segundos", "proprios", "cpu", "cpu_proprio", "pico")
+
+    def __init__(self):
+        self.zerar()
+
+    def zerar(self):
+        self.chamadas = self.linhas = self.pico = 0
+        self.segundos = self.proprios = self.cpu = self.cpu_proprio = 0.0
+
+    def adicionar(self, segundos: float, cpu: float, filhos: list, linhas: int):
+        self.chamadas += 1
+        self.linhas += linhas
+        self.segundos += segundos
+        self.cpu += cpu
+        self.proprios += segundos - filhos[0]
+        self.cpu_proprio += cpu - filhos[1]
+
+_acumulados = {}
+# Pilha das etapas abertas: [segundos, cpu] das etapas filhas já terminadas
+_pilha = []
+# Etapas completas abertas (para o pico de memória)
+_pilha_memoria = []
+
+def _acumulado(chave: tuple) -> _Acumulado:
+    if chave not in _acumulados:
+        _acumulados[chave] = _Acumulado()
+    return _acumulados[chave]
+
+def _para_o_pai(segundos: float, cpu: float):
+    if _pilha:
+        _pilha[-1][0] += segundos
+        _pilha[-1][1] += cpu
+
+def _com_perfil(chave: tuple) -> bool:
+    return PERFIL is not None and PERFIL[0] == chave[0] and (len(PERFIL) == 1 or PERFIL[1] == chave[1])
+
+# Captura com cProfile e tracemalloc (só as etapas de NGSILD_PERFIL); nas
+# funções por entidade só o cProfile, sem fotografias da memória
+_perfil = None
+_profundidade_perfil = 0
+_memoria_perfil = Counter()      # linha de código -> bytes alocados (saldo)
+_snapshots = []
+
+def _iniciar_perfil(memoria: bool = True):
+    global _perfil, _profundidade_perfil
+    if memoria:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _snapshots.append(tracemalloc.take_snapshot())
+    _profundidade_perfil += 1
+    if _profundidade_perfil == 1:
+        _perfil = _perfil or cProfile.Profile()
+        _perfil.enable()
+
+def _parar_perfil(memoria: bool = True):
+    global _profundidade_perfil
+    _profundidade_perfil -= 1
+    if _profundidade_perfil == 0:
+        _perfil.disable()
+    if memoria:
+        antes = _snapshots.pop()
+        for diferenca in tracemalloc.take_snapshot().compare_to(antes, "lineno"):
+            _memoria_perfil[str(diferenca.traceback[0])] += diferenca.size_diff
+
+class _EtapaInativa:
+    tipo = None
+    linhas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def definir_tipo(self, tipo: Optional[str]):
+        pass
+
+_NADA = _EtapaInativa()
+
+class _Etapa:
+    __slots__ = ("nome", "tipo", "linhas", "_filhos", "_inicio", "_cpu", "_base", "_pico", "_capturar")
+
+    def __init__(self, nome: str, tipo: Optional[str], linhas: int):
+        self.nome, self.tipo, self.linhas = nome, tipo, linhas
+
+    def __enter__(self):
+        if MEMORIA:
+            atual, pico = tracemalloc.get_traced_memory()
+            if _pilha_memoria:
+                _pilha_memoria[-1]._pico = max(_pilha_memoria[-1]._pico, pico)
+            tracemalloc.reset_peak()
+            self._base = self._pico = atual
+            _pilha_memoria.append(self)
+        self._capturar = _com_perfil((self.nome, self.tipo))
+        if self._capturar:
+            _iniciar_perfil()
+        self._filhos = [0.0, 0.0]
+        _pilha.append(self._filhos)
+        self._inicio, self._cpu = _perf(), _cpu()
+        return self
+
+    # Tipo só conhecido depois de a etapa começar (ex.: o da primeira entidade
+    # escrita); a captura de NGSILD_PERFIL começa a partir daqui
+    def definir_tipo(self, tipo: Optional[str]):
+        self.tipo = tipo
+        if not self._capturar and _com_perfil((self.nome, tipo)):
+            self._capturar = True
+            _iniciar_perfil()
+
+    def __exit__(self, *exc):
+        segundos, cpu = _perf() - self._inicio, _cpu() - self._cpu
+        _pilha.pop()
+        if self._capturar:
+            _parar_perfil()
+        acumulado = _acumulado((self.nome, self.tipo))
+        acumulado.adicionar(segundos, cpu, self._filhos, self.linhas)
+        _para_o_pai(segundos, cpu)
+        if MEMORIA:
+            _pilha_memoria.pop()
+            pico = max(self._pico, tracemalloc.get_traced_memory()[1])
+            acumulado.pico = max(acumulado.pico, pico - self._base)
+            if _pilha_memoria:
+                _pilha_memoria[-1]._pico = max(_pilha_memoria[-1]._pico, pico)
+            tracemalloc.reset_peak()
+        return False
+
+# Bloco medido: with etapa("leitura_csv", "Evento.csv") as e: ...; e.linhas
+# pode ser preenchido dentro do bloco, e o tipo com e.definir_tipo()
+def etapa(nome: str, tipo: Optional[str] = None, linhas: int = 0):
+    return _Etapa(nome, tipo, linhas) if ATIVA else _NADA
+
+def _linhas(resultado) -> int:
+    if isinstance(resultado, tuple) and resultado:
+        resultado = resultado[0]
+    return len(resultado) if isinstance(resultado, list) or hasattr(resultado, "shape") else 0
+
+# Decorador: a função inteira é uma etapa; as linhas são o tamanho do
+# resultado (lista, DataFrame ou, num tuplo, o primeiro elemento)
+def medido(nome: str, tipo: Optional[str] = None):
+    def decorar(funcao):
+        if not ATIVA:
+            return funcao
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with _Etapa(nome, tipo, 0) as e:
+                resultado = funcao(*args, **kwargs)
+                e.linhas = _linhas(resultado)
+            return resultado
+        return medida
+    return decorar
+
+# Versão leve, para funções chamadas uma vez por entidade: só tempos, cada
+# chamada conta uma linha
+def medir_funcao(funcao, nome: str, tipo: Optional[str] = None):
+    if not ATIVA:
+        return funcao
+    chave = (nome, tipo)
+    capturar = _com_perfil(chave)
+    acumulado = _acumulado(chave)
+
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        filhos = [0.0, 0.0]
+        _pilha.append(filhos)
+        if capturar:
+            _iniciar_perfil(memoria=False)
+        inicio, cpu = _perf(), _cpu()
+        linhas = 0
+        try:
+            resultado = funcao(*args, **kwargs)
+            linhas = 1
+            return resultado
+        finally:
+            segundos, cpu = _perf() - inicio, _cpu() - cpu
+            if capturar:
+                _parar_perfil(memoria=False)
+            _pilha.pop()
+            acumulado.adicionar(segundos, cpu, filhos, linhas)
+            _para_o_pai(segundos, cpu)
+    return medida
+
+# Iterável cujos elementos são gerados de forma preguiçosa (ex.: um gerador de
+# entidades): conta o tempo de produzir cada elemento
+def medir_iteravel(iteravel, nome: str, tipo: Optional[str] = None):
+    if not ATIVA:
+        return iteravel
+    return _iterar(medir_funcao(iter(iteravel).__next__, nome, tipo))
+
+def _iterar(proximo):
+    while True:
+        try:
+            elemento = proximo()
+        except StopIteration:
+            return
+        yield elemento
+
+# Relatório
+_CAMPOS = ("chamadas", "linhas", "segundos", "proprios", "cpu", "cpu_proprio")
+
+def relatorio() -> dict:
+    etapas = []
+    for (nome, tipo), a in _acumulados.items():
+        if not a.chamadas:
+            continue
+        linha = {"etapa": nome, "tipo": tipo}
+        linha.update({c: getattr(a, c) for c in _CAMPOS})
+        linha["pico_mb"] = round(a.pico / 2**20, 3) if MEMORIA else None
+        etapas.append(linha)
+    return {"execucao": _EXECUCAO, "processos": [os.getpid()], "argv": sys.argv, "modo": _MODO, "etapas": etapas}
+
+def juntar_relatorios(relatorios: list) -> dict:
+    juntas = {}
+    for r in relatorios:
+        for e in r["etapas"]:
+            chave = (e["etapa"], e["tipo"])
+            if chave not in juntas:
+                juntas[chave] = dict(e)
+                continue
+            j = juntas[chave]
+            for c in _CAMPOS:
+                j[c] += e[c]
+            if e["pico_mb"] is not None:
+                j["pico_mb"] = max(j["pico_mb"] or 0, e["pico_mb"])
+    for e in juntas.values():
+        e["linhas_por_segundo"] = round(e["linhas"] / e["segundos"], 1) if e["linhas"] and e["segundos"] else None
+    base = relatorios[0]
+    return {"execucao": base["execucao"], "processos": [p for r in relatorios for p in r["processos"]],
+            "argv": base["argv"], "modo": base["modo"],
+            "etapas": sorted(juntas.values(), key=lambda e: -e["proprios"])}
+
+def imprimir_resumo(relatorio: dict, saida=None):
+    saida = saida or sys.stdout
+    etapas = relatorio["etapas"]
+    print(f"Instrumentação NGSI-LD: {len(relatorio['processos'])} processo(s), {' '.join(relatorio['argv'])}", file=saida)
+    largura = max([len(f"{e['etapa']} {e['tipo'] or ''}") for e in etapas] + [12])
+    print(f"{'etapa / tipo':<{largura}} {'chamadas':>9} {'linhas':>10} {'total s':>9} {'próprio s':>9} "
+          f"{'cpu s':>9} {'linhas/s':>11} {'pico MB':>9}", file=saida)
+    for e in etapas:
+        nome = f"{e['etapa']} {e['tipo'] or ''}"
+        por_segundo = f"{e['linhas_por_segundo']:>11.0f}" if e["linhas_por_segundo"] else f"{'-':>11}"
+        pico = f"{e['pico_mb']:>9.1f}" if e["pico_mb"] is not None else f"{'-':>9}"
+        print(f"{nome:<{largura}} {e['chamadas']:>9} {e['linhas']:>10} {e['segundos']:>9.3f} {e['proprios']:>9.3f} "
+              f"{e['cpu_proprio']:>9.3f} {por_segundo} {pico}", file=saida)
+
+def _gravar_perfil(sufixo: str):
+    if _perfil is None:
+        return
+    _perfil.dump_stats(f"{SAIDA}.perfil{sufixo}.prof")
+    with open(f"{SAIDA}.perfil{sufixo}_memoria.txt", "w", encoding="utf-8") as f:
+        for linha, tamanho in _memoria_perfil.most_common(30):
+            f.write(f"{tamanho / 2**20:10.3f} MB  {linha}\n")
+
+def _parte(pid: int) -> Path:
+    return SAIDA.with_name(f"{SAIDA.name}.{_EXECUCAO}.{pid}.parte")
+
+_terminado = set()
+
+def _terminar():
+    pid = os.getpid()
+    if pid in _terminado:
+        return
+    _terminado.add(pid)
+    if str(pid) != _EXECUCAO:
+        # Processo filho: grava a sua parte para o principal juntar
+        if any(a.chamadas for a in _acumulados.values()):
+            _parte(pid).write_text(json.dumps(relatorio(), ensure_ascii=False), encoding="utf-8")
+        _gravar_perfil(f".{pid}")
+        return
+    relatorios = [relatorio()]
+    for parte in sorted(SAIDA.parent.glob(f"{SAIDA.name}.{_EXECUCAO}.*.parte")):
+        relatorios.append(json.loads(parte.read_text(encoding="utf-8")))
+        parte.unlink()
+    _gravar_perfil("")
+    final = juntar_relatorios(relatorios)
+    if not final["etapas"]:
+        return
+    with open(SAIDA, "w", encoding="utf-8") as f:
+        json.dump(final, f, indent=2, ensure_ascii=False)
+    imprimir_resumo(final, sys.stderr)
+    print(f"Relatório em {SAIDA}", file=sys.stderr)
+
+# Processos criados por fork começam sem os valores do processo pai. Nos
+# processos do multiprocessing o atexit não corre e os Finalize são apagados
+# depois do fork, por isso o Finalize é registado de novo após essa limpeza
+def _depois_do_fork():
+    global _perfil, _profundidade_perfil
+    _perfil, _profundidade_perfil = None, 0
+    for a in _acumulados.values():
+        a.zerar()
+    _pilha.clear()
+    _pilha_memoria.clear()
+    _memoria_perfil.clear()
+    _registar_fim()
+
+def _registar_fim(*_):
+    multiprocessing.util.Finalize(None, _terminar, exitpriority=0)
+
+class _Processo:
+    pass
+
+_PROCESSO = _Processo()
+_EXECUCAO = None
+if ATIVA:
+    # O primeiro processo instrumentado é o principal; os filhos herdam a variável
+    _EXECUCAO = os.environ.setdefault("NGSILD_INSTRUMENTACAO_EXECUCAO", str(os.getpid()))
+    if MEMORIA and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    atexit.register(_terminar)
+    os.register_at_fork(after_in_child=_depois_do_fork)
+    multiprocessing.util.register_after_fork(_PROCESSO, _registar_fim)
+    if str(os.getpid()) != _EXECUCAO:
+        # Processo filho criado por spawn
+        _registar_fim()
+
+if __name__ == "__main__":
+    # python instrumentacaoNgsiLd.py [relatorio.json]
+    caminho = sys.argv[1] if len(sys.argv) > 1 else str(SAIDA)
+    with open(caminho, "r", encoding="utf-8") as f:
+        imprimir_resumo(json.load(f))
@@ -0,0 +1,124 @@
+import sys
+from collections import Counter
+from typing import Iterable, NamedTuple
+
+from clienteNgsiLd import ler_entidades
+
+# Verificação da integridade referencial entre os ficheiros NGSI-LD gerados
+# (GTFS, Braga É Natal, Estatuária, Espaços DSI): cada Relationship tem de
+# apontar para uma entidade que existe em algum dos ficheiros. Os ficheiros
+# são lidos uma única vez, em streaming: os ids vão para um conjunto e cada
+# ligação é verificada logo; as que apontam para entidades ainda não lidas
+# ficam agrupadas por alvo e são resolvidas no fim.
+# Reconhece atributos normalizados ({"type": "Relationship", "object": ...})
+# e concisos ({"object": ...}); em keyValues as relações não se distinguem.
+
+# Relação: (tipo da entidade de origem, atributo, tipo do alvo)
+class Ligacao(NamedTuple):
+    relacao: tuple
+    alvo: str
+    referencias: int     # quantas entidades apontam para este alvo
+    exemplo: str         # id de uma delas
+
+class Relatorio(NamedTuple):
+    entidades: int
+    duplicados: Counter          # id -> vezes que aparece a mais
+    por_relacao: dict            # relação -> (ligações, ligações em falta)
+    em_falta: list               # [Ligacao], por relação e alvo
+
+    @property
+    def valido(self) -> bool:
+        return not self.em_falta and not self.duplicados
+
+def tipo_do_urn(urn: str) -> str:
+    partes = urn.split(":", 3)
+    return partes[2] if len(partes) > 3 and partes[0] == "urn" and partes[1] == "ngsi-ld" else "?"
+
+def _objetos(atributo):
+    if not isinstance(atributo, dict) or "object" not in atributo:
+        return None
+    if atributo.get("type", "Relationship") != "Relationship":
+        return None
+    objeto = atributo["object"]
+    return objeto if isinstance(objeto, list) else [objeto]
+
+# fontes: caminhos de ficheiros (ver clienteNgsiLd.ler_entidades) ou
+# iteráveis de entidades. externos: tipos que existem fora destes ficheiros
+def verificar_integridade(fontes: Iterable, externos: Iterable[str] = ()) -> Relatorio:
+    externos = set(externos)
+    ids = set()
+    duplicados = Counter()
+    totais = Counter()
+    # (relação, alvo) -> [referências, exemplo], só para alvos ainda não vistos
+    pendentes = {}
+    n = 0
+    for fonte in fontes:
+        entidades = ler_entidades(fonte) if isinstance(fonte, str) else fonte
+        for entidade in entidades:
+            n += 1
+            origem = entidade.get("id")
+            if origem in ids:
+                duplicados[origem] += 1
+            else:
+                ids.add(origem)
+            tipo = entidade.get("type")
+            for nome, atributo in entidade.items():
+                objetos = _objetos(atributo)
+                if objetos is None:
+                    continue
+                for alvo in objetos:
+                    alvo = alvo if isinstance(alvo, str) else str(alvo)
+                    relacao = (tipo, nome, tipo_do_urn(alvo))
+                    totais[relacao] += 1
+                    if alvo in ids:
+                        continue
+                    pendente = pendentes.get((relacao, alvo))
+                    if pendente is None:
+                        pendentes[(relacao, alvo)] = [1, origem]
+                    else:
+                        pendente[0] += 1
+
+    em_falta = []
+    faltas = Counter()
+    for (relacao, alvo), (referencias, exemplo) in pendentes.items():
+        if alvo in ids or relacao[2] in externos:
+            continue
+        faltas[relacao] += referencias
+        em_falta.append(Ligacao(relacao, alvo, referencias, exemplo))
+    em_falta.sort(key=lambda l: (l.relacao, str(l.alvo)))
+    por_relacao = {r: (totais[r], faltas[r]) for r in sorted(totais)}
+    return Relatorio(n, duplicados, por_relacao, em_falta)
+
+def imprimir_relatorio(relatorio: Relatorio, exemplos: int = 5, saida=None):
+    saida = saida or sys.stdout
+    print(f"{relatorio.entidades} entidades, {len(relatorio.duplicados)} ids repetidos", file=saida)
+    rotulos = {r: f"{r[0]}.{r[1]} -> {r[2]}" for r in relatorio.por_relacao}
+    largura = max(map(len, rotulos.values()), default=0)
+    for relacao, (total, faltas) in relatorio.por_relacao.items():
+        print(f"  {rotulos[relacao]:<{largura}} {total:>9} ligações {faltas:>9} em falta", file=saida)
+    por_relacao = {}
+    for ligacao in relatorio.em_falta:
+        por_relacao.setdefault(ligacao.relacao, []).append(ligacao)
+    for (origem, atributo, _), ligacoes in por_relacao.items():
+        print(f"{origem}.{atributo}: {len(ligacoes)} alvos inexistentes, ex.:", file=saida)
+        for l in ligacoes[:exemplos]:
+            print(f"    {l.alvo}  ({l.referencias} referências, ex. {l.exemplo})", file=saida)
+    for urn, vezes in relatorio.duplicados.most_common(exemplos):
+        print(f"id repetido: {urn} (+{vezes})", file=saida)
+
+
+if __name__ == "__main__":
+    # python integridadeNgsiLd.py [--externo Tipo]... <ficheiro.jsonld>...
+    # Termina com código 1 se houver ligações em falta ou ids repetidos
+    args = sys.argv[1:]
+    externos = []
+    while "--externo" in args:
+        i = args.index("--externo")
+        externos.append(args[i + 1])
+        del args[i:i + 2]
+    if not args:
+        print("Uso: python integridadeNgsiLd.py [--externo Tipo]... <ficheiro.jsonld>...")
+        sys.exit(2)
+    relatorio = verificar_integridade(args, externos)
+    imprimir_relatorio(relatorio)
+    sys.exit(0 if relatorio.valido else 1)
@@ -0,0 +1,194 @@
+from typing import NamedTuple, Optional
+from pydantic.fields import SHAPE_SINGLETON
+
+from instrumentacaoNgsiLd import ATIVA, medir_funcao
+
+# Mapeamento declarativo modelo -> entidade NGSI-LD, partilhado pelos
+# conversores (GTFS e datasets schema.org). Cada tipo declara o padrão do id,
+# as relações (tipo alvo, lista ou valor único) e os atributos geográficos;
+# mapeador() gera uma vez, a partir do Mapeamento e dos campos do modelo, a
+# função que converte cada entidade, sem decidir chave a chave se é
+# Property, Relationship ou GeoProperty.
+#   - Os atributos saem pela ordem dos campos do modelo, como em
+#     .dict(by_alias=True, exclude_unset=True, exclude_none=True).
+#   - Valores em lista perdem os itens vazios ([v for v in valor if v]).
+#   - Se todos os campos usados forem obrigatórios (ex.: modelos GTFS e
+#     registos compactos) os valores são lidos diretamente dos atributos,
+#     sem construir o .dict().
+#   - Com a instrumentação ligada (instrumentacaoNgsiLd), cada conversão
+#     conta na etapa "conversao_ngsi_ld" e o .dict() na etapa "modelo_dict".
+
+class Relacao(NamedTuple):
+    alvo: str                          # tipo da entidade alvo: urn:ngsi-ld:{alvo}:{valor}
+    object_type: Optional[str] = None  # "objectType" do atributo, se indicado
+    lista: bool = False                # o valor pode ser uma lista de ids
+
+# Point com coordenadas [lon, lat]; só é gerado se as duas chaves existirem
+# e, se não forem float, se puderem ser convertidas
+class Geo(NamedTuple):
+    lon: str
+    lat: str
+
+# id: chaves (aliases) que formam o id, separadas por "_"
+# ignorar: chaves que não geram atributo ("type" e "@type" nunca geram)
+class Mapeamento(NamedTuple):
+    tipo: str
+    id: tuple
+    contexto: tuple
+    relacoes: Optional[dict] = None
+    geo: Optional[dict] = None
+    ignorar: tuple = ()
+    geo_no_inicio: bool = False
+
+_IGNORAR_SEMPRE = ("type", "@type")
+_ESCALARES = (str, int, float, bool)
+
+def _dict_por_alias(entidade) -> dict:
+    return entidade.dict(by_alias=True, exclude_unset=True, exclude_none=True)
+
+def _campos(modelo) -> list:
+    # Registos compactos (gtfsTUB.registo_compacto) usam os campos do modelo pydantic
+    modelo = getattr(modelo, "modelo", None) or modelo
+    return list(modelo.__fields__.items())
+
+def _escalar(campo) -> bool:
+    return campo.shape == SHAPE_SINGLETON and campo.type_ in _ESCALARES
+
+def _extras_permitidos(modelo) -> bool:
+    config = getattr(getattr(modelo, "modelo", None) or modelo, "__config__", None)
+    return getattr(config, "extra", None) == "allow"
+
+# Texto do dicionário de um atributo, com o valor na variável `v`
+def _atributo(chave: str, relacoes: dict, escalar: bool, ns: dict) -> str:
+    relacao = relacoes.get(chave)
+    if relacao is None:
+        valor = "v" if escalar else "[x for x in v if x] if isinstance(v, list) else v"
+        return f'{{"type": "Property", "value": {valor}}}'
+    prefixo = f"_P{len(ns)}"
+    ns[prefixo] = f"urn:ngsi-ld:{relacao.alvo}:"
+    objeto = f'{prefixo} + str(v)'
+    if relacao.lista:
+        objeto = f"[{prefixo} + str(x) for x in v if x] if isinstance(v, list) else {objeto}"
+    tipo_objeto = f', "objectType": {relacao.object_type!r}' if relacao.object_type else ""
+    return f'{{"type": "Relationship", "object": {objeto}{tipo_objeto}}}'
+
+def _geo(atributo: str, geo: Geo, ler, converter: bool) -> list:
+    linhas = [f"lon = {ler(geo.lon)}", f"lat = {ler(geo.lat)}", "if lon is not None and lat is not None:"]
+    ponto = f'ngsi[{atributo!r}] = {{"type": "GeoProperty", "value": {{"type": "Point", "coordinates": [lon, lat]}}}}'
+    if converter:
+        linhas += ["    try:", "        lat, lon = float(lat), float(lon)",
+                   "    except (TypeError, ValueError):", "        pass", "    else:", "        " + ponto]
+    else:
+        linhas.append("    " + ponto)
+    return linhas
+
+def mapeador(mapeamento: Mapeamento, modelo, nome: Optional[str] = None):
+    m = mapeamento
+    relacoes = m.relacoes or {}
+    geos = m.geo or {}
+    ignorar = set(m.ignorar) | set(_IGNORAR_SEMPRE)
+    campos = _campos(modelo)
+    por_alias = {}
+    for nome_campo, campo in campos:
+        por_alias.setdefault(campo.alias, []).append((nome_campo, campo))
+    usados = [a for a in por_alias if a not in ignorar] + list(m.id) + [c for g in geos.values() for c in g]
+    for chave in list(relacoes) + list(m.id) + [c for g in geos.values() for c in g]:
+        if chave not in por_alias:
+            raise ValueError(f"Mapeamento de {m.tipo}: '{chave}' não é um campo de {modelo.__name__}.")
+    if any(len(v) > 1 for v in por_alias.values()) or _extras_permitidos(modelo):
+        # Aliases repetidos ou campos extra: a ordem só é conhecida no .dict()
+        return _mapeador_generico(m, relacoes, geos, ignorar, nome)
+
+    direto = all(por_alias[a][0][1].required for a in usados)
+    ns = {}
+    if direto:
+        def ler(alias):
+            return f"entidade.{por_alias[alias][0][0]}"
+        corpo = []
+    else:
+        def ler(alias):
+            return f"data.get({alias!r})"
+        if ATIVA:
+            ns["_dict"] = medir_funcao(_dict_por_alias, "modelo_dict", m.tipo)
+            corpo = ["data = _dict(entidade)"]
+        else:
+            corpo = ["data = entidade.dict(by_alias=True, exclude_unset=True, exclude_none=True)"]
+
+    partes_id = []
+    for i, chave in enumerate(m.id):
+        if direto:
+            corpo += [f"i{i} = {ler(chave)}", f"if i{i} is None:", f"    raise KeyError({chave!r})"]
+            partes_id.append(f"{{i{i}}}")
+        else:
+            partes_id.append(f"{{data[{chave!r}]}}")
+    ns["_ID"] = f"urn:ngsi-ld:{m.tipo}:"
+    corpo.append(f'ngsi = {{"id": f"{{_ID}}{"_".join(partes_id)}", "type": {m.tipo!r}}}')
+
+    geo = []
+    for atributo, g in geos.items():
+        converter = not all(por_alias[c][0][1].type_ is float for c in g)
+        geo += _geo(atributo, g, ler, converter)
+    if m.geo_no_inicio:
+        corpo += geo
+    for alias, [(_, campo)] in por_alias.items():
+        if alias in ignorar:
+            continue
+        corpo += [f"v = {ler(alias)}", "if v is not None:",
+                  f"    ngsi[{alias!r}] = {_atributo(alias, relacoes, _escalar(campo), ns)}"]
+    if not m.geo_no_inicio:
+        corpo += geo
+    corpo += [f"ngsi['@context'] = {list(m.contexto)!r}", "return ngsi"]
+
+    nome = nome or f"{m.tipo}_to_ngsi_ld"
+    fonte = f"def {nome}(entidade):\n" + "".join(f"    {linha}\n" for linha in corpo)
+    exec(fonte, ns)
+    funcao = ns[nome]
+    funcao.fonte = fonte
+    funcao.mapeamento = m
+    return medir_funcao(funcao, "conversao_ngsi_ld", m.tipo)
+
+# Versão pela ordem das chaves do .dict(): cada chave tem a sua função de
+# atributo, escolhida uma vez por tipo
+def _mapeador_generico(m: Mapeamento, relacoes: dict, geos: dict, ignorar: set, nome: Optional[str]):
+    ns = {}
+    atributos = {}
+    for chave in relacoes:
+        exec(f"def f(v):\n    return {_atributo(chave, relacoes, False, ns)}\n", ns)
+        atributos[chave] = ns.pop("f")
+    for chave in ignorar:
+        atributos[chave] = None
+
+    def propriedade(v):
+        return {"type": "Property", "value": [x for x in v if x] if isinstance(v, list) else v}
+
+    prefixo = f"urn:ngsi-ld:{m.tipo}:"
+    para_dict = medir_funcao(_dict_por_alias, "modelo_dict", m.tipo)
+
+    def geo(ngsi: dict, data: dict):
+        for atributo, g in geos.items():
+            lon, lat = data.get(g.lon), data.get(g.lat)
+            if lon is None or lat is None:
+                continue
+            try:
+                lat, lon = float(lat), float(lon)
+            except (TypeError, ValueError):
+                continue
+            ngsi[atributo] = {"type": "GeoProperty", "value": {"type": "Point", "coordinates": [lon, lat]}}
+
+    def funcao(entidade) -> dict:
+        data = para_dict(entidade)
+        ngsi = {"id": prefixo + "_".join(str(data[c]) for c in m.id), "type": m.tipo}
+        if m.geo_no_inicio:
+            geo(ngsi, data)
+        for chave, valor in data.items():
+            f = atributos.get(chave, propriedade)
+            if f is not None:
+                ngsi[chave] = f(valor)
+        if not m.geo_no_inicio:
+            geo(ngsi, data)
+        ngsi["@context"] = list(m.contexto)
+        return ngsi
+
+    funcao.__name__ = nome or f"{m.tipo}_to_ngsi_ld"
+    funcao.mapeamento = m
+    return medir_funcao(funcao, "conversao_ngsi_ld", m.tipo)
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "GTFS TUB"))
+from gtfsTUB import PASTA_GTFS, GtfsFeed
+from conversaoParalela import DATASETS, ambiente_saida, saida_tabela
+from saidaNgsiLd import OpcoesSaida, caminho_saida, opcoes_saida
+
+# Ponto de entrada único para todas as conversões. Cada nó declara os
+# ficheiros que lê, os que escreve e o código de que depende; um nó depende
+# dos nós que escrevem as suas entradas e corre assim que estes terminam, em
+# paralelo com os restantes. Um nó é saltado se a impressão digital (conteúdo
+# do código e das entradas, impressões dos nós de que depende e opções de
+# saída) for igual à da última execução e as saídas ainda existirem.
+# O estado fica em {pasta_saida}/.pipeline_estado.json; os hashes dos
+# ficheiros são reaproveitados enquanto o tamanho e a data não mudarem.
+
+PASTA_REPO = Path(__file__).resolve().parent
+FICHEIRO_ESTADO = ".pipeline_estado.json"
+VERSAO = 1
+
+CODIGO_COMUM = ("saidaNgsiLd.py", "mapeamentoNgsiLd.py", "instrumentacaoNgsiLd.py")
+CODIGO_GTFS = CODIGO_COMUM + ("GTFS TUB/gtfsTUB.py", "GTFS TUB/gtfsCache.py")
+CODIGO_DATASETS = CODIGO_COMUM + ("validacaoColunas.py",)
+
+# Ficheiros lidos e escritos por cada script (os de Espaços DSI têm os dados
+# no próprio script)
+ENTRADAS_DATASETS = {
+    "Braga É Natal/festival.py": ("Braga É Natal/csv/Festival.csv",),
+    "Braga É Natal/evento.py": ("Braga É Natal/csv/Evento.csv",),
+    "Braga É Natal/local.py": ("Braga É Natal/csv/Local.csv",),
+    "Braga É Natal/participante.py": ("Braga É Natal/csv/Participante.csv",),
+    "Estatuária de Braga/autor.py": ("Estatuária de Braga/csv/Autores.csv",),
+    "Estatuária de Braga/estatuaria.py": ("Estatuária de Braga/csv/Estatuaria.csv",),
+}
+SAIDAS_DATASETS = {
+    "Braga É Natal/festival.py": "festival_ngsi.jsonld",
+    "Braga É Natal/evento.py": "evento_ngsi.jsonld",
+    "Braga É Natal/local.py": "local_ngsi.jsonld",
+    "Braga É Natal/participante.py": "participante_ngsi.jsonld",
+    "Estatuária de Braga/autor.py": "autores_ngsi.jsonld",
+    "Estatuária de Braga/estatuaria.py": "estatuarias_ngsi.jsonld",
+    "Espaços DSI/edificioPydantic.py": "edificios_ngsi.jsonld",
+    "Espaços DSI/salaPydantic.py": "salas_ngsi.jsonld",
+    "Espaços DSI/pessoaPydantic.py": "pessoas_ngsi.jsonld",
+    "Espaços DSI/reservaPydantic.py": "reservaSalas_ngsi.jsonld",
+}
+
+# tarefa: ("tabela", tabela GTFS, "route_trip_stop" ou "shapes_linestring") | ("script", caminho)
+# entradas: caminhos absolutos; saidas: nomes na pasta de saída
+class No(NamedTuple):
+    nome: str
+    tarefa: tuple
+    entradas: tuple
+    saidas: tuple
+    codigo: tuple
+
+class Resultado(NamedTuple):
+    nome: str
+    estado: str                  # "executado" | "sem alterações" | "erro" | "cancelado"
+    segundos: float = 0.0
+    erro: Optional[str] = None
+
+def nos_pipeline(pasta_gtfs=PASTA_GTFS, compressao: Optional[str] = None) -> dict:
+    pasta_gtfs = Path(pasta_gtfs).resolve()
+    codigo_gtfs = tuple(str(PASTA_REPO / c) for c in CODIGO_GTFS)
+    nos = {}
+    for tabela in GtfsFeed.TABELAS:
+        nos[f"gtfs/{tabela}"] = No(f"gtfs/{tabela}", ("tabela", tabela), (str(pasta_gtfs / f"{tabela}.txt"),),
+                                   (caminho_saida(saida_tabela(tabela), compressao),), codigo_gtfs)
+    nos["gtfs/route_trip_stop"] = No(
+        "gtfs/route_trip_stop", ("tabela", "route_trip_stop"),
+        tuple(str(pasta_gtfs / f"{t}.txt") for t in ("stop_times", "trips", "routes", "stops")),
+        (caminho_saida(saida_tabela("route_trip_stop"), compressao),), codigo_gtfs)
+    nos["gtfs/shapes_linestring"] = No(
+        "gtfs/shapes_linestring", ("tabela", "shapes_linestring"), (str(pasta_gtfs / "shapes.txt"),),
+        (caminho_saida(saida_tabela("shapes_linestring"), compressao),), codigo_gtfs)
+    for dataset, scripts in DATASETS.items():
+        for s in scripts:
+            nome = f"{dataset}/{s}"
+            nos[nome] = No(nome, ("script", str(PASTA_REPO / nome)),
+                           tuple(str(PASTA_REPO / e) for e in ENTRADAS_DATASETS.get(nome, ())),
+                           (caminho_saida(SAIDAS_DATASETS[nome], compressao),),
+                           (str(PASTA_REPO / nome),) + tuple(str(PASTA_REPO / c) for c in CODIGO_DATASETS))
+    return nos
+
+# nó -> nós que escrevem alguma das suas entradas
+def dependencias(nos: dict, pasta_saida: str = ".") -> dict:
+    pasta_saida = Path(pasta_saida).resolve()
+    produtor = {str(pasta_saida / s): no.nome for no in nos.values() for s in no.saidas}
+    return {no.nome: {produtor[e] for e in no.entradas if e in produtor and produtor[e] != no.nome}
+            for no in nos.values()}
+
+def _hash_ficheiro(caminho: str, cache: dict) -> str:
+    st = os.stat(caminho)
+    anterior = cache.get(caminho)
+    if anterior and anterior[0] == st.st_size and anterior[1] == st.st_mtime_ns:
+        return anterior[2]
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    cache[caminho] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+    return cache[caminho][2]
+
+def _impressao(no: No, cache: dict, pais: list, opcoes: OpcoesSaida) -> str:
+    h = hashlib.sha256(f"pipeline-v{VERSAO}|{no.tarefa!r}|{tuple(opcoes)!r}".encode())
+    for caminho in no.codigo + no.entradas:
+        h.update(caminho.encode())
+        h.update(_hash_ficheiro(caminho, cache).encode())
+    for pai in sorted(pais):
+        h.update(pai.encode())
+    return h.hexdigest()
+
+def _ler_estado(caminho: Path) -> dict:
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return {"versao": VERSAO, "ficheiros": {}, "nos": {}}
+    if estado.get("versao") != VERSAO:
+        return {"versao": VERSAO, "ficheiros": {}, "nos": {}}
+    return estado
+
+def _gravar_estado(caminho: Path, estado: dict):
+    tmp = caminho.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, caminho)
+
+# Executado nos processos do conjunto
+def _executar(no: No, pasta_gtfs: str, pasta_saida: str, opcoes: OpcoesSaida) -> float:
+    inicio = time.perf_counter()
+    tipo, alvo = no.tarefa
+    if tipo == "tabela":
+        feed = GtfsFeed(pasta_gtfs)
+        saida = str(Path(pasta_saida) / no.saidas[0])
+        if alvo == "route_trip_stop":
+            feed.exportar_route_trip_stop(saida, **opcoes._asdict())
+        elif alvo == "shapes_linestring":
+            feed.exportar_shapes_linestring(saida, **opcoes._asdict())
+        else:
+            feed.exportar(alvo, saida, **opcoes._asdict())
+    else:
+        # Os scripts escrevem o *_ngsi.jsonld na pasta atual
+        ambiente_saida(opcoes)
+        os.chdir(pasta_saida)
+        runpy.run_path(alvo, run_name="__main__")
+    return time.perf_counter() - inicio
+
+def executar_pipeline(pasta_saida: str = ".", pasta_gtfs=PASTA_GTFS, nomes: Optional[list] = None,
+                      processos: Optional[int] = None, forcar: bool = False, **opcoes) -> list:
+    opcoes = opcoes_saida(**opcoes)
+    pasta_saida = Path(pasta_saida).resolve()
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+    nos = nos_pipeline(pasta_gtfs, opcoes.compressao)
+    deps = dependencias(nos, pasta_saida)
+    if nomes is not None:
+        for n in nomes:
+            if n not in nos:
+                raise ValueError(f"Nó inválido: '{n}'. Usar um de {list(nos)}.")
+        # Os nós pedidos e aqueles de que dependem
+        selecionados, pendentes = set(), list(nomes)
+        while pendentes:
+            n = pendentes.pop()
+            if n not in selecionados:
+                selecionados.add(n)
+                pendentes.extend(deps[n])
+        nos = {n: no for n, no in nos.items() if n in selecionados}
+
+    caminho_estado = pasta_saida / FICHEIRO_ESTADO
+    estado = _ler_estado(caminho_estado)
+    cache, anteriores = estado["ficheiros"], estado["nos"]
+    impressoes, resultados = {}, {}
+    por_fazer = dict(nos)
+    em_curso = {}
+
+    def concluir(nome: str, resultado: Resultado):
+        resultados[nome] = resultado
+        # Os nós que dependem de um nó falhado são cancelados
+        if resultado.estado in ("erro", "cancelado"):
+            for outro in list(por_fazer):
+                if nome in deps[outro]:
+                    del por_fazer[outro]
+                    concluir(outro, Resultado(outro, "cancelado", erro=f"depende de {nome}"))
+
+    with ProcessPoolExecutor(processos or os.cpu_count() or 1) as executor:
+        while por_fazer or em_curso:
+            prontos = [no for no in por_fazer.values() if all(d in impressoes for d in deps[no.nome])]
+            for no in prontos:
+                del por_fazer[no.nome]
+                try:
+                    impressao = _impressao(no, cache, [impressoes[d] for d in deps[no.nome]], opcoes)
+                except OSError as e:
+                    concluir(no.nome, Resultado(no.nome, "erro", erro=f"Entrada em falta: {e.filename}"))
+                    continue
+                saidas_existem = all((pasta_saida / s).exists() for s in no.saidas)
+                if not forcar and saidas_existem and anteriores.get(no.nome) == impressao:
+                    impressoes[no.nome] = impressao
+                    concluir(no.nome, Resultado(no.nome, "sem alterações"))
+                    continue
+                # Uma execução interrompida não pode deixar o nó como atualizado
+                anteriores.pop(no.nome, None)
+                futuro = executor.submit(_executar, no, str(pasta_gtfs), str(pasta_saida), opcoes)
+                em_curso[futuro] = (no, impressao)
+            _gravar_estado(caminho_estado, estado)
+            if not em_curso:
+                if por_fazer and not prontos:
+                    raise ValueError(f"Dependências circulares entre {list(por_fazer)}.")
+                continue
+            feitos, _ = wait(em_curso, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                no, impressao = em_curso.pop(futuro)
+                try:
+                    segundos = futuro.result()
+                except Exception as e:
+                    concluir(no.nome, Resultado(no.nome, "erro", erro=f"{type(e).__name__}: {e}"))
+                    continue
+                impressoes[no.nome] = anteriores[no.nome] = impressao
+                concluir(no.nome, Resultado(no.nome, "executado", segundos))
+        _gravar_estado(caminho_estado, estado)
+    return [resultados[n] for n in nos if n in resultados]
+
+
+if __name__ == "__main__":
+    # python pipelineNgsiLd.py [--forcar] [--processos N] [--saida pasta] [nó...]
+    args = sys.argv[1:]
+    forcar = "--forcar" in args
+    args = [a for a in args if a != "--forcar"]
+    kwargs = {}
+    for opcao, nome, tipo in (("--processos", "processos", int), ("--saida", "pasta_saida", str)):
+        if opcao in args:
+            i = args.index(opcao)
+            kwargs[nome] = tipo(args[i + 1])
+            del args[i:i + 2]
+    inicio = time.perf_counter()
+    resultados = executar_pipeline(nomes=args or None, forcar=forcar, **kwargs)
+    for r in resultados:
+        detalhe = f"ERRO {r.erro}" if r.estado == "erro" else (f"({r.erro})" if r.erro else "")
+        print(f"{r.nome:<40} {r.estado:<15} {r.segundos:>8.2f}s  {detalhe}")
+    print(f"Total: {time.perf_counter() - inicio:.2f}s")
+    if any(r.estado in ("erro", "cancelado") for r in resultados):
+        sys.exit(1)
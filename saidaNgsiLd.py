@@ -0,0 +1,247 @@
+import gzip
+import io
+import json
+import os
+import shutil
+from typing import NamedTuple, Optional
+
+from instrumentacaoNgsiLd import etapa
+
+# Escrita de ficheiros NGSI-LD partilhada por todos os conversores.
+# Por omissão o resultado é o de sempre (lista JSON com indent=2, @context em
+# cada entidade, representação normalizada); as opções reduzem o tamanho:
+#   representacao: "normalized" | "concise" | "keyValues"
+#   contexto:      "entidade" (@context em cada entidade)
+#                  "ficheiro" (uma vez: {"@context": ..., "@graph": [...]}, só em json)
+#                  "link"     (sem @context; enviado no cabeçalho Link, ver link_contexto)
+#   indentacao:    2 (ou outro nível) | None (sem espaços)
+#   compressao:    None | "gzip" | "zstd" (pacote zstandard); por omissão
+#                  deduzida da extensão (.gz, .zst)
+# As opções não indicadas vêm das variáveis de ambiente NGSILD_FORMATO,
+# NGSILD_REPRESENTACAO, NGSILD_CONTEXTO, NGSILD_INDENTACAO ("nenhuma" = None)
+# e NGSILD_COMPRESSAO, para os scripts de conversão não precisarem de argumentos.
+
+FORMATOS = ("json", "ndjson")
+REPRESENTACOES = ("normalized", "concise", "keyValues")
+CONTEXTOS = ("entidade", "ficheiro", "link")
+COMPRESSOES = ("gzip", "zstd")
+EXTENSOES = {"gzip": ".gz", "zstd": ".zst"}
+CONTEXTO_CORE = "https://uri.etsi.org/ngsi-ld/v1/ngsi-ld-core-context.jsonld"
+
+class OpcoesSaida(NamedTuple):
+    formato: str = "json"
+    representacao: str = "normalized"
+    contexto: str = "entidade"
+    indentacao: Optional[int] = 2
+    compressao: Optional[str] = None
+
+def opcoes_saida(formato: Optional[str] = None, representacao: Optional[str] = None,
+                 contexto: Optional[str] = None, indentacao="omissao",
+                 compressao: Optional[str] = None) -> OpcoesSaida:
+    ambiente = os.environ.get
+    formato = formato or ambiente("NGSILD_FORMATO") or "json"
+    representacao = representacao or ambiente("NGSILD_REPRESENTACAO") or "normalized"
+    contexto = contexto or ambiente("NGSILD_CONTEXTO") or "entidade"
+    compressao = compressao or ambiente("NGSILD_COMPRESSAO") or None
+    if indentacao == "omissao":
+        valor = ambiente("NGSILD_INDENTACAO", "2")
+        indentacao = None if valor.lower() in ("nenhuma", "none", "") else int(valor)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: '{formato}'. Usar um de {list(FORMATOS)}.")
+    if representacao not in REPRESENTACOES:
+        raise ValueError(f"Representação inválida: '{representacao}'. Usar uma de {list(REPRESENTACOES)}.")
+    if contexto not in CONTEXTOS:
+        raise ValueError(f"Contexto inválido: '{contexto}'. Usar um de {list(CONTEXTOS)}.")
+    if compressao is not None and compressao not in COMPRESSOES:
+        raise ValueError(f"Compressão inválida: '{compressao}'. Usar uma de {list(COMPRESSOES)}.")
+    if contexto == "ficheiro" and formato != "json":
+        raise ValueError("Contexto por ficheiro só no formato 'json'; em 'ndjson' usar 'link'.")
+    return OpcoesSaida(formato, representacao, contexto, indentacao, compressao)
+
+# Representações simplificadas (NGSI-LD 1.6, secções 4.5.3 e 4.5.4)
+def _atributo_keyvalues(atributo):
+    if not isinstance(atributo, dict) or "type" not in atributo:
+        return atributo
+    if atributo["type"] == "Relationship":
+        return atributo.get("object")
+    return atributo.get("value")
+
+def _atributo_concise(atributo):
+    if not isinstance(atributo, dict) or "type" not in atributo:
+        return atributo
+    resto = {k: v for k, v in atributo.items() if k != "type"}
+    if atributo["type"] == "Relationship":
+        return resto
+    if atributo["type"] == "GeoProperty" and list(resto) == ["value"]:
+        # A geometria GeoJSON identifica-se pelo próprio "type"
+        return resto["value"]
+    # Só o valor, se não tiver sub-atributos nem puder ser confundido com um objeto
+    if list(resto) == ["value"] and not isinstance(resto["value"], dict):
+        return resto["value"]
+    return resto
+
+def converter_representacao(entidade: dict, representacao: str = "normalized") -> dict:
+    if representacao == "normalized":
+        return entidade
+    converter = _atributo_keyvalues if representacao == "keyValues" else _atributo_concise
+    return {k: v if k in ("id", "type", "@context") else converter(v) for k, v in entidade.items()}
+
+# Valor do cabeçalho Link para enviar o @context fora das entidades; o core
+# context é sempre incluído pelo broker e só pode ir um URL no cabeçalho
+def link_contexto(contexto) -> Optional[str]:
+    urls = [contexto] if isinstance(contexto, str) else [c for c in (contexto or []) if c != CONTEXTO_CORE]
+    if not urls:
+        return None
+    if len(urls) > 1 or not isinstance(urls[0], str):
+        raise ValueError(f"O cabeçalho Link só aceita um URL de @context: {urls}.")
+    return f'<{urls[0]}>; rel="http://www.w3.org/ns/json-ld#context"; type="application/ld+json"'
+
+def caminho_saida(caminho: str, compressao: Optional[str]) -> str:
+    extensao = EXTENSOES.get(compressao)
+    return caminho if extensao is None or caminho.endswith(extensao) else caminho + extensao
+
+def compressao_do_caminho(caminho: str) -> Optional[str]:
+    for compressao, extensao in EXTENSOES.items():
+        if str(caminho).endswith(extensao):
+            return compressao
+    return None
+
+def abrir_texto(caminho: str, modo: str = "r", compressao: Optional[str] = None):
+    compressao = compressao or compressao_do_caminho(caminho)
+    if compressao is None:
+        return open(caminho, modo, encoding="utf-8")
+    if compressao == "gzip":
+        return gzip.open(caminho, modo + "t", encoding="utf-8", compresslevel=6) if modo == "w" \
+            else gzip.open(caminho, "rt", encoding="utf-8")
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("Compressão 'zstd' requer o pacote zstandard (pip install zstandard).") from None
+    bruto = open(caminho, modo + "b")
+    if modo == "w":
+        fluxo = zstandard.ZstdCompressor(level=3).stream_writer(bruto, closefd=True)
+    else:
+        fluxo = zstandard.ZstdDecompressor().stream_reader(bruto, closefd=True)
+    return io.TextIOWrapper(fluxo, encoding="utf-8")
+
+def _nivel(o: OpcoesSaida) -> int:
+    return 2 if o.contexto == "ficheiro" else 1
+
+def _texto(entidade: dict, o: OpcoesSaida) -> str:
+    if o.indentacao is None:
+        return json.dumps(entidade, ensure_ascii=False, separators=(",", ":"))
+    if o.formato == "ndjson":
+        return json.dumps(entidade, ensure_ascii=False)
+    espacos = " " * (o.indentacao * _nivel(o))
+    return json.dumps(entidade, ensure_ascii=False, indent=o.indentacao).replace("\n", "\n" + espacos)
+
+def _abertura(o: OpcoesSaida, contexto) -> str:
+    ind = o.indentacao
+    if o.formato == "ndjson":
+        return ""
+    if o.contexto == "ficheiro":
+        if ind is None:
+            return '{"@context":' + json.dumps(contexto, ensure_ascii=False, separators=(",", ":")) + ',"@graph":['
+        cabecalho = json.dumps(contexto, ensure_ascii=False, indent=ind).replace("\n", "\n" + " " * ind)
+        return "{\n" + " " * ind + '"@context": ' + cabecalho + ",\n" + " " * ind + '"@graph": [\n' + " " * 2 * ind
+    return "[" if ind is None else "[\n" + " " * ind
+
+def _separador(o: OpcoesSaida) -> str:
+    if o.formato == "ndjson":
+        return ""
+    return "," if o.indentacao is None else ",\n" + " " * (o.indentacao * _nivel(o))
+
+def _fecho(o: OpcoesSaida, n: int) -> str:
+    ind = o.indentacao
+    if o.formato == "ndjson":
+        return ""
+    if n == 0:
+        return "[]"
+    if o.contexto == "ficheiro":
+        return "]}" if ind is None else "\n" + " " * ind + "]\n}"
+    return "]" if ind is None else "\n]"
+
+# Escrita entidade a entidade. Com fragmento=True escreve só as entidades
+# (sem abertura/fecho nem compressão), para depois juntar com juntar_fragmentos
+class EscritorNgsiLd:
+    def __init__(self, caminho: str, opcoes: Optional[OpcoesSaida] = None, fragmento: bool = False, **kwargs):
+        self.opcoes = opcoes or opcoes_saida(**kwargs)
+        self.fragmento = fragmento
+        compressao = None if fragmento else self.opcoes.compressao or compressao_do_caminho(caminho)
+        self.caminho = caminho_saida(caminho, compressao)
+        self._f = abrir_texto(self.caminho, "w", compressao)
+        self.n = 0
+        # @context comum (o da primeira entidade); entidades com outro mantêm o seu
+        self.contexto = None
+        self.tipo = None
+
+    def preparar(self, entidade: dict) -> dict:
+        entidade = converter_representacao(entidade, self.opcoes.representacao)
+        if self.opcoes.contexto != "entidade" and "@context" in entidade:
+            if self.n == 0:
+                self.contexto = entidade["@context"]
+            if entidade["@context"] == self.contexto:
+                entidade = {k: v for k, v in entidade.items() if k != "@context"}
+        return entidade
+
+    def escrever(self, entidade: dict):
+        entidade = self.preparar(entidade)
+        if self.n:
+            self._f.write(_separador(self.opcoes))
+        else:
+            self.tipo = entidade.get("type")
+            if not self.fragmento:
+                self._f.write(_abertura(self.opcoes, self.contexto))
+        self._f.write(_texto(entidade, self.opcoes))
+        if self.opcoes.formato == "ndjson":
+            self._f.write("\n")
+        self.n += 1
+
+    # Escrita de todas as entidades, medida como etapa "escrita_json" (as
+    # entidades geradas durante a escrita contam nas suas próprias etapas)
+    def escrever_todas(self, entidades) -> int:
+        n = self.n
+        entidades = iter(entidades)
+        with etapa("escrita_json") as e:
+            for entidade in entidades:
+                self.escrever(entidade)
+                e.definir_tipo(self.tipo)
+                break
+            for entidade in entidades:
+                self.escrever(entidade)
+            e.linhas = self.n - n
+        return self.n - n
+
+    def fechar(self) -> int:
+        if not self.fragmento:
+            self._f.write(_fecho(self.opcoes, self.n))
+        self._f.close()
+        return self.n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+def escrever_ngsi_ld(entidades, caminho: str, formato: Optional[str] = None, **opcoes) -> int:
+    with EscritorNgsiLd(caminho, formato=formato, **opcoes) as escritor:
+        escritor.escrever_todas(entidades)
+    return escritor.n
+
+# fragmentos: [(caminho, entidades, contexto)] pela ordem final
+def juntar_fragmentos(fragmentos: list, caminho: str, opcoes: OpcoesSaida) -> int:
+    com_entidades = [f for f in fragmentos if f[1]]
+    contexto = com_entidades[0][2] if com_entidades else None
+    if opcoes.contexto != "entidade" and any(c != contexto for _, _, c in com_entidades):
+        raise ValueError("As partes têm @context diferentes; usar contexto='entidade'.")
+    compressao = opcoes.compressao or compressao_do_caminho(caminho)
+    n = 0
+    with abrir_texto(caminho_saida(caminho, compressao), "w", compressao) as f:
+        for fragmento, k, _ in com_entidades:
+            f.write(_separador(opcoes) if n else _abertura(opcoes, contexto))
+            with open(fragmento, "r", encoding="utf-8") as parte:
+                shutil.copyfileobj(parte, f)
+            n += k
+        f.write(_fecho(opcoes, n))
+    return n
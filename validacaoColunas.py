@@ -0,0 +1,101 @@
+from typing import NamedTuple, Optional
+import pandas as pd, numpy as np
+
+from instrumentacaoNgsiLd import etapa
+
+# Validação por colunas para os modelos schema.org (Estatuária, Braga É Natal,
+# Espaços DSI): as mesmas regras dos validadores pydantic (datas, horas, URLs,
+# inteiros, campos obrigatórios) aplicadas à coluna inteira do DataFrame.
+# Todas as linhas e colunas com erro são reportadas de uma vez, antes de se
+# construírem os modelos.
+
+PADRAO_DATA = r"\d{4}-\d{2}-\d{2}"
+PADRAO_DATA_OU_ANO = r"\d{4}-\d{2}-\d{2}|\d{4}"
+PADRAO_HORA = r"\d{2}:\d{2}:\d{2}"
+PADRAO_INTEIRO = r"[+-]?\d+"
+PADRAO_DECIMAL = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+# Como o HttpUrl do pydantic: http(s), domínio com TLD (ou IPv4) e porta opcional
+PADRAO_URL = (r"https?://(?:[^\s:@/]+(?::[^\s@/]*)?@)?"
+              r"(?:(?:[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?\.)+[A-Za-z]{2,63}\.?|\d{1,3}(?:\.\d{1,3}){3})"
+              r"(?::(?:6553[0-5]|655[0-2]\d|65[0-4]\d{2}|6[0-4]\d{3}|[1-5]\d{4}|\d{1,4}))?(?:[/?#]\S*)?")
+
+class Regra(NamedTuple):
+    colunas: tuple
+    padrao: Optional[str] = None   # expressão que o valor (sem espaços nas pontas) tem de cumprir
+    mensagem: str = ""             # com {valor}
+    obrigatoria: bool = False
+    lista: bool = False            # colunas com listas (parse_lista_ou_none): cada item é validado
+
+def regra_obrigatoria(*colunas) -> Regra:
+    return Regra(colunas, obrigatoria=True)
+
+def regra_data(*colunas, anos: bool = False, obrigatoria: bool = False, lista: bool = False) -> Regra:
+    if anos:
+        return Regra(colunas, PADRAO_DATA_OU_ANO, "Data inválida: '{valor}'. Usar 'YYYY' ou 'YYYY-MM-DD'.",
+                     obrigatoria, lista)
+    return Regra(colunas, PADRAO_DATA, "Data inválida: '{valor}'. Usar 'YYYY-MM-DD'.", obrigatoria, lista)
+
+def regra_hora(*colunas, obrigatoria: bool = False) -> Regra:
+    return Regra(colunas, PADRAO_HORA, "Hora inválida: '{valor}'. Usar 'HH:MM:SS'.", obrigatoria)
+
+def regra_url(*colunas, obrigatoria: bool = False, lista: bool = False) -> Regra:
+    return Regra(colunas, PADRAO_URL, "URL inválido: '{valor}'.", obrigatoria, lista)
+
+def regra_inteiro(*colunas, obrigatoria: bool = False) -> Regra:
+    return Regra(colunas, PADRAO_INTEIRO, "Inteiro inválido: '{valor}'.", obrigatoria)
+
+def regra_decimal(*colunas, obrigatoria: bool = False) -> Regra:
+    return Regra(colunas, PADRAO_DECIMAL, "Número inválido: '{valor}'.", obrigatoria)
+
+class ErroValidacao(ValueError):
+    def __init__(self, erros: pd.DataFrame):
+        self.erros = erros
+        exemplos = "; ".join(f"linha {r.linha}, {r.coluna}: {r.erro}" for r in erros.head(5).itertuples())
+        mais = f" (e mais {len(erros) - 5})" if len(erros) > 5 else ""
+        super().__init__(f"{len(erros)} erros de validação: {exemplos}{mais}")
+
+# Uma linha por valor inválido: linha (índice do DataFrame), coluna, valor, erro;
+# ordenado por linha e pela ordem das colunas no DataFrame
+def validar_colunas(df: pd.DataFrame, regras: list) -> pd.DataFrame:
+    partes = []
+
+    def erro(linhas, col, valores, mensagens):
+        partes.append(pd.DataFrame({"linha": linhas, "coluna": col, "valor": valores, "erro": mensagens}))
+
+    for regra in regras:
+        for col in regra.colunas:
+            if col not in df.columns:
+                if regra.obrigatoria:
+                    erro([None], col, [None], [f"Coluna obrigatória em falta: '{col}'."])
+                continue
+            serie = df[col]
+            if regra.obrigatoria:
+                nulos = serie.isna().to_numpy()
+                if nulos.any():
+                    erro(df.index[nulos], col, None, "Campo obrigatório em falta.")
+            if regra.padrao is None:
+                continue
+            if regra.lista:
+                serie = serie.explode()
+            texto = serie[serie.notna().to_numpy()].astype(str).str.strip()
+            texto = texto[(texto != "").to_numpy()]
+            invalidos = ~texto.str.fullmatch(regra.padrao).to_numpy(dtype=bool)
+            if invalidos.any():
+                valores = texto[invalidos]
+                erro(valores.index, col, valores.to_numpy(),
+                     [regra.mensagem.format(valor=v) for v in valores.tolist()])
+
+    if not partes:
+        return pd.DataFrame(columns=["linha", "coluna", "valor", "erro"])
+    erros = pd.concat(partes, ignore_index=True)
+    ordem_colunas = {c: i for i, c in enumerate(df.columns)}
+    posicao = pd.Series(np.arange(len(df)), index=df.index)
+    chave_linha = erros["linha"].map(lambda l: -1 if pd.isna(l) else posicao[l])
+    ordem = np.lexsort((erros["coluna"].map(ordem_colunas).fillna(-1).to_numpy(), chave_linha.to_numpy()))
+    return erros.iloc[ordem].reset_index(drop=True)
+
+def validar_ou_falhar(df: pd.DataFrame, regras: list) -> None:
+    with etapa("validacao", linhas=len(df)):
+        erros = validar_colunas(df, regras)
+    if len(erros):
+        raise ErroValidacao(erros)